@@ -1,4 +1,5 @@
 import json
+from asgiref.sync import sync_to_async
 from google.auth.transport import requests
 from google.oauth2 import id_token
 from django.conf import settings
@@ -14,11 +15,9 @@ class GoogleTokenAuthentication(authentication.BaseAuthentication):
     """
     
     def authenticate(self, request):
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        token = self._get_bearer_token(request)
+        if not token:
             return None
-            
-        token = auth_header.split(' ')[1]
         
         try:
             # Verify the token with Google
@@ -29,57 +28,49 @@ class GoogleTokenAuthentication(authentication.BaseAuthentication):
             )
             
             # Get or create user
-            google_id = idinfo['sub']
-            email = idinfo['email']
-            first_name = idinfo.get('given_name', '')
-            last_name = idinfo.get('family_name', '')
-            profile_picture = idinfo.get('picture', '')
-            
             user, created = User.objects.get_or_create(
-                google_id=google_id,
-                defaults={
-                    'email': email,
-                    'username': email,  # Use email as username
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'profile_picture': profile_picture,
-                }
+                google_id=idinfo['sub'],
+                defaults=self._user_defaults(idinfo)
+            )
+            
+            self._track_auth(user, idinfo, created)
+            
+            # Update profile info if user exists but info changed
+            if not created and self._sync_profile(user, idinfo):
+                user.save()
+            
+            return (user, None)
+            
+        except ValueError as e:
+            raise exceptions.AuthenticationFailed(f'Invalid token: {str(e)}')
+        except Exception as e:
+            raise exceptions.AuthenticationFailed(f'Authentication failed: {str(e)}')
+    
+    async def aauthenticate(self, request):
+        """
+        Async variant of ``authenticate`` for native async views.
+        Token verification runs in a worker thread; ORM access uses Django's async API.
+        """
+        token = self._get_bearer_token(request)
+        if not token:
+            return None
+        
+        try:
+            idinfo = await sync_to_async(id_token.verify_oauth2_token, thread_sensitive=False)(
+                token,
+                requests.Request(),
+                settings.GOOGLE_CLIENT_ID
             )
             
-            # Track user authentication
-            analytics.track_user_auth(
-                user_id=str(user.id),
-                email=email,
-                name=f"{first_name} {last_name}".strip(),
-                method='google'
+            user, created = await User.objects.aget_or_create(
+                google_id=idinfo['sub'],
+                defaults=self._user_defaults(idinfo)
             )
             
-            # Track new user registration if created
-            if created:
-                analytics.track_event('user_registered', str(user.id), {
-                    'email': email,
-                    'name': f"{first_name} {last_name}".strip(),
-                    'registration_method': 'google'
-                })
+            await sync_to_async(self._track_auth, thread_sensitive=False)(user, idinfo, created)
             
-            # Update profile info if user exists but info changed
-            if not created:
-                updated = False
-                if user.email != email:
-                    user.email = email
-                    user.username = email
-                    updated = True
-                if user.first_name != first_name:
-                    user.first_name = first_name
-                    updated = True
-                if user.last_name != last_name:
-                    user.last_name = last_name
-                    updated = True
-                if user.profile_picture != profile_picture:
-                    user.profile_picture = profile_picture
-                    updated = True
-                if updated:
-                    user.save()
+            if not created and self._sync_profile(user, idinfo):
+                await user.asave()
             
             return (user, None)
             
@@ -87,6 +78,52 @@ class GoogleTokenAuthentication(authentication.BaseAuthentication):
             raise exceptions.AuthenticationFailed(f'Invalid token: {str(e)}')
         except Exception as e:
             raise exceptions.AuthenticationFailed(f'Authentication failed: {str(e)}')
+    
+    def _get_bearer_token(self, request):
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return None
+        return auth_header.split(' ')[1]
+    
+    def _user_defaults(self, idinfo):
+        email = idinfo['email']
+        return {
+            'email': email,
+            'username': email,  # Use email as username
+            'first_name': idinfo.get('given_name', ''),
+            'last_name': idinfo.get('family_name', ''),
+            'profile_picture': idinfo.get('picture', ''),
+        }
+    
+    def _track_auth(self, user, idinfo, created):
+        email = idinfo['email']
+        name = f"{idinfo.get('given_name', '')} {idinfo.get('family_name', '')}".strip()
+        
+        # Track user authentication
+        analytics.track_user_auth(
+            user_id=str(user.id),
+            email=email,
+            name=name,
+            method='google'
+        )
+        
+        # Track new user registration if created
+        if created:
+            analytics.track_event('user_registered', str(user.id), {
+                'email': email,
+                'name': name,
+                'registration_method': 'google'
+            })
+    
+    def _sync_profile(self, user, idinfo):
+        """Copy changed profile fields onto the user, returning True if anything changed"""
+        updated = False
+        defaults = self._user_defaults(idinfo)
+        for field, value in defaults.items():
+            if getattr(user, field) != value:
+                setattr(user, field, value)
+                updated = True
+        return updated
 
     def authenticate_header(self, request):
         return 'Bearer' 
\ No newline at end of file
@@ -0,0 +1,743 @@
+"""
+The live coaching pipeline.
+
+``/realtime-coaching/``, ``/live-coaching/analyze-frame/`` and ``/live-coaching/feedback/``
+used to drive the same session state through ``analyze_live_frame``, each behind its own
+throttle: one endpoint's throttle skipped frames the other had to segment, so a client
+using two of them miscounted reps and could start overlapping Gemini batches. Every live
+frame now goes through one pipeline, whichever endpoint it arrived on:
+
+    ingest    latest-wins intake and frame decode
+    smooth    One-Euro landmark filter, recorded in the session's pose history
+    segment   streaming rep segmenter events
+    decide    rep bookkeeping and session aggregates, instant form cues, and the one
+              throttle: batches are due after enough reps or time, never closer than
+              the paced coaching interval
+    dispatch  frame buffering, speculation, cached or Gemini batch feedback
+
+The endpoints only translate their requests and responses.
+
+Clients that segment reps themselves can use the event protocol instead
+(``/live-coaching/rep-event/``): one request per rep, carrying the rep's landmark
+trajectory and one or two keyframes, rather than a frame per tick. The trajectory is
+replayed through the session's own filter and segmenter (cheap: no images, one state
+update per rep), so reps the server does not see are not counted, and only verified
+events reach the decide and dispatch stages.
+"""
+
+import asyncio
+import bisect
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .feedback_cache import fault_signature
+from .form_scoring import RepScore
+from .frame_buffer import decode_frame
+from .frame_intake import STALE
+from .hold_tracker import get_hold_kind
+from .kinematics import PoseHistory, rep_features, summarize_reps
+from .rep_index import rep_embedding
+from .rep_segmenter import SEGMENTER_PROFILES, get_segmenter_kind
+from .request_context import RequestCancelled
+from .session_aggregates import SessionAggregates
+from .session_store import SessionStateConflict
+from .templates import resolve_template_id
+
+if TYPE_CHECKING:
+    from .realtime_coaching import RealtimeCoachingService
+
+logger = logging.getLogger(__name__)
+
+# Feedback about the frame itself, dropped rather than re-parked when it goes stale
+INSTANT_FEEDBACK_TYPES = ('form_rule', 'hold_break')
+
+
+@dataclass
+class LiveFrame:
+    """One frame posted by a live client, on any of the live endpoints"""
+    user_id: str
+    activity_type: str
+    frame_data: Optional[str]
+    pose_data: Dict[str, Any]
+    timestamp: int
+    sequence: Optional[int] = None
+
+
+@dataclass
+class LiveRepEvent:
+    """A rep detected by the client, posted on the event protocol endpoint"""
+    user_id: str
+    activity_type: str
+    trajectory: List[Tuple[int, Any]]               # (timestamp, landmarks) through the rep
+    keyframes: List[Tuple[int, str]]                # (timestamp, base64 JPEG), key moments of the rep
+    sequence: Optional[int] = None
+
+
+@dataclass
+class FrameDecision:
+    """What the decide stage concluded for a frame; carried out by the dispatch stage"""
+    response: Dict[str, Any]
+    frame_phase: Optional[str]
+    frame_score: float
+    rep_index: int                                  # rep the frame belongs to, for the reservoir
+    batch: Optional[Dict[str, Any]] = None          # batch to analyse now
+    speculation: Optional[Dict[str, Any]] = None    # batch to start early, at the rep's key phase
+    aborted: bool = False                           # the rep in progress was abandoned
+
+
+class CoachingPipeline:
+    """Runs live frames of every session through ingest, smooth, segment, decide and dispatch"""
+
+    # Per-rep kinematic feature sets kept in session state
+    REP_FEATURES_KEPT = 10
+    # Batch feedback texts remembered per session, so the rep index doesn't repeat them
+    FEEDBACK_HEARD_KEPT = 8
+
+    # Unloaded interval (seconds) between batch analyses, scaled by the pacing controller
+    # like the per-activity coaching intervals
+    BATCH_INTERVAL = 7.0
+
+    def __init__(self, service: 'RealtimeCoachingService'):
+        self.service = service
+        self.sessions = service.sessions
+        self.gemini_service = service.gemini_service
+        self.form_rules = service.form_rules
+        self.form_scorer = service.form_scorer
+        self.feedback_cache = service.feedback_cache
+        self.rep_index = service.rep_index
+        self.pacing = service.pacing
+        # Start a batch's Gemini request at the key phase of the rep that will close it
+        self.speculative_batches = getattr(settings, 'LIVE_SPECULATIVE_BATCHES', True)
+        # Batch requests still running after this long are abandoned (cancelled at session end regardless)
+        self.batch_deadline = getattr(settings, 'LIVE_BATCH_DEADLINE_SECONDS', 20.0)
+        # Event protocol: clients send one request per rep instead of a frame per tick
+        self.event_protocol = getattr(settings, 'LIVE_EVENT_PROTOCOL', True)
+        self.max_trajectory_frames = getattr(settings, 'LIVE_EVENT_MAX_TRAJECTORY_FRAMES', 300)
+        self.max_keyframes = getattr(settings, 'LIVE_EVENT_MAX_KEYFRAMES', 2)
+
+    async def submit(self, frame: LiveFrame) -> Dict[str, Any]:
+        """
+        Run one live frame through the pipeline and return the response for the client.
+
+        Frames pass through the session's latest-wins intake (see frame_intake): late and
+        superseded frames are answered without being processed, and feedback produced past
+        the frame's deadline is withheld.
+        """
+        intake = self.sessions.frame_intake(frame.user_id)
+
+        async with intake.admit(frame.sequence, frame.timestamp) as ticket:
+            if ticket.dropped:
+                return {
+                    'success': False,
+                    'dropped': ticket.dropped,
+                    'message': f'Frame dropped ({ticket.dropped})',
+                    'movement_completed': False,
+                    'should_provide_feedback': False,
+                    'feedback': None
+                }
+            response_data = await self._process(frame)
+
+        if ticket.expired and response_data.get('should_provide_feedback'):
+            intake.discard_stale()
+            if response_data.get('feedback_type') not in INSTANT_FEEDBACK_TYPES:
+                # Batch feedback covers the last few reps rather than this frame; keep it for the next poll
+                self.sessions.spawn(frame.user_id, self._park_feedback(
+                    frame.user_id, response_data['feedback'], response_data['feedback_type'],
+                    response_data.get('feedback_rep_count', response_data.get('rep_count', 0))
+                ))
+            response_data.update({
+                'should_provide_feedback': False,
+                'feedback': None,
+                'dropped': STALE
+            })
+        return response_data
+
+    async def _process(self, frame: LiveFrame) -> Dict[str, Any]:
+        """Every stage after intake for one admitted frame"""
+        pose_history = self.sessions.pose_history(frame.user_id)
+        jpeg = decode_frame(frame.frame_data) if frame.frame_data else None
+        coaching_interval = self.service.effective_coaching_interval(frame.activity_type)
+        batch_interval_ms = self.pacing.interval(self.BATCH_INTERVAL) * 1000
+        has_frames = bool(jpeg) or bool(self.sessions.frame_buffer(frame.user_id))
+
+        def advance(user_state: Dict[str, Any]) -> FrameDecision:
+            # smooth + segment, then decide, as one compare-and-set update of the session state
+            events, cue = self._observe(frame.activity_type, frame.pose_data, frame.timestamp, user_state, pose_history)
+            return self._decide(
+                frame, user_state, events, cue, pose_history, has_frames, coaching_interval, batch_interval_ms
+            )
+
+        decision = await self.service.update_user_state(frame.user_id, advance)
+        jpegs = [(frame.timestamp, jpeg, decision.frame_phase, decision.frame_score)] if jpeg else []
+        self._dispatch(frame, decision, jpegs)
+        return decision.response
+
+    async def submit_event(self, event: LiveRepEvent) -> Dict[str, Any]:
+        """
+        Verify a client-detected rep and coach on it (event protocol).
+
+        The trajectory is replayed frame by frame through the session's landmark filter,
+        segmenter (or hold tracker) and form rules in one state update; the reps the server's
+        segmenter completes are then counted and dispatched like a frame that ended them. The
+        response says whether the client's event was ``verified``. Events are not subject to
+        latest-wins intake: every one of them matters, and a trajectory older than what the
+        session has already seen is simply ignored by the segmenter.
+        """
+        pose_history = self.sessions.pose_history(event.user_id)
+        trajectory = event.trajectory[-self.max_trajectory_frames:]
+        keyframes = [
+            (timestamp, jpeg) for timestamp, jpeg in (
+                (timestamp, decode_frame(frame_data)) for timestamp, frame_data in event.keyframes[:self.max_keyframes]
+            ) if jpeg
+        ]
+        last_timestamp, last_landmarks = trajectory[-1]
+        # The decide stage treats the event as the trajectory's last frame
+        frame = LiveFrame(
+            user_id=event.user_id,
+            activity_type=event.activity_type,
+            frame_data=None,
+            pose_data={'landmarks': last_landmarks},
+            timestamp=last_timestamp,
+            sequence=event.sequence
+        )
+        coaching_interval = self.service.effective_coaching_interval(event.activity_type)
+        batch_interval_ms = self.pacing.interval(self.BATCH_INTERVAL) * 1000
+        has_frames = bool(keyframes) or bool(self.sessions.frame_buffer(event.user_id))
+
+        def advance(user_state: Dict[str, Any]) -> Tuple[FrameDecision, List[Tuple[int, Optional[str], float]]]:
+            events, cue, phases = [], None, []
+            for timestamp, landmarks in trajectory:
+                frame_events, frame_cue = self._observe(
+                    event.activity_type, {'landmarks': landmarks}, timestamp, user_state, pose_history,
+                    rules=cue is None
+                )
+                events.extend(frame_events)
+                cue = cue or frame_cue
+                # Phase and score along the rep, to tag the keyframes with
+                phases.append((timestamp, self._frame_phase(event.activity_type, user_state, frame_events),
+                               self._frame_score(user_state)))
+            decision = self._decide(
+                frame, user_state, events, cue, pose_history, has_frames, coaching_interval, batch_interval_ms
+            )
+            return decision, phases
+
+        decision, phases = await self.service.update_user_state(event.user_id, advance)
+        jpegs = []
+        if decision.response['movement_completed']:
+            # Only frames of verified reps are kept for batch analysis
+            timestamps = [timestamp for timestamp, _, _ in phases]
+            for timestamp, jpeg in keyframes:
+                _, phase, score = phases[max(bisect.bisect_right(timestamps, timestamp) - 1, 0)]
+                jpegs.append((timestamp, jpeg, phase, score))
+        self._dispatch(frame, decision, jpegs)
+        decision.response['verified'] = decision.response['movement_completed']
+        return decision.response
+
+    def _observe(self, activity_type: str, pose_data: Dict[str, Any], timestamp: int, user_state: Dict[str, Any],
+                 pose_history: PoseHistory, rules: bool = True) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """
+        Smooth and segment one pose frame, then check it against the template's form rules
+        (unless ``rules`` is off or feedback is already waiting); returns (events, cue).
+        Runs inside the session state update.
+        """
+        events = self.service.detect_rep_events(pose_data, activity_type, user_state, timestamp, pose_history)
+        cue = None
+        if rules and not user_state.get('pending_feedback'):
+            cue = self._evaluate_form_rules(
+                resolve_template_id(activity_type), pose_history, events,
+                self._frame_phase(activity_type, user_state, events), timestamp, user_state
+            )
+        return events, cue
+
+    def _frame_phase(self, activity_type: str, user_state: Dict[str, Any], events: List[Dict[str, Any]]) -> Optional[str]:
+        """Phase to tag a frame with: the detector's phase, or ``rep_complete`` on a legacy detector's completing frame"""
+        frame_phase = self._get_detection_phase(activity_type, user_state)
+        if frame_phase is None and any(event['type'] == 'end' for event in events):
+            frame_phase = 'rep_complete'
+        return frame_phase
+
+    def _decide(self, frame: LiveFrame, user_state: Dict[str, Any], events: List[Dict[str, Any]],
+                cue: Optional[Tuple[str, str]], pose_history: PoseHistory, has_frames: bool,
+                coaching_interval: float, batch_interval_ms: float) -> FrameDecision:
+        """
+        Rep bookkeeping, feedback to deliver and batch triggers for one frame. Runs inside the
+        session state update, so it must only touch ``user_state`` (it may be re-run).
+        """
+        activity_type, current_time = frame.activity_type, frame.timestamp
+        template_id = resolve_template_id(activity_type)
+        completed = [event for event in events if event['type'] == 'end']
+        movement_completed = bool(completed)
+        frame_phase = self._frame_phase(activity_type, user_state, events)
+
+        response_data = {
+            'success': True,
+            'movement_completed': False,
+            'should_provide_feedback': False,
+            'feedback': None,
+            'coaching_interval_ms': int(coaching_interval * 1000)
+        }
+        batch = None
+        aggregates = user_state.get('aggregates')
+        if aggregates is None:
+            aggregates = user_state['aggregates'] = SessionAggregates()
+        aggregates.observe(current_time)
+
+        # Deliver feedback finished by a background batch since the last poll
+        pending = user_state.get('pending_feedback')
+        if pending:
+            user_state['pending_feedback'] = None
+            self._hear(user_state, pending['feedback'])
+            response_data.update({
+                'should_provide_feedback': True,
+                'feedback': pending['feedback'],
+                'feedback_type': pending['feedback_type'],
+                'feedback_rep_count': pending['rep_count']
+            })
+        elif cue:
+            # Instant cue from the local form rules, no Gemini round trip
+            rule_id, feedback = cue
+            aggregates.add_cue(rule_id)
+            response_data.update({
+                'should_provide_feedback': True,
+                'feedback': feedback,
+                'feedback_type': 'form_rule',
+                'cue_id': rule_id
+            })
+
+        hold_tracker = user_state.get('hold_tracker')
+        if hold_tracker is not None and hold_tracker.kind == get_hold_kind(activity_type):
+            response_data['hold_ms'] = hold_tracker.held_ms
+            broken = [event for event in events if event['type'] == 'abort' and 'hold_ms' in event]
+            for event in broken:
+                aggregates.add_hold(event['hold_ms'])
+            if broken and not response_data['should_provide_feedback']:
+                aggregates.add_cue('hold_break')
+                response_data.update({
+                    'should_provide_feedback': True,
+                    'feedback': f"Hold ended after {broken[-1]['hold_ms'] // 1000} seconds - reset and hold again.",
+                    'feedback_type': 'hold_break',
+                    'hold_break': broken[-1]['reason']
+                })
+
+        if movement_completed:
+            # One per frame, possibly several for an event's trajectory
+            rep_scores = []
+            for end_event in completed:
+                score = self._count_rep(activity_type, template_id, pose_history, end_event, user_state)
+                if score:
+                    rep_scores.append((user_state['rep_count'], score))
+            response_data.update({
+                'movement_completed': True,
+                'rep_count': user_state['rep_count']
+            })
+            if 'milestone' in completed[-1]:
+                response_data['hold_milestone'] = completed[-1]['milestone']
+            if rep_scores:
+                # Every scored rep, and the worst of them up front: that is the one to coach on
+                _, worst = min(rep_scores, key=lambda rep_score: rep_score[1].score)
+                response_data.update({
+                    'form_score': worst.score,
+                    'worst_joints': worst.to_dict()['worst_joints'],
+                    'rep_scores': [{'rep': rep, 'form_score': score.score} for rep, score in rep_scores]
+                })
+
+            # --- Batching Logic ---
+            # Only one batch per session in flight on this worker
+            batch_in_flight = self.sessions.has_pending_tasks(frame.user_id)
+            batch_due = self._batch_due(
+                user_state, user_state['reps_since_last_batch'], current_time, coaching_interval, batch_interval_ms
+            )
+
+            # If either trigger is met and we have frames, schedule the batch
+            if batch_due and has_frames and not batch_in_flight:
+                logger.info(f"✅ Batch trigger met for user {frame.user_id}: {user_state['reps_since_last_batch']} reps, {(current_time - user_state.get('last_batch_time', 0)) / 1000}s elapsed.")
+                reps_in_batch = user_state['reps_since_last_batch']
+                batch = {
+                    'rep_count': user_state['rep_count'],
+                    'rep_features': [
+                        rep for rep in user_state.get('rep_features', [])
+                        if rep['rep'] > user_state['rep_count'] - reps_in_batch
+                    ],
+                    'cues_given': user_state.get('cues_since_last_batch', []),
+                    'embedding': self._batch_embedding(user_state, user_state['rep_count'] - reps_in_batch),
+                    'feedback_heard': list(user_state.get('feedback_heard', []))
+                }
+
+                # Reset batch state
+                user_state['reps_since_last_batch'] = 0
+                user_state['last_batch_time'] = current_time
+                user_state['cues_since_last_batch'] = []
+
+        # Speculate when the rep in progress has passed its key phase and will close a
+        # batch as it ends: Gemini then starts about one rep earlier
+        speculation = None
+        if self.speculative_batches and any(event['type'] == 'bottom' for event in events) and not movement_completed:
+            reps_in_batch = user_state['reps_since_last_batch'] + 1
+            if self._batch_due(user_state, reps_in_batch, current_time, coaching_interval, batch_interval_ms):
+                # The latest finished reps (at least one) predict whether the batch will be
+                # answered from the feedback cache or rep index
+                predictor_after = user_state['rep_count'] - max(reps_in_batch - 1, 1)
+                speculation = {
+                    'rep_count': user_state['rep_count'] + 1,
+                    'rep_features': [
+                        rep for rep in user_state.get('rep_features', [])
+                        if rep['rep'] > user_state['rep_count'] + 1 - reps_in_batch
+                    ],
+                    'cues_given': list(user_state.get('cues_since_last_batch', [])),
+                    'recent_features': [
+                        rep for rep in user_state.get('rep_features', []) if rep['rep'] > predictor_after
+                    ],
+                    'recent_embedding': self._batch_embedding(user_state, predictor_after),
+                    'feedback_heard': list(user_state.get('feedback_heard', []))
+                }
+
+        return FrameDecision(
+            response=response_data,
+            frame_phase=frame_phase,
+            frame_score=self._frame_score(user_state),
+            # The completing frame belongs to the rep just counted, anything else to the next one
+            rep_index=user_state['rep_count'] if movement_completed else user_state['rep_count'] + 1,
+            batch=batch,
+            speculation=speculation,
+            aborted=any(event['type'] == 'abort' for event in events)
+        )
+
+    def _hear(self, user_state: Dict[str, Any], feedback: str):
+        """Remember batch feedback delivered to the session"""
+        heard = [text for text in user_state.get('feedback_heard', []) if text != feedback] + [feedback]
+        user_state['feedback_heard'] = heard[-self.FEEDBACK_HEARD_KEPT:]
+
+    def _count_rep(self, activity_type: str, template_id: Optional[str], pose_history: PoseHistory,
+                   end_event: Dict[str, Any], user_state: Dict[str, Any]) -> Optional[RepScore]:
+        """Count the rep ``end_event`` completed and keep its features and embedding; returns its score"""
+        user_state['rep_count'] += 1
+        user_state['reps_since_last_batch'] += 1
+
+        features = self._rep_kinematics(activity_type, pose_history, end_event)
+        score = self._rep_score(template_id, pose_history, end_event)
+        if score:
+            features['score'] = score.score
+        user_state['aggregates'].add_rep(features)
+        if features:
+            rep_features_kept = user_state.get('rep_features', []) + [dict(rep=user_state['rep_count'], **features)]
+            user_state['rep_features'] = rep_features_kept[-self.REP_FEATURES_KEPT:]
+        embedding = self._rep_embedding(pose_history, end_event)
+        if embedding is not None:
+            # float16 bytes keep the pickled session state small
+            embeddings_kept = user_state.get('rep_embeddings', []) + [
+                (user_state['rep_count'], embedding.astype(np.float16).tobytes())
+            ]
+            user_state['rep_embeddings'] = embeddings_kept[-self.REP_FEATURES_KEPT:]
+        return score
+
+    def _dispatch(self, frame: LiveFrame, decision: FrameDecision,
+                  jpegs: List[Tuple[int, bytes, Optional[str], float]]):
+        """
+        Worker-local side effects of a decision: buffering, speculation and batch feedback.
+        ``jpegs`` are the decoded frames to buffer as (timestamp, jpeg, phase, score).
+        """
+        user_id, activity_type = frame.user_id, frame.activity_type
+        frame_buffer = self.sessions.frame_buffer(user_id)
+        reservoir = self.sessions.reservoir(user_id)
+        response_data, batch, speculation = decision.response, decision.batch, decision.speculation
+
+        # Buffer the decoded frames, tagged with the segmenter phase they were captured in
+        for timestamp, jpeg, phase, score in jpegs:
+            buffered = frame_buffer.append(jpeg, timestamp, phase)
+            if buffered:
+                reservoir.offer(decision.rep_index, buffered, score)
+
+        if decision.aborted:
+            # The rep a speculative request was started for never finished
+            self.sessions.cancel_speculation(user_id)
+        elif (speculation is not None and not self.sessions.has_pending_tasks(user_id)
+              and not self._likely_reused(activity_type, speculation)):
+            speculative_frames = reservoir.select(self._get_key_phases(activity_type)) or frame_buffer.latest(5)
+            if speculative_frames:
+                self.sessions.speculate(
+                    user_id, speculation['rep_count'],
+                    self._request_batch_feedback(
+                        user_id, activity_type,
+                        [buffered.jpeg for buffered in speculative_frames],
+                        [buffered.phase or 'unknown' for buffered in speculative_frames],
+                        speculation
+                    )
+                )
+
+        if batch is None and response_data['movement_completed']:
+            # Speculated, but the finished rep did not close a batch after all
+            self.sessions.cancel_speculation(user_id)
+
+        if batch is None:
+            return
+
+        # Prefer the key moment of each recent rep; fall back to the newest frames
+        batch_frames = reservoir.select(self._get_key_phases(activity_type)) or frame_buffer.latest(5)
+        frame_buffer.clear()
+        reservoir.clear()
+
+        # Same faults as an earlier batch, or reps that move like an already coached
+        # batch (with advice this session hasn't heard yet): reuse that advice instead of calling Gemini
+        cache_key = self._feedback_cache_key(activity_type, batch)
+        cached, cached_type = self.feedback_cache.get(cache_key), 'cached_analysis'
+        if not cached:
+            match = self.rep_index.lookup(
+                self._activity_key(activity_type), batch['embedding'], heard=batch['feedback_heard']
+            )
+            if match:
+                cached, cached_type = match[0], 'similar_rep_analysis'
+        # Otherwise use the request started at this rep's key phase, if there is one
+        speculative = None
+        if cached:
+            self.sessions.cancel_speculation(user_id)
+        else:
+            speculative = self.sessions.take_speculation(user_id, batch['rep_count'])
+        if speculative is not None and self._speculation_succeeded(speculative):
+            # The speculative request already answered: commit it now
+            cached, cached_type = speculative.result(), 'batch_analysis'
+            self._remember_feedback(activity_type, batch, cache_key, cached)
+        elif speculative is not None and speculative.done():
+            speculative = None   # failed or came back empty: ask again
+
+        if cached and not response_data['should_provide_feedback']:
+            response_data.update({
+                'should_provide_feedback': True,
+                'feedback': cached,
+                'feedback_type': cached_type,
+                'feedback_rep_count': batch['rep_count']
+            })
+            self.sessions.spawn(user_id, self._note_heard(user_id, cached))
+        elif cached:
+            self.sessions.spawn(
+                user_id, self._park_feedback(user_id, cached, cached_type, batch['rep_count'])
+            )
+        else:
+            # Gemini runs in the background; the feedback is delivered on a later poll
+            self.sessions.spawn(
+                user_id,
+                self._run_batch_analysis(
+                    user_id, activity_type,
+                    [buffered.jpeg for buffered in batch_frames],
+                    [buffered.phase or 'unknown' for buffered in batch_frames],
+                    batch, cache_key, speculative
+                )
+            )
+            response_data['analysis_pending'] = True
+
+    def _get_detection_phase(self, activity_type: str, user_state: Dict[str, Any]) -> Optional[str]:
+        """Current phase of the rep segmenter (or hold tracker) for this activity, used to tag buffered frames"""
+        hold_tracker = user_state.get('hold_tracker')
+        if hold_tracker is not None and hold_tracker.kind == get_hold_kind(activity_type):
+            return hold_tracker.phase_label
+        segmenter = user_state.get('segmenter')
+        if segmenter is not None and segmenter.kind == get_segmenter_kind(activity_type):
+            return segmenter.phase_label
+        return None
+
+    def _get_key_phases(self, activity_type: str) -> List[str]:
+        """Segmenter phases whose frames say most about form, in priority order"""
+        if get_hold_kind(activity_type) is not None:
+            return ['holding']
+        kind = get_segmenter_kind(activity_type)
+        if kind is not None:
+            return SEGMENTER_PROFILES[kind].key_phase_labels
+        # Legacy detectors only tag the completing frame
+        return ['rep_complete']
+
+    def _rep_kinematics(self, activity_type: str, pose_history: PoseHistory, end_event: Dict[str, Any]) -> Dict[str, float]:
+        """Kinematic features of the rep that ``end_event`` completed (empty if unavailable)"""
+        if 'start' not in end_event:
+            return {}
+        _, landmarks = pose_history.window(end_event['start'], end_event['timestamp'])
+        return rep_features(
+            landmarks, get_segmenter_kind(activity_type),
+            end_event['start'], end_event['bottom'], end_event['timestamp']
+        )
+
+    def _rep_embedding(self, pose_history: PoseHistory, end_event: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Joint-angle trajectory embedding of the rep that ``end_event`` completed"""
+        if 'start' not in end_event:
+            return None
+        _, landmarks = pose_history.window(end_event['start'], end_event['timestamp'])
+        return rep_embedding(landmarks)
+
+    def _rep_score(self, template_id: Optional[str], pose_history: PoseHistory,
+                   end_event: Dict[str, Any]) -> Optional[RepScore]:
+        """Score of the rep that ``end_event`` completed against the template's exemplar"""
+        if 'start' not in end_event or not self.form_scorer.has_exemplar(template_id):
+            return None
+        _, landmarks = pose_history.window(end_event['start'], end_event['timestamp'])
+        return self.form_scorer.score(template_id, landmarks)
+
+    def _batch_embedding(self, user_state: Dict[str, Any], after_rep: int) -> Optional[np.ndarray]:
+        """Mean embedding of the reps numbered above ``after_rep`` (None if none were embedded)"""
+        embeddings = [
+            np.frombuffer(data, dtype=np.float16).astype(np.float32)
+            for rep, data in user_state.get('rep_embeddings', []) if rep > after_rep
+        ]
+        return np.mean(embeddings, axis=0) if embeddings else None
+
+    def _batch_due(self, user_state: Dict[str, Any], reps: int, current_time: int, coaching_interval: float,
+                   batch_interval_ms: float) -> bool:
+        """
+        Whether a batch of ``reps`` reps is due at ``current_time``. This is the pipeline's
+        only throttle: every frame is segmented, and Gemini work is paced here. Nothing is
+        due unless the motion gate saw the athlete move or hold since the last batch.
+        """
+        motion_gate = user_state.get('motion_gate')
+        if motion_gate is None or not motion_gate.present:
+            return False
+        if not motion_gate.active_since(user_state.get('last_batch_time', 0)):
+            return False
+        since_last_batch = current_time - user_state.get('last_batch_time', 0)
+        # Condition 1: Rep-based trigger (e.g., every 5 reps)
+        rep_trigger = reps >= 5
+        # Condition 2: Time-based trigger (e.g., every 7 seconds, paced by load)
+        time_trigger = since_last_batch > batch_interval_ms
+        # Never closer together than the activity's effective coaching interval
+        spaced = since_last_batch >= coaching_interval * 1000
+        return (rep_trigger or time_trigger) and spaced
+
+    def _evaluate_form_rules(self, template_id: Optional[str], pose_history: PoseHistory, events: List[Dict[str, Any]],
+                             frame_phase: Optional[str], current_time: int,
+                             user_state: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """Check this frame's smoothed landmarks against the template's form rules; returns (rule_id, cue) or None"""
+        if not self.form_rules.has_rules(template_id):
+            return None
+        latest = pose_history.latest()
+        if latest is None or latest[0] != current_time:
+            return None
+        active = [frame_phase] + [f"@{event['type']}" for event in events]
+        cue = self.form_rules.evaluate(
+            template_id, latest[1], active, current_time, user_state.setdefault('rule_cooldowns', {})
+        )
+        if cue:
+            user_state['cues_since_last_batch'] = (user_state.get('cues_since_last_batch', []) + [cue[1]])[-10:]
+        return cue
+
+    def _frame_score(self, user_state: Dict[str, Any]) -> float:
+        """
+        How strongly the current frame shows the key position of the movement (higher is
+        better): the segmenter's movement signal, so the deepest squat, highest reach, etc.
+        of each rep is kept for batch analysis.
+        """
+        segmenter = user_state.get('segmenter')
+        return segmenter.signal if segmenter is not None else 0.0
+
+    async def _request_batch_feedback(self, user_id: str, activity_type: str, frames: List[bytes],
+                                      frame_phases: List[str], batch: Dict[str, Any]) -> str:
+        """
+        Gemini feedback for a batch of frames (``batch`` carries rep_count, rep_features and cues_given).
+        The request runs under the session's context, so stopping the session aborts it.
+        """
+        prompt = self.service.get_activity_prompt(
+            activity_type, batch['rep_count'], 'rep_group_analysis', frame_phases,
+            kinematics=summarize_reps(activity_type, batch['rep_features']),
+            cues_given=batch['cues_given']
+        )
+        with self.sessions.request_context(user_id, self.batch_deadline) as ctx, self.pacing.track_call():
+            return await self.gemini_service.analyze_video_frames(frames, prompt, ctx)
+
+    def _likely_reused(self, activity_type: str, speculation: Dict[str, Any]) -> bool:
+        """Whether the latest reps already match cached or indexed feedback (no point speculating)"""
+        cache_key = self._feedback_cache_key(
+            activity_type, {'rep_features': speculation['recent_features'], 'cues_given': speculation['cues_given']}
+        )
+        if self.feedback_cache.ready(cache_key):
+            return True
+        match = self.rep_index.lookup(
+            self._activity_key(activity_type), speculation['recent_embedding'], record=False,
+            heard=speculation['feedback_heard']
+        )
+        return match is not None
+
+    @staticmethod
+    def _speculation_succeeded(task: asyncio.Task) -> bool:
+        return task.done() and not task.cancelled() and task.exception() is None and bool(task.result())
+
+    def _remember_feedback(self, activity_type: str, batch: Dict[str, Any], cache_key, feedback: str):
+        """Make Gemini batch feedback reusable by later batches with the same faults or movement"""
+        self.feedback_cache.put(cache_key, feedback)
+        self.rep_index.add(self._activity_key(activity_type), batch['embedding'], feedback)
+
+    async def _run_batch_analysis(self, user_id: str, activity_type: str, frames: List[bytes],
+                                  frame_phases: List[str], batch: Dict[str, Any], cache_key=None,
+                                  speculative: Optional[asyncio.Task] = None):
+        """
+        Background Gemini batch analysis; the result is parked in the session state.
+        ``batch`` carries rep_count, rep_features, cues_given and the batch embedding.
+        A ``speculative`` request already started for this batch is awaited instead of a new one.
+        """
+        rep_count = batch['rep_count']
+
+        try:
+            if speculative is not None:
+                feedback = await speculative
+            else:
+                feedback = await self._request_batch_feedback(user_id, activity_type, frames, frame_phases, batch)
+            feedback_type = 'batch_analysis'
+            self._remember_feedback(activity_type, batch, cache_key, feedback)
+            logger.info(f"🧠 AI batch feedback generated for {activity_type}")
+        except RequestCancelled:
+            # The session ended: nobody is left to deliver feedback to
+            return
+        except Exception as e:
+            logger.error(f"Error during batched Gemini analysis: {e}")
+            # Use heuristic fallback if AI fails
+            feedback = self._fallback_feedback(activity_type, batch)
+            feedback_type = 'heuristic_fallback'
+
+        if feedback:
+            await self._park_feedback(user_id, feedback, feedback_type, rep_count)
+
+    async def _park_feedback(self, user_id: str, feedback: str, feedback_type: str, rep_count: int):
+        """Store feedback in the session state for delivery on the next poll"""
+        def park_feedback(user_state: Dict[str, Any]):
+            user_state['pending_feedback'] = {
+                'feedback': feedback,
+                'feedback_type': feedback_type,
+                'rep_count': rep_count
+            }
+
+        try:
+            await self.service.update_user_state(user_id, park_feedback)
+        except SessionStateConflict as e:
+            logger.error(f"Dropping batch feedback: {e}")
+
+    async def _note_heard(self, user_id: str, feedback: str):
+        """Remember batch feedback that was delivered straight in a response (parked feedback is noted on delivery)"""
+        try:
+            await self.service.update_user_state(user_id, lambda user_state: self._hear(user_state, feedback))
+        except SessionStateConflict as e:
+            logger.error(f"Could not note delivered feedback: {e}")
+
+    def _activity_key(self, activity_type: str) -> str:
+        """Key shared by sessions of the same activity (template id when there is one)"""
+        return resolve_template_id(activity_type) or activity_type.lower()
+
+    def _feedback_cache_key(self, activity_type: str, batch: Dict[str, Any]):
+        """Feedback cache key for a batch, or None if it has no kinematics to match on"""
+        signature = fault_signature(batch['rep_features'], batch['cues_given'])
+        if signature is None:
+            return None
+        return self._activity_key(activity_type), 'rep_group_analysis', signature
+
+    def _fallback_feedback(self, activity_type: str, batch: Dict[str, Any]) -> Optional[str]:
+        """
+        Heuristic feedback when Gemini fails: the form cue given most often during the batch,
+        else the activity's form-rule cues in turn (None for activities without rules)
+        """
+        rep_count = batch['rep_count']
+        cues_given = batch.get('cues_given') or []
+        if cues_given:
+            cue = Counter(cues_given).most_common(1)[0][0]
+            return f"Rep {rep_count} done! Keep working on this: {cue}"
+        cues = self.form_rules.cues(resolve_template_id(activity_type))
+        if not cues:
+            return None
+        return f"Rep {rep_count} done! {cues[(rep_count - 1) % len(cues)]}"
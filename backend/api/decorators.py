@@ -0,0 +1,58 @@
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+
+from .authentication import GoogleTokenAuthentication
+
+
+def async_api_view(methods, admin_only: bool = False):
+    """
+    Native async counterpart of DRF's ``@api_view`` + ``IsAuthenticated`` (``IsAdminUser``
+    with ``admin_only``) for the live endpoints.
+
+    DRF does not await coroutine views, so the live-coaching views are plain Django async
+    views. This decorator handles method checks, Google token authentication and JSON body
+    parsing (exposed as ``request.data``) without leaving the event loop.
+    """
+    authenticator = GoogleTokenAuthentication()
+
+    def decorator(view_func):
+        @csrf_exempt
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({
+                    'detail': f'Method "{request.method}" not allowed.'
+                }, status=405)
+
+            try:
+                user_auth = await authenticator.aauthenticate(request)
+            except exceptions.AuthenticationFailed as e:
+                return JsonResponse({'detail': str(e.detail)}, status=401)
+
+            if not user_auth:
+                return JsonResponse({
+                    'detail': 'Authentication credentials were not provided.'
+                }, status=401)
+            request.user = user_auth[0]
+            if admin_only and not request.user.is_staff:
+                return JsonResponse({
+                    'detail': 'You do not have permission to perform this action.'
+                }, status=403)
+
+            try:
+                request.data = json.loads(request.body) if request.body else {}
+            except json.JSONDecodeError:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Invalid JSON data'
+                }, status=400)
+
+            return await view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,104 @@
+"""
+Cache of Gemini coaching feedback keyed by what the athlete is doing wrong.
+
+Athletes repeat the same handful of faults, within a set and across sessions, so the same
+batch prompt keeps producing the same advice. Batches are keyed by activity, prompt phase
+and a fault signature (median per-rep kinematics quantised into coarse bins plus the rule
+cues already given). Each key keeps a few responses for variety and is served round-robin
+once it has enough of them. Keys expire after a TTL and are evicted least recently used.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bin widths by feature name (suffix match); features not listed are left out of the signature
+SIGNATURE_BINS = (
+    ('_min', 15.0),   # key joint angle at the bottom, degrees
+    ('rom', 20.0),    # range of motion, degrees
+    ('lean', 10.0),   # trunk lean, degrees
+    ('sym', 5.0),     # left/right difference, degrees
+    ('valgus', 0.1),  # knee/ankle width ratio
+    ('path', 0.25),   # hand drift, torso lengths
+)
+
+
+def fault_signature(rep_features: Sequence[Dict[str, float]], cues_given: Sequence[str] = ()) -> Optional[Tuple]:
+    """Quantised summary of a batch's reps, or None without kinematics (nothing to key on)"""
+    if not rep_features:
+        return None
+    signature = []
+    for name in sorted(rep_features[0]):
+        width = next((width for suffix, width in SIGNATURE_BINS if name.endswith(suffix)), None)
+        if width is None:
+            continue
+        values = [rep[name] for rep in rep_features if rep.get(name) is not None]
+        if values:
+            signature.append((name, int(np.floor(np.median(values) / width))))
+    return tuple(signature) + (tuple(sorted(set(cues_given))),)
+
+
+class FeedbackCache:
+    """LRU + TTL cache holding up to ``variants`` responses per key"""
+
+    def __init__(self, max_keys: int = 1024, ttl: float = 900, variants: int = 2):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.variants = variants
+        # key -> {'created': monotonic, 'responses': [...], 'next': index}
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Optional[Hashable]) -> Optional[str]:
+        """A cached response for ``key`` (rotating through its variants), or None on a miss"""
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry['created'] > self.ttl:
+            del self._entries[key]
+            entry = None
+        # Keep asking Gemini until the key has enough variants to rotate through
+        if entry is None or len(entry['responses']) < self.variants:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        responses: List[str] = entry['responses']
+        response = responses[entry['next'] % len(responses)]
+        entry['next'] += 1
+        self.hits += 1
+        return response
+
+    def ready(self, key: Optional[Hashable]) -> bool:
+        """Whether ``get`` would hit, without counting a lookup or rotating variants"""
+        entry = self._entries.get(key) if key is not None else None
+        return (
+            entry is not None and time.monotonic() - entry['created'] <= self.ttl
+            and len(entry['responses']) >= self.variants
+        )
+
+    def put(self, key: Optional[Hashable], response: str):
+        if key is None or not response:
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {'created': time.monotonic(), 'responses': [], 'next': 0}
+        if response not in entry['responses'] and len(entry['responses']) < self.variants:
+            entry['responses'].append(response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'keys': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
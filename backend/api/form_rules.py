@@ -0,0 +1,173 @@
+"""
+Declarative form rules for instant live cues.
+
+Most live corrections ("sink deeper", "knees out") do not need a vision model: they are a
+threshold on a joint angle at a known point of the rep. Rules are declared per template
+id, compiled once into arrays, and evaluated against the smoothed landmark array on every
+frame with a handful of numpy operations. Cues respect per-rule cooldowns plus a global
+gap so the athlete is not talked over. Gemini batches are left for nuanced feedback.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .pose import (
+    LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP, LEFT_KNEE, RIGHT_KNEE,
+    LEFT_ANKLE, RIGHT_ANKLE, X, midpoint, torso_length
+)
+from .kinematics import angle_landmarks, joint_angles, trunk_lean
+
+
+@dataclass(frozen=True)
+class FormRule:
+    """
+    ``metric op threshold`` checked while ``when`` is active: a RepSegmenter phase label, or
+    ``@<event>`` for the frame on which that segmenter event fires (e.g. ``@bottom``).
+    ``when=None`` checks every frame (holds).
+    """
+    rule_id: str
+    metric: str
+    op: str                     # '<' or '>'
+    threshold: float
+    cue: str
+    when: Optional[str] = None
+    cooldown_ms: int = 10000
+
+
+def _mean_angle(joint: str) -> Callable[[np.ndarray, Dict[str, float]], float]:
+    return lambda points, angles: (angles[f'left_{joint}'] + angles[f'right_{joint}']) / 2
+
+
+def _knee_ankle_ratio(points: np.ndarray, angles: Dict[str, float]) -> float:
+    ankle_width = abs(points[LEFT_ANKLE, X] - points[RIGHT_ANKLE, X])
+    return abs(points[LEFT_KNEE, X] - points[RIGHT_KNEE, X]) / max(ankle_width, 1e-3)
+
+
+def _hip_sag(points: np.ndarray, angles: Dict[str, float]) -> float:
+    """Hip distance below the shoulder-ankle line in torso lengths (negative = piked)"""
+    shoulder = midpoint(points, LEFT_SHOULDER, RIGHT_SHOULDER)
+    ankle = midpoint(points, LEFT_ANKLE, RIGHT_ANKLE)
+    hip = midpoint(points, LEFT_HIP, RIGHT_HIP)
+    span = ankle[0] - shoulder[0]
+    if abs(span) < 1e-3:
+        return 0.0
+    line_y = shoulder[1] + (hip[0] - shoulder[0]) / span * (ankle[1] - shoulder[1])
+    return (hip[1] - line_y) / torso_length(points)
+
+
+METRICS: Dict[str, Callable[[np.ndarray, Dict[str, float]], float]] = {
+    'knee_angle': _mean_angle('knee'),
+    'hip_angle': _mean_angle('hip'),
+    'elbow_angle': _mean_angle('elbow'),
+    'shoulder_angle': _mean_angle('shoulder'),
+    'trunk_lean': lambda points, angles: float(trunk_lean(points)),
+    'knee_ankle_ratio': _knee_ankle_ratio,
+    'hip_sag': _hip_sag,
+}
+
+
+# Landmarks each metric reads, so a landmark projection keeps them
+METRIC_LANDMARKS: Dict[str, FrozenSet[int]] = {
+    'knee_angle': angle_landmarks(['left_knee', 'right_knee']),
+    'hip_angle': angle_landmarks(['left_hip', 'right_hip']),
+    'elbow_angle': angle_landmarks(['left_elbow', 'right_elbow']),
+    'shoulder_angle': angle_landmarks(['left_shoulder', 'right_shoulder']),
+    'trunk_lean': frozenset((LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP)),
+    'knee_ankle_ratio': frozenset((LEFT_KNEE, RIGHT_KNEE, LEFT_ANKLE, RIGHT_ANKLE)),
+    'hip_sag': frozenset((LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP, LEFT_ANKLE, RIGHT_ANKLE)),
+}
+
+
+# Rules per template id
+FORM_RULES: Dict[str, List[FormRule]] = {
+    'squat_form': [
+        FormRule('squat_depth', 'knee_angle', '>', 110, "Sink deeper - hips down to knee level.", when='@bottom'),
+        FormRule('squat_knees_in', 'knee_ankle_ratio', '<', 0.8, "Push your knees out over your toes.", when='ascent'),
+        FormRule('squat_lean', 'trunk_lean', '>', 50, "Chest up - don't fold forward.", when='ascent'),
+    ],
+    'pushup_technique': [
+        FormRule('pushup_depth', 'elbow_angle', '>', 110, "Lower your chest closer to the floor.", when='@bottom'),
+        FormRule('pushup_sag', 'hip_sag', '>', 0.25, "Squeeze your glutes - don't let your hips sag.", when='press'),
+        FormRule('pushup_pike', 'hip_sag', '<', -0.3, "Drop your hips into a straight line.", when='press'),
+    ],
+    'jumping_jacks': [
+        FormRule('jj_arms', 'shoulder_angle', '<', 140, "Reach all the way overhead.", when='@bottom'),
+    ],
+    'plank_hold': [
+        FormRule('plank_sag', 'hip_sag', '>', 0.2, "Hips up - keep a straight line.", cooldown_ms=8000),
+        FormRule('plank_pike', 'hip_sag', '<', -0.3, "Lower your hips, you're piking.", cooldown_ms=8000),
+    ],
+    'deadlift_form': [
+        FormRule('deadlift_knees_in', 'knee_ankle_ratio', '<', 0.8, "Keep your knees out as you drive up."),
+    ],
+}
+
+
+class CompiledRuleSet:
+    """A template's rules as arrays: one metric pass and one vector comparison per frame"""
+
+    def __init__(self, rules: Sequence[FormRule]):
+        self.rules = list(rules)
+        self.metrics = sorted({rule.metric for rule in self.rules})
+        self._metric_index = np.array([self.metrics.index(rule.metric) for rule in self.rules])
+        self._thresholds = np.array([rule.threshold for rule in self.rules], dtype=np.float64)
+        # '>' violates when value - threshold > 0, '<' when threshold - value > 0
+        self._signs = np.array([1.0 if rule.op == '>' else -1.0 for rule in self.rules])
+        self._needs_angles = any(metric.endswith('_angle') for metric in self.metrics)
+
+    def violations(self, points: np.ndarray, active: Iterable[str]) -> List[FormRule]:
+        """Rules violated by this frame, considering only rules whose ``when`` is active"""
+        active = set(active)
+        applicable = np.array([rule.when is None or rule.when in active for rule in self.rules])
+        if not applicable.any():
+            return []
+        angles = joint_angles(points) if self._needs_angles else {}
+        values = np.array([METRICS[metric](points, angles) for metric in self.metrics], dtype=np.float64)
+        violated = applicable & (self._signs * (values[self._metric_index] - self._thresholds) > 0)
+        return [rule for rule, hit in zip(self.rules, violated) if hit]
+
+
+class FormRuleEngine:
+    """Compiled rule sets by template id, with per-session cooldown bookkeeping"""
+
+    # Minimum gap between any two rule cues for one athlete
+    MIN_CUE_GAP_MS = 2500
+
+    def __init__(self, rules: Optional[Dict[str, List[FormRule]]] = None):
+        self._compiled = {
+            template_id: CompiledRuleSet(template_rules)
+            for template_id, template_rules in (rules if rules is not None else FORM_RULES).items()
+        }
+
+    def has_rules(self, template_id: Optional[str]) -> bool:
+        return template_id in self._compiled
+
+    def landmarks(self, template_id: Optional[str]) -> FrozenSet[int]:
+        """Landmarks the template's rules read"""
+        rule_set = self._compiled.get(template_id)
+        if rule_set is None:
+            return frozenset()
+        return frozenset().union(*(METRIC_LANDMARKS[metric] for metric in rule_set.metrics))
+
+    def cues(self, template_id: Optional[str]) -> List[str]:
+        """The template's cues, in rule order (empty without rules)"""
+        rule_set = self._compiled.get(template_id)
+        return [rule.cue for rule in rule_set.rules] if rule_set is not None else []
+
+    def evaluate(self, template_id: Optional[str], points: np.ndarray, active: Iterable[str], now_ms: int,
+                 cooldowns: Dict[str, int]) -> Optional[Tuple[str, str]]:
+        """
+        Return ``(rule_id, cue)`` for the first violated rule that is off cooldown, recording it
+        in ``cooldowns`` (a picklable dict kept in session state), or None.
+        """
+        rule_set = self._compiled.get(template_id)
+        if rule_set is None or now_ms - cooldowns.get('*', -self.MIN_CUE_GAP_MS) < self.MIN_CUE_GAP_MS:
+            return None
+        for rule in rule_set.violations(points, active):
+            if now_ms - cooldowns.get(rule.rule_id, -rule.cooldown_ms) >= rule.cooldown_ms:
+                cooldowns[rule.rule_id] = now_ms
+                cooldowns['*'] = now_ms
+                return rule.rule_id, rule.cue
+        return None
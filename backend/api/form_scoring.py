@@ -0,0 +1,168 @@
+"""
+Server-side rep scoring against reference trajectories.
+
+Each template has an exemplar rep: the joint angles a clean rep moves through, as
+keyframes over the rep (0 = start, 1 = end). A segmented rep's joint-angle trajectory is
+resampled to a fixed number of steps and aligned to the exemplar with dynamic time
+warping inside a Sakoe-Chiba band, so a slow descent or a fast drive is not penalised as
+bad form. The aligned mean deviation becomes a 0-100 score, and the per-joint signed
+deviation along the path names what went wrong ("right_knee -25" = 25 degrees less
+extension than the exemplar). 32 steps and a band of 8 keep a score well under a
+millisecond: the DP advances one anti-diagonal at a time as a single vector operation.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .kinematics import angle_landmarks, joint_angles
+
+# Exemplar keyframes per template id: joint (both sides) -> [(rep fraction, degrees), ...]
+EXEMPLARS: Dict[str, Dict[str, Sequence[Tuple[float, float]]]] = {
+    'squat_form': {
+        'knee': [(0.0, 172), (0.5, 85), (1.0, 172)],
+        'hip': [(0.0, 172), (0.5, 80), (1.0, 172)],
+    },
+    'pushup_technique': {
+        'elbow': [(0.0, 165), (0.5, 80), (1.0, 165)],
+        'hip': [(0.0, 172), (1.0, 172)],
+    },
+    'jumping_jacks': {
+        'shoulder': [(0.0, 20), (0.5, 165), (1.0, 20)],
+        'elbow': [(0.0, 165), (1.0, 165)],
+    },
+    'basketball_shooting': {
+        'elbow': [(0.0, 80), (0.4, 75), (0.6, 165), (1.0, 150)],
+        'knee': [(0.0, 140), (0.4, 165), (1.0, 170)],
+    },
+}
+
+
+@dataclass
+class RepScore:
+    """Score of one rep: 0-100, aligned mean deviation, and the joints furthest off"""
+    score: int
+    deviation_deg: float
+    worst_joints: List[Tuple[str, float]] = field(default_factory=list)   # (joint, signed mean deviation)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'score': self.score,
+            'deviation_deg': self.deviation_deg,
+            'worst_joints': [{'joint': joint, 'deviation_deg': deviation} for joint, deviation in self.worst_joints],
+        }
+
+
+def _exemplar_trajectory(keyframes: Dict[str, Sequence[Tuple[float, float]]],
+                         steps: int) -> Tuple[List[str], np.ndarray]:
+    """Joint names and their ``(J, steps)`` exemplar angles, left and right sides included"""
+    target = np.linspace(0.0, 1.0, steps)
+    joints, rows = [], []
+    for joint, points in keyframes.items():
+        fractions, degrees = zip(*points)
+        row = np.interp(target, fractions, degrees)
+        for side in ('left', 'right'):
+            joints.append(f'{side}_{joint}')
+            rows.append(row)
+    return joints, np.array(rows)
+
+
+def band_diagonals(n: int, m: int, band: int) -> List[Tuple[np.ndarray, ...]]:
+    """
+    Flat indices, per anti-diagonal, of the in-band cells of an ``(n + 1, m + 1)`` DTW table:
+    (cell, up, left, diagonal, cost). Computed once per shape and reused for every rep.
+    """
+    band = max(band, abs(n - m))
+    width = m + 1
+    diagonals = []
+    for k in range(2, n + m + 1):
+        i = np.arange(max(1, k - m), min(n, k - 1) + 1)
+        j = k - i
+        inside = np.abs(i - j) <= band
+        i, j = i[inside], j[inside]
+        if len(i):
+            cell = i * width + j
+            diagonals.append((cell, cell - width, cell - 1, cell - width - 1, (i - 1) * m + (j - 1)))
+    return diagonals
+
+
+def dtw(cost: np.ndarray, diagonals: List[Tuple[np.ndarray, ...]]) -> Tuple[float, List[Tuple[int, int]]]:
+    """
+    DTW over an ``(n, m)`` cost matrix restricted to ``diagonals`` (see ``band_diagonals``).
+    Returns the accumulated cost of the best path and the path as (i, j) pairs from
+    (0, 0) to (n - 1, m - 1).
+    """
+    n, m = cost.shape
+    acc = np.full((n + 1) * (m + 1), np.inf)
+    acc[0] = 0.0
+    flat_cost = cost.ravel()
+    # Cells on anti-diagonal k = i + j depend only on diagonals k - 1 and k - 2
+    for cell, up, left, diagonal, source in diagonals:
+        acc[cell] = flat_cost[source] + np.minimum(np.minimum(acc[up], acc[left]), acc[diagonal])
+
+    table = acc.reshape(n + 1, m + 1).tolist()
+    path = [(n - 1, m - 1)]
+    i, j = n, m
+    while i > 1 or j > 1:
+        i, j = min(((i - 1, j - 1), (i - 1, j), (i, j - 1)), key=lambda step: table[step[0]][step[1]])
+        path.append((i - 1, j - 1))
+    path.reverse()
+    return table[n][m], path
+
+
+class FormScorer:
+    """Scores reps against the exemplar of their template"""
+
+    def __init__(self, exemplars: Optional[Dict[str, Dict[str, Sequence[Tuple[float, float]]]]] = None,
+                 steps: int = 32, band: int = 8, tolerance_deg: float = 40.0, worst_count: int = 3,
+                 min_deviation_deg: float = 10.0):
+        self.steps = steps
+        self.band = band
+        # Mean aligned deviation that scores 0
+        self.tolerance_deg = tolerance_deg
+        self.worst_count = worst_count
+        self.min_deviation_deg = min_deviation_deg
+        self._diagonals = band_diagonals(steps, steps, band)
+        self._exemplars = {
+            template_id: _exemplar_trajectory(keyframes, steps)
+            for template_id, keyframes in (exemplars if exemplars is not None else EXEMPLARS).items()
+        }
+
+    def has_exemplar(self, template_id: Optional[str]) -> bool:
+        return template_id in self._exemplars
+
+    def landmarks(self, template_id: Optional[str]) -> FrozenSet[int]:
+        """Landmarks the template's exemplar angles are measured from"""
+        if template_id not in self._exemplars:
+            return frozenset()
+        return angle_landmarks(self._exemplars[template_id][0])
+
+    def score(self, template_id: Optional[str], landmarks: np.ndarray, aspect: float = 1.0) -> Optional[RepScore]:
+        """Score a rep from its ``(N, 33, 4)`` landmark frames; None without an exemplar or < 2 frames"""
+        if template_id not in self._exemplars or len(landmarks) < 2:
+            return None
+        joints, reference = self._exemplars[template_id]
+
+        angles = joint_angles(landmarks, aspect)
+        source = np.linspace(0.0, 1.0, len(landmarks))
+        target = np.linspace(0.0, 1.0, self.steps)
+        trajectory = np.array([np.interp(target, source, angles[joint]) for joint in joints])
+
+        # cost[i, j]: mean absolute joint-angle difference between rep step i and exemplar step j
+        difference = trajectory[:, :, None] - reference[:, None, :]
+        total, path = dtw(np.abs(difference).mean(axis=0), self._diagonals)
+        deviation = total / len(path)
+
+        rows, cols = zip(*path)
+        per_joint = difference[:, rows, cols].mean(axis=1)
+        order = np.argsort(-np.abs(per_joint))[:self.worst_count]
+        worst = [
+            (joints[i], round(float(per_joint[i]), 1))
+            for i in order if abs(per_joint[i]) >= self.min_deviation_deg
+        ]
+        return RepScore(
+            score=int(round(100 * max(0.0, 1.0 - deviation / self.tolerance_deg))),
+            deviation_deg=round(deviation, 1),
+            worst_joints=worst
+        )
@@ -0,0 +1,134 @@
+import base64
+import binascii
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class BufferedFrame(NamedTuple):
+    """A decoded JPEG frame captured during a live session"""
+    timestamp: int          # client timestamp in milliseconds
+    jpeg: bytes             # raw JPEG bytes (not base64)
+    phase: Optional[str]    # detector phase when the frame arrived
+
+
+class FrameRingBuffer:
+    """
+    Bounded per-session buffer of live frames.
+
+    Frames are kept as raw JPEG bytes (base64 inflates them by a third) and the buffer is
+    capped both by frame count and by total bytes. Appends and evictions are O(1).
+    """
+
+    def __init__(self, max_frames: int = 30, max_bytes: int = 2 * 1024 * 1024):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self._frames = deque()
+        self._nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __bool__(self) -> bool:
+        return bool(self._frames)
+
+    @property
+    def nbytes(self) -> int:
+        """Total JPEG bytes currently held"""
+        return self._nbytes
+
+    def append(self, jpeg: bytes, timestamp: int, phase: Optional[str] = None) -> Optional[BufferedFrame]:
+        """Add a frame, evicting the oldest ones until both caps are satisfied"""
+        if not jpeg or len(jpeg) > self.max_bytes:
+            return None
+        frame = BufferedFrame(timestamp, jpeg, phase)
+        self._frames.append(frame)
+        self._nbytes += len(jpeg)
+        while len(self._frames) > self.max_frames or self._nbytes > self.max_bytes:
+            self._nbytes -= len(self._frames.popleft().jpeg)
+        return frame
+
+    def latest(self, count: int) -> List[BufferedFrame]:
+        """Return up to ``count`` most recent frames, oldest first"""
+        if count <= 0:
+            return []
+        frames = list(islice(reversed(self._frames), count))
+        frames.reverse()
+        return frames
+
+    def clear(self):
+        self._frames.clear()
+        self._nbytes = 0
+
+
+def decode_frame(frame_data: str) -> Optional[bytes]:
+    """Decode a client frame (plain base64 or ``data:image/jpeg;base64,...``) into JPEG bytes"""
+    if not frame_data:
+        return None
+    if frame_data.startswith('data:'):
+        frame_data = frame_data.split(',', 1)[-1]
+    try:
+        return base64.b64decode(frame_data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+class PhaseReservoir:
+    """
+    Most informative frame per (rep, phase) for the reps since the last batch.
+
+    The ring buffer only knows which frames are newest, and after the last rep those are
+    all rest-position frames. The reservoir keeps, for each recent rep, the best-scoring
+    frame of each detector phase (deepest squat bottom, highest jumping-jack reach, ...).
+    """
+
+    def __init__(self, max_reps: int = 5):
+        self.max_reps = max_reps
+        # rep_index -> {phase: (score, BufferedFrame)}, oldest rep first
+        self._reps: "OrderedDict[int, Dict[str, Tuple[float, BufferedFrame]]]" = OrderedDict()
+
+    def __bool__(self) -> bool:
+        return bool(self._reps)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(frame.jpeg) for phases in self._reps.values() for _, frame in phases.values())
+
+    def offer(self, rep_index: int, frame: BufferedFrame, score: float):
+        """Keep ``frame`` if it beats the current best for its rep and phase (ties go to newer)"""
+        if frame.phase is None:
+            return
+        phases = self._reps.get(rep_index)
+        if phases is None:
+            phases = self._reps[rep_index] = {}
+            while len(self._reps) > self.max_reps:
+                self._reps.popitem(last=False)
+        best = phases.get(frame.phase)
+        if best is None or score >= best[0]:
+            phases[frame.phase] = (score, frame)
+
+    def select(self, key_phases: Sequence[str], max_frames: int = 5, min_frames: int = 3) -> List[BufferedFrame]:
+        """
+        Pick frames for a batch: key-phase frames from the newest reps first, topped up with
+        the best remaining phases if fewer than ``min_frames`` were found. Returned oldest first.
+        """
+        selected: List[BufferedFrame] = []
+        for phases in reversed(self._reps.values()):
+            for phase in key_phases:
+                if phase in phases and len(selected) < max_frames:
+                    selected.append(phases[phase][1])
+
+        if len(selected) < min_frames:
+            chosen = {id(frame) for frame in selected}
+            remaining = [
+                entry for phases in self._reps.values() for entry in phases.values()
+                if id(entry[1]) not in chosen
+            ]
+            remaining.sort(key=lambda entry: entry[0], reverse=True)
+            selected.extend(frame for _, frame in remaining[:min_frames - len(selected)])
+
+        selected.sort(key=lambda frame: frame.timestamp)
+        return selected
+
+    def clear(self):
+        self._reps.clear()
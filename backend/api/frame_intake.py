@@ -0,0 +1,115 @@
+"""
+Latest-wins intake of live frames for one session.
+
+A client posts frames on a timer whether or not the previous request has finished, so
+when the backend is slow a session's requests pile up and used to be processed in arrival
+order: feedback then described a moment the athlete had moved past seconds ago. The
+intake admits one frame at a time per session and keeps at most one frame waiting; a
+newer frame supersedes the waiting one, which returns at once without doing any work.
+Frames older than the newest admitted one are dropped: sequenced frames by client
+sequence number, unsequenced ones by timestamp against other unsequenced frames only (a
+client may post the same moment on two endpoints, one of them without a sequence). Every
+admitted frame carries a deadline after which its result is thrown away instead of sent.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Reasons a frame is not processed or its result not sent
+OUT_OF_ORDER = 'out_of_order'
+SUPERSEDED = 'superseded'
+STALE = 'stale'
+
+
+@dataclass
+class FrameTicket:
+    """An admitted frame: ``dropped`` is set if it lost its turn before being processed"""
+    sequence: Optional[int]
+    timestamp: int
+    deadline: float                   # monotonic seconds
+    dropped: Optional[str] = None
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() > self.deadline
+
+
+class FrameIntake:
+    """Single-slot, latest-wins admission of a session's frames (worker-local, event-loop only)"""
+
+    def __init__(self, max_age_ms: int = 1500):
+        self.max_age_ms = max_age_ms
+        self.last_sequence: Optional[int] = None
+        # Newest unsequenced frame; sequenced frames are ordered by sequence alone
+        self.last_timestamp: Optional[int] = None
+        self._busy = False
+        self._waiting: Optional[asyncio.Future] = None
+        self.counts: Dict[str, int] = {'processed': 0, OUT_OF_ORDER: 0, SUPERSEDED: 0, STALE: 0}
+
+    def _in_order(self, sequence: Optional[int], timestamp: int) -> bool:
+        if sequence is not None:
+            return self.last_sequence is None or sequence > self.last_sequence
+        return self.last_timestamp is None or timestamp > self.last_timestamp
+
+    @asynccontextmanager
+    async def admit(self, sequence: Optional[int], timestamp: int) -> AsyncIterator[FrameTicket]:
+        """
+        Wait for this session's turn. The yielded ticket has ``dropped`` set when the frame is
+        out of order, was superseded while waiting, or expired before its turn came.
+        """
+        ticket = FrameTicket(sequence, timestamp, time.monotonic() + self.max_age_ms / 1000)
+        if not self._in_order(sequence, timestamp):
+            ticket.dropped = OUT_OF_ORDER
+            self.counts[OUT_OF_ORDER] += 1
+            yield ticket
+            return
+        if sequence is not None:
+            self.last_sequence = sequence
+        else:
+            self.last_timestamp = timestamp
+
+        if self._busy:
+            if self._waiting is not None and not self._waiting.done():
+                self._waiting.set_result(False)
+            waiting = self._waiting = asyncio.get_running_loop().create_future()
+            try:
+                granted = await waiting
+            except asyncio.CancelledError:
+                if self._waiting is waiting:
+                    self._waiting = None
+                elif waiting.done() and not waiting.cancelled() and waiting.result():
+                    self._release()   # the slot was handed over just as we were cancelled
+                raise
+            if not granted:
+                ticket.dropped = SUPERSEDED
+                self.counts[SUPERSEDED] += 1
+                yield ticket
+                return
+        # The slot is ours, either free or handed over by the previous frame
+        self._busy = True
+        try:
+            if ticket.expired:
+                ticket.dropped = STALE
+                self.counts[STALE] += 1
+            else:
+                self.counts['processed'] += 1
+            yield ticket
+        finally:
+            self._release()
+
+    def _release(self):
+        waiting, self._waiting = self._waiting, None
+        if waiting is not None and not waiting.done():
+            waiting.set_result(True)   # hand the slot straight to the newest waiting frame
+        else:
+            self._busy = False
+
+    def discard_stale(self):
+        """Record a result thrown away because it finished past its ticket's deadline"""
+        self.counts[STALE] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counts)
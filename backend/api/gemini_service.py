@@ -1,12 +1,20 @@
 import os
+import asyncio
+import weakref
 import tempfile
 import requests
 import base64
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 from django.conf import settings
 import json
 import httpx
 import logging
+from .pose_extraction import (
+    LandmarkTrack, pose_extraction_available, extract_pose_track, read_frames_at, select_key_frames, crop_to_pose
+)
+from .kinematics import features_from_track, summarize_rep_data, summarize_reps
+from .request_context import RequestContext, RequestCancelled, DeadlineExceeded
+from .session_aggregates import SessionAggregates, format_session_summary
 
 # Make OpenCV optional for development
 try:
@@ -18,6 +26,22 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# One pooled AsyncClient per event loop. Under ASGI each worker runs a single loop,
+# so every live-coaching request in the worker shares the same keep-alive pool.
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+_ASYNC_CLIENT_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the shared pooled AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(limits=_ASYNC_CLIENT_LIMITS, timeout=30)
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
 class GeminiAnalysisService:
     """
     Service for analyzing videos using Google Gemini AI
@@ -73,7 +97,32 @@ class GeminiAnalysisService:
         cap.release()
         return frames
     
-    def analyze_activity(self, video_file, prompt: str) -> Dict[str, Any]:
+    def extract_key_frames(self, video_path: str) -> Tuple[LandmarkTrack, List[str], List[int]]:
+        """
+        Pose-guided frame extraction: run the pose model over sampled frames, keep the most
+        distinctive poses and crop them around the athlete.
+        Returns the landmark track, base64 JPEG crops and the track indices they came from.
+        """
+        track = extract_pose_track(video_path)
+        indices = select_key_frames(track, count=getattr(settings, 'POSE_KEY_FRAMES', 6))
+        if not indices:
+            raise ValueError("No body pose detected in video")
+        
+        # Only the chosen frames are decoded at full resolution, one at a time
+        full_frames = read_frames_at(video_path, [int(track.frame_indices[i]) for i in indices])
+        frames, kept = [], []
+        for i, frame in zip(indices, full_frames):
+            if frame is None:
+                continue
+            crop = crop_to_pose(frame, track.landmarks[i])
+            _, buffer = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            frames.append(base64.b64encode(buffer).decode('utf-8'))
+            kept.append(i)
+        if not frames:
+            raise ValueError("Key frames could not be decoded")
+        return track, frames, kept
+    
+    def analyze_activity(self, video_file, prompt: str, activity_type: str = '') -> Dict[str, Any]:
         """
         Analyze activity video using Gemini AI
         """
@@ -84,8 +133,16 @@ class GeminiAnalysisService:
                     temp_file.write(chunk)
                 temp_path = temp_file.name
             
-            # Extract frames
-            frames = self.extract_frames(temp_path, max_frames=20)
+            # Prefer a few pose-selected, cropped key frames; fall back to plain sampling
+            pose_track = None
+            if pose_extraction_available():
+                try:
+                    pose_track, frames, key_indices = self.extract_key_frames(temp_path)
+                except Exception as e:
+                    logger.warning(f"Pose extraction failed, falling back to frame sampling: {e}")
+                    pose_track = None
+            if pose_track is None:
+                frames = self.extract_frames(temp_path, max_frames=20)
             
             # Clean up temp file
             os.unlink(temp_path)
@@ -93,6 +150,23 @@ class GeminiAnalysisService:
             if not frames:
                 raise ValueError("No frames could be extracted from video")
             
+            rep_kinematics = []
+            if pose_track is not None:
+                key_times = ', '.join(f"{pose_track.timestamps_ms[i] / 1000:.1f}s" for i in key_indices)
+                prompt = (
+                    f"{prompt}\n\nThe images are {len(frames)} key frames of the movement, cropped "
+                    f"around the athlete, taken at {key_times}."
+                )
+                rep_kinematics = features_from_track(
+                    pose_track.timestamps_ms, pose_track.landmarks, activity_type,
+                    aspect=pose_track.width / pose_track.height
+                )
+                if rep_kinematics:
+                    prompt = (
+                        f"{prompt}\n\nMeasured kinematics from pose tracking:\n"
+                        f"{summarize_reps(activity_type, rep_kinematics)}"
+                    )
+            
             # Prepare request for Gemini
             parts = [{"text": prompt}]
             
@@ -141,6 +215,8 @@ class GeminiAnalysisService:
                 "success": True,
                 "analysis": analysis_text,
                 "frames_analyzed": len(frames),
+                "pose_frames": len(pose_track) if pose_track is not None else 0,
+                "rep_kinematics": rep_kinematics,
                 "prompt_used": prompt
             }
             
@@ -232,7 +308,7 @@ class GeminiAnalysisService:
             2. Specific areas for improvement based on the real-time feedback given
             3. Strengths observed during the session
             4. Recommendations for future training
-            5. Form analysis based on the rep-by-rep data
+            5. Form analysis based on the per-rep statistics
             
             Be specific and actionable in your feedback.
             """
@@ -292,32 +368,27 @@ class GeminiAnalysisService:
             }
     
     def _create_session_summary(self, coaching_data: Dict[str, Any]) -> str:
-        """Create a comprehensive text summary of the coaching session"""
+        """
+        Create a text summary of the coaching session. Rep statistics come from the server's
+        running aggregates (``serverSummary``, returned by the stop endpoint) when the client
+        sends them, otherwise they are aggregated from the client's reps; either way every rep
+        counts and the summary does not grow with the session.
+        """
         summary_parts = []
         
         # Basic session info
         activity = coaching_data.get('activityName', 'Unknown Activity')
-        total_reps = coaching_data.get('totalReps', 0)
         avg_score = coaching_data.get('averageFormScore', 0)
-        duration = coaching_data.get('endTime', 0) - coaching_data.get('startTime', 0)
-        duration_seconds = duration / 1000 if duration > 0 else 0
-        
         summary_parts.append(f"Activity: {activity}")
-        summary_parts.append(f"Session Duration: {duration_seconds:.1f} seconds")
-        summary_parts.append(f"Total Reps Completed: {total_reps}")
-        summary_parts.append(f"Average Form Score: {avg_score}%")
         
-        # Rep-by-rep analysis
-        reps = coaching_data.get('reps', [])
-        if reps:
-            summary_parts.append("\nRep-by-Rep Performance:")
-            for rep in reps[:10]:  # Limit to first 10 reps for brevity
-                rep_duration = (rep.get('endTime', 0) - rep.get('startTime', 0)) / 1000
-                cues_count = len(rep.get('cuesGiven', []))
-                summary_parts.append(
-                    f"  Rep {rep.get('number', '?')}: {rep.get('formScore', 0)}% form, "
-                    f"{rep_duration:.1f}s duration, {cues_count} coaching cues"
-                )
+        aggregates = coaching_data.get('serverSummary')
+        if not isinstance(aggregates, dict) or not aggregates.get('score'):
+            summary_parts.append(f"Average Form Score: {avg_score}%")
+        if not isinstance(aggregates, dict):
+            aggregates = SessionAggregates.from_client_session(coaching_data).summary()
+            aggregates['total_reps'] = coaching_data.get('totalReps', aggregates['total_reps'])
+        summary_parts.append("\nSession Statistics:")
+        summary_parts.append(format_session_summary(aggregates))
         
         # Coaching cues analysis
         all_cues = coaching_data.get('allCues', [])
@@ -349,6 +420,9 @@ class GeminiAnalysisService:
         # Find best rep score
         reps = coaching_data.get('reps', [])
         best_rep_score = max([rep.get('formScore', 0) for rep in reps]) if reps else 0
+        server_score = (coaching_data.get('serverSummary') or {}).get('score')
+        if not reps and server_score:
+            best_rep_score = server_score['max']
         
         # Count cues by type
         all_cues = coaching_data.get('allCues', [])
@@ -385,9 +459,16 @@ class GeminiAnalysisService:
             "cues_given": len(all_cues)
         }
     
-    async def analyze_video_frames(self, frames_data: List[str], prompt: str) -> str:
+    def _request_timeout(self, ctx: Optional[RequestContext]) -> float:
+        """HTTP timeout: the service default, or less if the context's deadline is sooner"""
+        remaining = ctx.remaining() if ctx is not None else None
+        return self.timeout if remaining is None else min(self.timeout, remaining)
+
+    async def analyze_video_frames(self, frames_data: List[Union[str, bytes]], prompt: str,
+                                   ctx: Optional[RequestContext] = None) -> str:
         """
         Analyze a sequence of video frames for comprehensive feedback.
+        The request is aborted if ``ctx`` is cancelled or its deadline passes.
         """
         if not self.api_key:
             return "Error: Gemini API key not configured"
@@ -401,6 +482,9 @@ class GeminiAnalysisService:
             # Construct a multi-image prompt
             parts = [{"text": prompt}]
             for frame_data in frames_data:
+                # Live sessions buffer raw JPEG bytes; encode them only at send time
+                if isinstance(frame_data, bytes):
+                    frame_data = base64.b64encode(frame_data).decode('utf-8')
                 if frame_data and len(frame_data.strip()) > 50:
                     parts.append({
                         "inline_data": {
@@ -428,9 +512,10 @@ class GeminiAnalysisService:
 
             headers = {'Content-Type': 'application/json'}
             
-            # Make the async request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, headers=headers, timeout=self.timeout)
+            # Make the async request over the shared connection pool
+            client = get_async_client()
+            request = client.post(url, json=payload, headers=headers, timeout=self._request_timeout(ctx))
+            response = await (ctx.run(request) if ctx is not None else request)
 
             response.raise_for_status()
             response_json = response.json()
@@ -446,13 +531,73 @@ class GeminiAnalysisService:
             logger.error(f"HTTP Error analyzing frames: {e.response.status_code} - {e.response.text}")
             # Reraise to be handled by the coaching service
             raise e
+        except (RequestCancelled, DeadlineExceeded) as e:
+            logger.info(f"Frame analysis abandoned: {ctx.reason if isinstance(e, RequestCancelled) else 'deadline passed'}")
+            raise e
         except Exception as e:
             logger.error(f"An unexpected error occurred during frame analysis: {e}")
             raise e
 
-    async def analyze_video_frame(self, frame_data: str, prompt: str) -> str:
+    async def analyze_movement_data(self, prompt: str, rep_data: Dict[str, Any], deadline: Optional[float] = None,
+                                    max_output_tokens: Optional[int] = None,
+                                    ctx: Optional[RequestContext] = None,
+                                    landmark_indices: Optional[Sequence[int]] = None) -> str:
+        """
+        Fast text-only analysis of one finished rep, for voice coaching between reps.
+
+        The rep's phases and landmarks go in as a few lines of numbers instead of images
+        (only the angles ``landmark_indices`` can measure, when the activity has a projection),
+        the reply is capped at a sentence or two, and the call is abandoned after ``deadline``
+        seconds or when ``ctx`` is cancelled (returning "") so late advice never talks over
+        the next rep.
+        """
+        if not self.api_key:
+            return ""
+
+        deadline = deadline or getattr(settings, 'LIVE_REP_ANALYSIS_DEADLINE_SECONDS', 2.5)
+        summary = summarize_rep_data(rep_data, landmark_indices)
+        text = f"{prompt}\n\nMeasured rep data from pose tracking:\n{summary}" if summary else prompt
+        payload = {
+            "contents": [{"parts": [{"text": text}]}],
+            "generationConfig": {
+                "temperature": 0.4,
+                "topK": 32,
+                "topP": 0.95,
+                "maxOutputTokens": max_output_tokens or getattr(settings, 'LIVE_REP_ANALYSIS_MAX_OUTPUT_TOKENS', 80),
+            }
+        }
+
+        ctx = ctx.child(deadline) if ctx is not None else RequestContext.with_timeout(deadline)
+        client = get_async_client()
+        try:
+            with ctx:
+                response = await ctx.run(client.post(
+                    f"{self.api_url}?key={self.api_key}",
+                    json=payload,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=self._request_timeout(ctx)
+                ))
+            response.raise_for_status()
+            response_json = response.json()
+        except (DeadlineExceeded, httpx.TimeoutException):
+            logger.warning(f"Rep analysis missed its {deadline}s deadline")
+            return ""
+        except RequestCancelled as e:
+            logger.info(f"Rep analysis cancelled: {e}")
+            return ""
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP Error analyzing rep: {e.response.status_code} - {e.response.text}")
+            return ""
+
+        try:
+            return response_json['candidates'][0]['content']['parts'][0]['text'].strip()
+        except (KeyError, IndexError, TypeError):
+            logger.warning(f"Gemini API response missing candidates: {response_json}")
+            return ""
+
+    async def analyze_video_frame(self, frame_data: str, prompt: str, ctx: Optional[RequestContext] = None) -> str:
         """Analyze a single video frame for real-time coaching."""
         # This method can now be a simple wrapper around the batch method
         if not frame_data:
-             return await self.analyze_video_frames([], prompt)
-        return await self.analyze_video_frames([frame_data], prompt) 
\ No newline at end of file
+             return await self.analyze_video_frames([], prompt, ctx)
+        return await self.analyze_video_frames([frame_data], prompt, ctx) 
\ No newline at end of file
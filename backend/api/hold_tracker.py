@@ -0,0 +1,151 @@
+"""
+Hold tracking for isometric templates (plank, wall sit).
+
+An isometric exercise has no reps to segment: what matters is how long the athlete stays
+in a valid posture. ``HoldTracker`` checks the posture on every smoothed frame and
+accumulates time in it from the pose timestamps (not the wall clock), so a hold is timed
+the same however often frames arrive. Frames where the posture cannot be judged (joints
+not visible) or briefly wobbles out of it are bridged for up to ``grace_ms``; beyond that
+the hold is broken. Events:
+
+- ``start``      the posture was held for ``min_hold_ms`` (timestamp = when it was taken)
+- ``milestone``  every ``milestone_ms`` of accumulated hold time
+- ``break``      the hold ended, by leaving the posture or dropping out of view
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .kinematics import joint_angles, trunk_lean
+from .pose import (
+    LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP, LEFT_KNEE, RIGHT_KNEE,
+    LEFT_ANKLE, RIGHT_ANKLE, VISIBILITY
+)
+
+LOWER_BODY_JOINTS = (LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP, LEFT_KNEE, RIGHT_KNEE, LEFT_ANKLE, RIGHT_ANKLE)
+
+
+def _mean(angles: Dict[str, np.ndarray], joint: str) -> float:
+    return float(angles[f'left_{joint}'] + angles[f'right_{joint}']) / 2
+
+
+def _plank_posture(points: np.ndarray, angles: Dict[str, np.ndarray]) -> bool:
+    """Torso near horizontal, straight line through hips and knees"""
+    return float(trunk_lean(points)) > 60 and _mean(angles, 'hip') > 150 and _mean(angles, 'knee') > 150
+
+
+def _wall_sit_posture(points: np.ndarray, angles: Dict[str, np.ndarray]) -> bool:
+    """Back upright, thighs near parallel to the floor"""
+    return (float(trunk_lean(points)) < 30 and 65 < _mean(angles, 'knee') < 115
+            and 65 < _mean(angles, 'hip') < 125)
+
+
+@dataclass(frozen=True)
+class HoldProfile:
+    """Posture check and timing for one kind of hold"""
+    in_posture: Callable[[np.ndarray, Dict[str, np.ndarray]], bool]
+    joints: Tuple[int, ...]
+    min_hold_ms: int = 2000
+    milestone_ms: int = 10000
+    grace_ms: int = 1000
+
+
+HOLD_PROFILES = {
+    'plank': HoldProfile(in_posture=_plank_posture, joints=LOWER_BODY_JOINTS),
+    'wall_sit': HoldProfile(in_posture=_wall_sit_posture, joints=LOWER_BODY_JOINTS),
+}
+
+
+def get_hold_kind(activity_type: str) -> Optional[str]:
+    """Map a live activity name onto a hold profile (None if it is not an isometric hold)"""
+    activity_lower = activity_type.lower()
+    if 'plank' in activity_lower:
+        return 'plank'
+    if 'wall sit' in activity_lower or 'wall_sit' in activity_lower:
+        return 'wall_sit'
+    return None
+
+
+class HoldTracker:
+    """Incremental hold timer for one session (picklable, so it can live in session state)"""
+
+    MIN_VISIBILITY = 0.3
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.holding = False
+        self.held_ms = 0               # accumulated time in the current hold
+        self.best_ms = 0               # longest hold this session
+        self.holds = 0                 # finished holds
+        self.milestones = 0            # milestones reached in the current hold
+        self._last_timestamp: Optional[int] = None
+        self._last_valid: Optional[int] = None
+        self._posture_since: Optional[int] = None
+
+    @property
+    def profile(self) -> HoldProfile:
+        return HOLD_PROFILES[self.kind]
+
+    @property
+    def phase_label(self) -> str:
+        return 'holding' if self.holding else 'setup'
+
+    def update(self, timestamp: int, points: np.ndarray) -> List[Dict]:
+        """Feed one frame of smoothed landmarks; returns the hold events it produces"""
+        profile = self.profile
+        if self._last_timestamp is not None and timestamp <= self._last_timestamp:
+            return []  # out of order or duplicate
+        self._last_timestamp = timestamp
+
+        visible = bool(np.min(points[list(profile.joints), VISIBILITY]) >= self.MIN_VISIBILITY)
+        valid = visible and profile.in_posture(points, joint_angles(points))
+
+        if not self.holding:
+            if not valid:
+                self._posture_since = None
+                return []
+            if self._posture_since is None:
+                self._posture_since = timestamp
+            if timestamp - self._posture_since < profile.min_hold_ms:
+                return []
+            self.holding = True
+            self.held_ms = timestamp - self._posture_since
+            self.milestones = 0
+            self._last_valid = timestamp
+            return [{'type': 'start', 'timestamp': self._posture_since}]
+
+        gap = timestamp - self._last_valid
+        if gap > profile.grace_ms:
+            # Out of posture or out of view for longer than a wobble: the hold is over
+            event = self._break(timestamp, 'posture' if visible and not valid else 'dropout')
+            if valid:
+                self._posture_since = timestamp
+            return [event]
+        if not valid:
+            return []
+        # Bridged dropouts and wobbles count as time held
+        self.held_ms += gap
+        self._last_valid = timestamp
+        events = []
+        while self.held_ms >= (self.milestones + 1) * profile.milestone_ms:
+            self.milestones += 1
+            events.append({
+                'type': 'milestone',
+                'timestamp': timestamp,
+                'milestone': self.milestones,
+                'held_ms': self.held_ms
+            })
+        return events
+
+    def _break(self, timestamp: int, reason: str) -> Dict:
+        event = {'type': 'break', 'timestamp': timestamp, 'held_ms': self.held_ms, 'reason': reason}
+        self.holds += 1
+        self.best_ms = max(self.best_ms, self.held_ms)
+        self.holding = False
+        self.held_ms = 0
+        self.milestones = 0
+        self._last_valid = None
+        self._posture_since = None
+        return event
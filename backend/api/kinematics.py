@@ -0,0 +1,258 @@
+"""
+Kinematic features from pose landmarks.
+
+Turns landmark tracks (live sessions or server-extracted clips) into per-rep numbers:
+joint angles, range of motion, tempo, left/right symmetry, trunk lean, a bar-path proxy
+(horizontal drift of the hands) and a knee-valgus proxy (knee vs ankle separation).
+``summarize_reps`` renders them as a dense table so Gemini can coach from text alone.
+"""
+
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .pose import (
+    LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_ELBOW, RIGHT_ELBOW, LEFT_WRIST, RIGHT_WRIST,
+    LEFT_HIP, RIGHT_HIP, LEFT_KNEE, RIGHT_KNEE, LEFT_ANKLE, RIGHT_ANKLE, NUM_LANDMARKS, VISIBILITY, X, Y,
+    expand_landmarks, landmarks_to_array
+)
+from .landmark_filter import LandmarkFilter
+from .rep_segmenter import RepSegmenter, get_segmenter_kind
+
+# (a, b, c): angle at b, in degrees
+ANGLE_JOINTS = {
+    'left_knee': (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE),
+    'right_knee': (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE),
+    'left_hip': (LEFT_SHOULDER, LEFT_HIP, LEFT_KNEE),
+    'right_hip': (RIGHT_SHOULDER, RIGHT_HIP, RIGHT_KNEE),
+    'left_elbow': (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST),
+    'right_elbow': (RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST),
+    'left_shoulder': (LEFT_HIP, LEFT_SHOULDER, LEFT_ELBOW),
+    'right_shoulder': (RIGHT_HIP, RIGHT_SHOULDER, RIGHT_ELBOW),
+}
+
+
+# Joint whose angle best describes each kind of rep
+KEY_JOINT = {
+    'squat': 'knee',
+    'pushup': 'elbow',
+    'jumping_jack': 'shoulder',
+    'basketball': 'elbow',
+    'swing': 'shoulder',
+}
+
+
+def angle_landmarks(names: Iterable[str]) -> FrozenSet[int]:
+    """Landmarks the named joint angles are measured from"""
+    return frozenset(index for name in names for index in ANGLE_JOINTS[name])
+
+
+def tracked_angles(indices: Optional[Iterable[int]]) -> List[str]:
+    """Joint angles measurable from the landmark subset ``indices`` (all of them for None)"""
+    if indices is None:
+        return list(ANGLE_JOINTS)
+    indices = set(indices)
+    return [name for name, joints in ANGLE_JOINTS.items() if indices.issuperset(joints)]
+
+
+def is_tracked(landmarks: np.ndarray, indices: Iterable[int]) -> bool:
+    """
+    Whether ``(N, 33, 4)`` frames carry the given landmarks. Landmarks left out by a
+    session's projection have zero visibility throughout (see pose.landmarks_to_array).
+    """
+    return bool((landmarks[:, list(indices), VISIBILITY] > 0).any(axis=0).all())
+
+
+def _planar(landmarks: np.ndarray, aspect: float) -> np.ndarray:
+    """x, y of ``(..., 33, 4)`` landmarks in a common scale (x is normalised by image width)"""
+    points = landmarks[..., [X, Y]].astype(np.float64)
+    points[..., 0] *= aspect
+    return points
+
+
+def joint_angles(landmarks: np.ndarray, aspect: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    Image-plane joint angles in degrees for ``(33, 4)`` or ``(N, 33, 4)`` landmarks.
+    ``aspect`` is width / height of the source image, so angles are not skewed by it.
+    """
+    points = _planar(landmarks, aspect)
+    angles = {}
+    for name, (a, b, c) in ANGLE_JOINTS.items():
+        ba = points[..., a, :] - points[..., b, :]
+        bc = points[..., c, :] - points[..., b, :]
+        cos = (ba * bc).sum(-1) / (np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1) + 1e-9)
+        angles[name] = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+    return angles
+
+
+def trunk_lean(landmarks: np.ndarray, aspect: float = 1.0) -> np.ndarray:
+    """Angle of the hip->shoulder line from vertical, in degrees"""
+    points = _planar(landmarks, aspect)
+    torso = (
+        (points[..., LEFT_SHOULDER, :] + points[..., RIGHT_SHOULDER, :])
+        - (points[..., LEFT_HIP, :] + points[..., RIGHT_HIP, :])
+    ) / 2
+    return np.degrees(np.arctan2(np.abs(torso[..., 0]), -torso[..., 1]))
+
+
+def rep_features(landmarks: np.ndarray, kind: Optional[str], start_ms: int, bottom_ms: int, end_ms: int,
+                 aspect: float = 1.0) -> Dict[str, float]:
+    """
+    Features of one rep from its ``(N, 33, 4)`` landmark frames (empty dict without frames).
+    Times are in seconds, angles in degrees, distances in torso lengths.
+    """
+    if len(landmarks) == 0:
+        return {}
+    angles = joint_angles(landmarks, aspect)
+    joint = KEY_JOINT.get(kind, 'knee')
+    left, right = angles[f'left_{joint}'], angles[f'right_{joint}']
+    key_angle = (left + right) / 2
+
+    points = _planar(landmarks, aspect)
+    torso = np.linalg.norm(
+        (points[:, LEFT_SHOULDER] + points[:, RIGHT_SHOULDER]) / 2 - (points[:, LEFT_HIP] + points[:, RIGHT_HIP]) / 2,
+        axis=1
+    )
+    torso_scale = max(float(np.median(torso)), 1e-3)
+
+    features = {
+        'dur': round((end_ms - start_ms) / 1000, 2),
+        'down': round((bottom_ms - start_ms) / 1000, 2),
+        'up': round((end_ms - bottom_ms) / 1000, 2),
+        f'{joint}_min': round(float(key_angle.min()), 1),
+        f'{joint}_max': round(float(key_angle.max()), 1),
+        'rom': round(float(key_angle.max() - key_angle.min()), 1),
+        'sym': round(float(np.abs(left - right).mean()), 1),
+        'lean': round(float(trunk_lean(landmarks, aspect).max()), 1),
+    }
+    if is_tracked(landmarks, (LEFT_WRIST, RIGHT_WRIST)):
+        hands_x = (points[:, LEFT_WRIST, 0] + points[:, RIGHT_WRIST, 0]) / 2
+        features['path'] = round(float((hands_x.max() - hands_x.min()) / torso_scale), 2)
+    if kind == 'squat' and is_tracked(landmarks, (LEFT_KNEE, RIGHT_KNEE, LEFT_ANKLE, RIGHT_ANKLE)):
+        # < 1 means the knees travel inside the ankles (frontal view only)
+        knee_width = np.abs(points[:, LEFT_KNEE, 0] - points[:, RIGHT_KNEE, 0])
+        ankle_width = np.abs(points[:, LEFT_ANKLE, 0] - points[:, RIGHT_ANKLE, 0])
+        features['valgus'] = round(float((knee_width / np.maximum(ankle_width, 1e-3)).min()), 2)
+    return features
+
+
+def summarize_reps(activity_type: str, reps: Sequence[Dict[str, float]]) -> str:
+    """Dense text table of per-rep features plus mean and spread"""
+    if not reps:
+        return ""
+    columns = [column for column in reps[0] if column != 'rep']
+    lines = [
+        f"{activity_type} kinematics ({len(reps)} reps; times s, angles deg, path in torso lengths):",
+        "rep " + " ".join(columns)
+    ]
+    for i, rep in enumerate(reps, 1):
+        lines.append(f"{rep.get('rep', i)} " + " ".join(f"{rep.get(column, '-')}" for column in columns))
+    if len(reps) > 1:
+        values = np.array([[rep.get(column, np.nan) for column in columns] for rep in reps], dtype=float)
+        lines.append("mean " + " ".join(f"{v:.4g}" for v in np.nanmean(values, axis=0)))
+        lines.append("sd " + " ".join(f"{v:.2g}" for v in np.nanstd(values, axis=0)))
+    return "\n".join(lines)
+
+
+def features_from_track(timestamps: np.ndarray, landmarks: np.ndarray, activity_type: str,
+                        aspect: float = 1.0) -> List[Dict[str, float]]:
+    """Segment a whole landmark track into reps (frames without a pose are skipped) and featurise them"""
+    kind = get_segmenter_kind(activity_type)
+    if kind is None:
+        return []
+    detected = ~np.isnan(landmarks[:, 0, 0])
+    timestamps, landmarks = timestamps[detected], landmarks[detected].astype(np.float64)
+
+    landmark_filter = LandmarkFilter()
+    segmenter = RepSegmenter(kind)
+    smoothed = np.empty_like(landmarks)
+    reps = []
+    for i, timestamp in enumerate(timestamps):
+        smoothed[i] = landmark_filter.update(int(timestamp), landmarks[i])
+        for event in segmenter.update(int(timestamp), smoothed[i]):
+            if event['type'] != 'end':
+                continue
+            window = (timestamps >= event['start']) & (timestamps <= event['timestamp'])
+            features = rep_features(
+                smoothed[window], kind, event['start'], event['bottom'], event['timestamp'], aspect
+            )
+            if features:
+                reps.append(dict(rep=event['rep'], **features))
+    return reps
+
+
+def summarize_rep_data(rep_data: Dict, indices: Optional[Sequence[int]] = None) -> str:
+    """
+    Compact numeric summary of a client-reported rep (``phases`` with their landmarks plus
+    ``currentLandmarks``): one line per phase with its timing and the mean joint angles.
+    With a landmark subset ``indices`` (the activity's projection), landmarks may be sent
+    projected and only the angles measurable from the subset are listed.
+    """
+    rows = []
+    rep_start = rep_data.get('startTime') or 0
+    for phase in rep_data.get('phases') or []:
+        if isinstance(phase, dict):
+            rows.append((
+                str(phase.get('phase', '?')).replace(' ', '_'),
+                (phase.get('startTime') or rep_start) - rep_start,
+                (phase.get('endTime') or 0) - (phase.get('startTime') or 0),
+                phase.get('landmarks')
+            ))
+    if rep_data.get('currentLandmarks'):
+        rows.append(('end', (rep_data.get('endTime') or rep_start) - rep_start, 0, rep_data['currentLandmarks']))
+
+    measurable = tracked_angles(indices)
+    joints = [joint for joint in ('knee', 'hip', 'elbow', 'shoulder')
+              if f'left_{joint}' in measurable and f'right_{joint}' in measurable]
+    lines = ["phase start_ms dur_ms " + " ".join(joints) + " lean (mean joint angles and trunk lean, deg)"]
+    for name, start, duration, landmarks in rows:
+        points = landmarks_to_array(landmarks, indices) if isinstance(landmarks, list) else None
+        if points is None:
+            lines.append(f"{name} {start} {duration} " + " ".join('-' for _ in range(len(joints) + 1)))
+            continue
+        angles = joint_angles(points)
+        values = [(angles[f'left_{joint}'] + angles[f'right_{joint}']) / 2 for joint in joints]
+        lines.append(
+            f"{name} {start} {duration} " + " ".join(f"{v:.0f}" for v in values) + f" {float(trunk_lean(points)):.0f}"
+        )
+    return "\n".join(lines) if rows else ""
+
+
+class PoseHistory:
+    """
+    Bounded per-session history of smoothed landmarks, for featurising finished live reps.
+    Frames of a session with a landmark projection keep only its landmarks' rows.
+    """
+
+    def __init__(self, max_frames: int = 300):
+        # (timestamp, (33, 4) or (len(indices), 4) float32, indices or None)
+        self._frames = deque(maxlen=max_frames)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(points.nbytes for _, points, _ in self._frames)
+
+    def append(self, timestamp: int, points: np.ndarray, indices: Optional[Sequence[int]] = None):
+        """Record a frame: the (33, 4) landmarks, or the projected rows of the ``indices`` landmarks"""
+        # Mutations may be replayed after a state conflict; keep each timestamp once
+        if self._frames and timestamp <= self._frames[-1][0]:
+            return
+        self._frames.append((timestamp, points.astype(np.float32), tuple(indices) if indices is not None else None))
+
+    def latest(self) -> Optional[Tuple[int, np.ndarray]]:
+        """Most recent ``(timestamp, landmarks)``, or None"""
+        if not self._frames:
+            return None
+        timestamp, points, indices = self._frames[-1]
+        return timestamp, expand_landmarks(points, indices)
+
+    def window(self, start_ms: int, end_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Timestamps and ``(N, 33, 4)`` landmarks of the frames in ``[start_ms, end_ms]``"""
+        frames = [
+            (t, expand_landmarks(points, indices)) for t, points, indices in self._frames if start_ms <= t <= end_ms
+        ]
+        if not frames:
+            return np.empty(0, dtype=np.int64), np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32)
+        return np.array([t for t, _ in frames]), np.stack([points for _, points in frames])
+
@@ -0,0 +1,76 @@
+"""
+Online smoothing of live pose landmarks.
+
+Browser-side MediaPipe landmarks jitter by a few pixels from frame to frame, which is
+enough to flip threshold-based detectors back and forth. ``LandmarkFilter`` is a One-Euro
+filter (Casiez et al., 2012) vectorised over the session's joints (all 33, or only those
+of its landmark projection): slow joints are smoothed heavily, fast joints follow
+quickly, and joints the model is unsure about (low visibility) move less towards the new
+measurement.
+"""
+
+import math
+from typing import Optional
+
+import numpy as np
+
+from .pose import VISIBILITY
+
+
+def _smoothing_factor(dt: float, cutoff):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class LandmarkFilter:
+    """
+    Per-session One-Euro filter over an ``(N, 4)`` landmark array: the 33 MediaPipe
+    landmarks, or a session's projected rows.
+
+    ``update`` returns the smoothed array (visibility passed through). The filtered
+    velocity, in normalised image units per second, is kept on ``velocity`` so callers
+    can gate on motion without differentiating again. Picklable, so it can live in
+    session state.
+    """
+
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 2.0, d_cutoff: float = 1.0,
+                 max_gap_ms: int = 1000):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_gap_ms = max_gap_ms
+        self.position: Optional[np.ndarray] = None   # (N, 3) smoothed x, y, z
+        self.velocity: Optional[np.ndarray] = None   # (N, 3) smoothed d/dt
+        self._last_timestamp: Optional[int] = None
+
+    def update(self, timestamp: int, points: np.ndarray) -> np.ndarray:
+        """Filter one frame of landmarks taken at ``timestamp`` (milliseconds)"""
+        raw = points[:, :3]
+        weight = np.clip(points[:, VISIBILITY], 0.0, 1.0)[:, None]
+
+        gap = None if self._last_timestamp is None else timestamp - self._last_timestamp
+        if gap is not None and self.position.shape != raw.shape:
+            gap = None  # the session's landmark set changed
+        if gap is None or gap <= 0 or gap > self.max_gap_ms:
+            # First frame, out-of-order frame or a long pause: restart from the measurement
+            if gap is None or gap > self.max_gap_ms:
+                self.position = raw.copy()
+                self.velocity = np.zeros_like(raw)
+                self._last_timestamp = timestamp
+            return self._output(points)
+
+        dt = gap / 1000.0
+        raw_velocity = weight * (raw - self.position) / dt
+        alpha_d = _smoothing_factor(dt, self.d_cutoff)
+        self.velocity = alpha_d * raw_velocity + (1 - alpha_d) * self.velocity
+
+        cutoff = self.min_cutoff + self.beta * np.linalg.norm(self.velocity, axis=1, keepdims=True)
+        alpha = _smoothing_factor(dt, cutoff) * weight
+        self.position = alpha * raw + (1 - alpha) * self.position
+        self._last_timestamp = timestamp
+        return self._output(points)
+
+    def _output(self, points: np.ndarray) -> np.ndarray:
+        smoothed = points.copy()
+        smoothed[:, :3] = self.position
+        return smoothed
@@ -43,6 +43,23 @@ class User(AbstractUser):
             self.hourly_reset_time = now
             self.save(update_fields=['analyses_this_hour', 'hourly_reset_time'])
 
+    async def areset_daily_count_if_needed(self):
+        """Async variant of ``reset_daily_count_if_needed``"""
+        today = timezone.now().date()
+        
+        if self.daily_reset_date < today:
+            self.analyses_today = 0
+            self.daily_reset_date = today
+            await self.asave(update_fields=['analyses_today', 'daily_reset_date'])
+
+    async def areset_hourly_count_if_needed(self):
+        """Async variant of ``reset_hourly_count_if_needed``"""
+        now = timezone.now()
+        if self.hourly_reset_time < now - timedelta(hours=1):
+            self.analyses_this_hour = 0
+            self.hourly_reset_time = now
+            await self.asave(update_fields=['analyses_this_hour', 'hourly_reset_time'])
+
     def can_analyze(self):
         """Check if user can perform another analysis"""
         if self.is_banned:
@@ -55,6 +72,23 @@ class User(AbstractUser):
         self.reset_daily_count_if_needed()
         self.reset_hourly_count_if_needed()
         
+        return self._check_limits()
+
+    async def acan_analyze(self):
+        """Async variant of ``can_analyze`` for native async views"""
+        if self.is_banned:
+            return False, "Account is banned"
+        
+        if not getattr(settings, 'RATE_LIMITING_ENABLED', True):
+            return True, "OK"
+        
+        await self.areset_daily_count_if_needed()
+        await self.areset_hourly_count_if_needed()
+        
+        return self._check_limits()
+
+    def _check_limits(self):
+        """Compare current usage counters against the configured limits"""
         daily_limit = getattr(settings, 'RATE_LIMIT_ANALYSES_PER_DAY', 10000)
         hourly_limit = getattr(settings, 'RATE_LIMIT_ANALYSES_PER_HOUR', 1000)
         
@@ -84,5 +118,15 @@ class User(AbstractUser):
         self.last_analysis = timezone.now()
         self.save(update_fields=['analyses_today', 'analyses_this_hour', 'last_analysis'])
 
+    async def arecord_analysis(self):
+        """Async variant of ``record_analysis``"""
+        await self.areset_daily_count_if_needed()
+        await self.areset_hourly_count_if_needed()
+        
+        self.analyses_today += 1
+        self.analyses_this_hour += 1
+        self.last_analysis = timezone.now()
+        await self.asave(update_fields=['analyses_today', 'analyses_this_hour', 'last_analysis'])
+
     def __str__(self):
         return f"{self.email} ({self.first_name} {self.last_name})" 
\ No newline at end of file
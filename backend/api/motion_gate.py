@@ -0,0 +1,106 @@
+"""
+Motion energy and presence for a live session.
+
+Gemini batches are only worth their cost when the athlete did something: moved through
+a rep or held a position. ``MotionGate`` turns the One-Euro filter's landmark velocities
+into a motion energy (RMS speed of the body's main joints, in torso lengths per second,
+so it does not depend on distance to the camera) and tracks whether a person is in frame
+at all from landmark visibility. The generic detector uses it to report real movement
+bouts instead of firing on a clock, and the pipeline refuses to dispatch a batch unless
+movement or a hold was observed since the previous one.
+"""
+
+import math
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .pose import (
+    LEFT_ANKLE, LEFT_ELBOW, LEFT_HIP, LEFT_KNEE, LEFT_SHOULDER, LEFT_WRIST,
+    RIGHT_ANKLE, RIGHT_ELBOW, RIGHT_HIP, RIGHT_KNEE, RIGHT_SHOULDER, RIGHT_WRIST,
+    NUM_LANDMARKS, VISIBILITY, torso_length
+)
+
+# Joints whose motion counts as the athlete moving (the face and hands are too twitchy)
+BODY_JOINTS = [
+    LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_ELBOW, RIGHT_ELBOW, LEFT_WRIST, RIGHT_WRIST,
+    LEFT_HIP, RIGHT_HIP, LEFT_KNEE, RIGHT_KNEE, LEFT_ANKLE, RIGHT_ANKLE
+]
+
+
+class MotionGate:
+    """
+    Per-session motion energy and presence (picklable, so it can live in session state).
+    ``update`` returns a ``bout`` event when a stretch of movement long enough to be
+    deliberate ends.
+    """
+
+    def __init__(self, moving_energy: float = 0.15, still_energy: float = 0.06, smoothing_ms: float = 300.0,
+                 min_visibility: float = 0.5, min_visible_fraction: float = 0.6, min_bout_ms: int = 600,
+                 landmarks: Optional[Sequence[int]] = None):
+        # Hysteresis: moving above ``moving_energy``, still again below ``still_energy``
+        self.moving_energy = moving_energy
+        self.still_energy = still_energy
+        self.smoothing_ms = smoothing_ms
+        self.min_visibility = min_visibility
+        self.min_visible_fraction = min_visible_fraction
+        self.min_bout_ms = min_bout_ms
+        # Rows of the body joints and torso in the landmarks the session sends: landmark ids,
+        # or positions in its projected rows if it negotiated a landmark projection
+        rows = {joint: joint for joint in range(NUM_LANDMARKS)} if landmarks is None else {
+            joint: row for row, joint in enumerate(landmarks)
+        }
+        self.joints = [rows[joint] for joint in BODY_JOINTS if joint in rows]
+        self.torso = tuple(rows[joint] for joint in (LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP))
+        self.energy = 0.0
+        self.present = False
+        self.moving = False
+        # Last time movement or a hold was seen, for gating dispatch
+        self.last_active: Optional[int] = None
+        self._bout_start: Optional[int] = None
+        self._last_timestamp: Optional[int] = None
+
+    def update(self, timestamp: int, points: np.ndarray, velocity: Optional[np.ndarray]) -> Optional[Dict]:
+        """
+        Feed one frame of smoothed landmarks (the session's projected rows, if it has a
+        projection) and their filtered velocity (normalised units per second)
+        """
+        if self._last_timestamp is not None and timestamp <= self._last_timestamp:
+            return None
+        dt = 0.0 if self._last_timestamp is None else timestamp - self._last_timestamp
+        self._last_timestamp = timestamp
+
+        visible = points[self.joints, VISIBILITY] >= self.min_visibility
+        self.present = bool(visible.mean() >= self.min_visible_fraction)
+        if not self.present or velocity is None:
+            # Nobody to watch: any bout in progress ends unreported
+            self.energy = 0.0
+            self.moving = False
+            self._bout_start = None
+            return None
+
+        speeds = np.linalg.norm(velocity[self.joints, :2][visible], axis=1) / torso_length(points, self.torso)
+        sample = float(np.sqrt(np.mean(speeds ** 2)))
+        alpha = 1.0 - math.exp(-dt / self.smoothing_ms) if dt else 1.0
+        self.energy += alpha * (sample - self.energy)
+
+        bout = None
+        if not self.moving and self.energy >= self.moving_energy:
+            self.moving = True
+            self._bout_start = timestamp
+        elif self.moving and self.energy < self.still_energy:
+            self.moving = False
+            if self._bout_start is not None and timestamp - self._bout_start >= self.min_bout_ms:
+                bout = {'type': 'bout', 'timestamp': timestamp, 'duration_ms': timestamp - self._bout_start}
+            self._bout_start = None
+        if self.moving:
+            self.last_active = timestamp
+        return bout
+
+    def mark_active(self, timestamp: int):
+        """Record movement or a hold recognised by a detector (rep segmenter, hold tracker)"""
+        self.last_active = timestamp
+
+    def active_since(self, timestamp: int) -> bool:
+        """Whether movement or a hold was observed at or after ``timestamp``"""
+        return self.last_active is not None and self.last_active >= timestamp
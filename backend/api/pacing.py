@@ -0,0 +1,102 @@
+"""
+Adaptive pacing of Gemini-backed coaching.
+
+Coaching intervals used to be fixed per activity, which overloads Gemini at peak (every
+session keeps asking at full rate while replies slow down) and leaves capacity unused
+off-peak. The controller keeps this worker's load signals:
+- an EWMA of Gemini call latency
+- calls in flight
+- requests made in the last minute against this worker's share of the quota
+and scales each activity's baseline interval by the tightest of them. Intervals widen
+under load and tighten (down to ``min_scale``) when there is headroom.
+
+Nothing is shared between workers: the quota is counted per worker, so
+``quota_per_minute`` must be the global Gemini quota divided by the number of workers
+(and hosts) serving live sessions.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict
+
+from .request_context import RequestCancelled
+
+
+class PacingController:
+    """Per-worker load signals and the interval scale they imply (``quota_per_minute`` is this worker's share)"""
+
+    def __init__(self, target_latency: float = 2.0, max_in_flight: int = 32, quota_per_minute: int = 600,
+                 min_scale: float = 0.75, max_scale: float = 4.0, smoothing: float = 0.2):
+        self.target_latency = target_latency
+        self.max_in_flight = max_in_flight
+        self.quota_per_minute = quota_per_minute
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.smoothing = smoothing
+        self.latency = target_latency / 2      # EWMA seconds, starts optimistic
+        self.in_flight = 0
+        self.errors = 0
+        self._calls: deque = deque()          # monotonic start times of the last minute's calls
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0] > 60:
+            self._calls.popleft()
+
+    @contextmanager
+    def track_call(self):
+        """
+        Wrap one Gemini call: counts it against the quota and in flight, and records its
+        latency once it completes, successfully or with an error. A call cancelled by us
+        (client gone, session stopped) says nothing about Gemini's latency and is not recorded.
+        """
+        started = time.monotonic()
+        self._prune(started)
+        self._calls.append(started)
+        self.in_flight += 1
+        try:
+            yield
+        except (asyncio.CancelledError, RequestCancelled):
+            raise
+        except Exception:
+            self.errors += 1
+            self._record_latency(started)
+            raise
+        else:
+            self._record_latency(started)
+        finally:
+            self.in_flight -= 1
+
+    def _record_latency(self, started: float):
+        elapsed = time.monotonic() - started
+        self.latency += self.smoothing * (elapsed - self.latency)
+
+    def quota_headroom(self) -> float:
+        """Fraction of this worker's per-minute quota still unused (0-1)"""
+        self._prune(time.monotonic())
+        return max(0.0, 1.0 - len(self._calls) / max(self.quota_per_minute, 1))
+
+    def scale(self) -> float:
+        """
+        Interval multiplier: the largest of the latency ratio, the in-flight ratio and the
+        quota pressure, each 1.0 at its comfortable level. Below 1 only when all are.
+        """
+        latency_pressure = self.latency / self.target_latency
+        queue_pressure = 2 * self.in_flight / self.max_in_flight
+        # Untouched until half the quota is used, then climbs steeply towards exhaustion
+        quota_pressure = 0.5 / max(self.quota_headroom(), 0.05)
+        return min(self.max_scale, max(self.min_scale, latency_pressure, queue_pressure, quota_pressure))
+
+    def interval(self, baseline: float) -> float:
+        """Effective interval (seconds) for an activity whose unloaded interval is ``baseline``"""
+        return round(baseline * self.scale(), 2)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'latency_ewma_seconds': round(self.latency, 3),
+            'in_flight': self.in_flight,
+            'quota_headroom': round(self.quota_headroom(), 3),
+            'errors': self.errors,
+            'scale': round(self.scale(), 2),
+        }
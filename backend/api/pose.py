@@ -0,0 +1,121 @@
+"""
+MediaPipe Pose landmark layout and helpers shared by the live-coaching pipeline.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+# MediaPipe Pose landmark indices
+NOSE = 0
+LEFT_EYE, RIGHT_EYE = 2, 5
+LEFT_EAR, RIGHT_EAR = 7, 8
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_PINKY, RIGHT_PINKY = 17, 18
+LEFT_INDEX, RIGHT_INDEX = 19, 20
+LEFT_THUMB, RIGHT_THUMB = 21, 22
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+LEFT_HEEL, RIGHT_HEEL = 29, 30
+LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX = 31, 32
+
+# Columns of a landmark array
+X, Y, Z, VISIBILITY = 0, 1, 2, 3
+
+# Landmarks behind each body part a template can name in ``tracking_points``
+TRACKING_POINT_LANDMARKS: Dict[str, Tuple[int, ...]] = {
+    'head': (NOSE, LEFT_EYE, RIGHT_EYE, LEFT_EAR, RIGHT_EAR),
+    'shoulders': (LEFT_SHOULDER, RIGHT_SHOULDER),
+    'elbows': (LEFT_ELBOW, RIGHT_ELBOW),
+    'wrists': (LEFT_WRIST, RIGHT_WRIST),
+    'hands': (LEFT_WRIST, RIGHT_WRIST, LEFT_PINKY, RIGHT_PINKY, LEFT_INDEX, RIGHT_INDEX, LEFT_THUMB, RIGHT_THUMB),
+    'fingers': (LEFT_PINKY, RIGHT_PINKY, LEFT_INDEX, RIGHT_INDEX, LEFT_THUMB, RIGHT_THUMB),
+    'hips': (LEFT_HIP, RIGHT_HIP),
+    'knees': (LEFT_KNEE, RIGHT_KNEE),
+    'ankles': (LEFT_ANKLE, RIGHT_ANKLE),
+    'feet': (LEFT_ANKLE, RIGHT_ANKLE, LEFT_HEEL, RIGHT_HEEL, LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX),
+}
+
+# Shoulders and hips scale every signal (see torso_length), so they are always kept
+TORSO_LANDMARKS = (LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP)
+
+
+def landmarks_to_array(landmarks: Union[List[Dict], List[float]],
+                       indices: Optional[Sequence[int]] = None) -> Optional[np.ndarray]:
+    """
+    Convert the client's list of ``{x, y, z, visibility}`` dicts into a ``(33, 4)`` float array.
+    The compact form used by rep event trajectories, a flat list of 33 x, y, z, visibility
+    quadruples, is accepted too. Returns None unless the full MediaPipe landmark set was sent,
+    or, when the session negotiated a landmark projection, exactly the ``indices`` landmarks
+    in that order; landmarks left out come back all zero, visibility included.
+    """
+    rows = landmarks_to_rows(landmarks, indices)
+    return None if rows is None else expand_landmarks(rows, indices)
+
+
+def landmarks_to_rows(landmarks: Union[List[Dict], List[float]],
+                      indices: Optional[Sequence[int]] = None) -> Optional[np.ndarray]:
+    """
+    Like ``landmarks_to_array``, but for a session with a landmark projection only the
+    ``(len(indices), 4)`` rows of its landmarks, in ``indices`` order (a full set sent
+    anyway is narrowed to them). Without a projection, the ``(33, 4)`` array.
+    """
+    if not landmarks:
+        return None
+    flat = isinstance(landmarks[0], (int, float))
+    count = len(landmarks) // 4 if flat else len(landmarks)
+    if indices is not None and count == len(indices) and count < NUM_LANDMARKS:
+        return _landmark_rows(landmarks, flat, count)
+    if count < NUM_LANDMARKS:
+        return None
+    points = _landmark_rows(landmarks, flat, NUM_LANDMARKS)
+    if points is None or indices is None:
+        return points
+    return points[list(indices)]
+
+
+def expand_landmarks(rows: np.ndarray, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+    """Scatter projected landmark rows back into a ``(33, 4)`` array (zeros elsewhere); full arrays pass through"""
+    if indices is None:
+        return rows
+    points = np.zeros((NUM_LANDMARKS, rows.shape[1]), dtype=rows.dtype)
+    points[list(indices)] = rows
+    return points
+
+
+def _landmark_rows(landmarks: Union[List[Dict], List[float]], flat: bool, count: int) -> Optional[np.ndarray]:
+    """The first ``count`` landmarks as a ``(count, 4)`` array, or None if malformed"""
+    try:
+        if flat:
+            return np.asarray(landmarks[:count * 4], dtype=np.float64).reshape(count, 4)
+        return np.array(
+            [
+                (lm.get('x', 0.0), lm.get('y', 0.0), lm.get('z', 0.0), lm.get('visibility', 1.0))
+                for lm in landmarks[:count]
+            ],
+            dtype=np.float64
+        )
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def midpoint(points: np.ndarray, left: int, right: int) -> np.ndarray:
+    """Midpoint of a left/right landmark pair (x, y)"""
+    return (points[left, :2] + points[right, :2]) / 2
+
+
+def torso_length(points: np.ndarray, rows: Sequence[int] = (LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP)) -> float:
+    """
+    Shoulder-midpoint to hip-midpoint distance, used to make signals camera-distance
+    invariant. ``rows`` locates the shoulders and hips in projected landmark rows.
+    """
+    left_shoulder, right_shoulder, left_hip, right_hip = rows
+    length = float(np.linalg.norm(
+        midpoint(points, left_shoulder, right_shoulder) - midpoint(points, left_hip, right_hip)
+    ))
+    return max(length, 1e-3)
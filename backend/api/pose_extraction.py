@@ -0,0 +1,293 @@
+"""
+Server-side pose extraction for uploaded clips.
+
+Uploaded videos used to be sampled blindly and every frame shipped to Gemini. This module
+runs MediaPipe Pose on CPU over sampled frames and produces a compact landmark track per
+clip. The track drives which frames are sent (the most distinctive poses rather than
+every Nth frame) and how they are cropped (around the athlete), so Gemini gets fewer,
+smaller images plus precise numbers.
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .pose import NUM_LANDMARKS, VISIBILITY, X, Y, LEFT_HIP, RIGHT_HIP, midpoint, torso_length
+
+# OpenCV and MediaPipe are optional; without them uploads fall back to plain frame sampling
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+try:
+    import mediapipe as mp
+    MEDIAPIPE_AVAILABLE = True
+except ImportError:
+    MEDIAPIPE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Longest side of the image handed to the pose model; landmarks are normalised anyway
+INFERENCE_MAX_SIDE = 640
+# Longest side of a key-frame crop sent to Gemini (the same cap as plain frame sampling)
+KEY_FRAME_MAX_SIDE = 1280
+
+
+def pose_extraction_available() -> bool:
+    return CV2_AVAILABLE and MEDIAPIPE_AVAILABLE and getattr(settings, 'POSE_EXTRACTION_ENABLED', True)
+
+
+class PoseModelPool:
+    """
+    Warm MediaPipe Pose models for this worker process.
+
+    Loading a model takes far longer than running it, so models are created once per process
+    (lazily, after the server forks) and checked out per frame. MediaPipe releases the GIL
+    during inference, so a clip's frames are fanned out across the pool in parallel.
+    """
+
+    def __init__(self, size: int = 2, model_complexity: int = 1):
+        self.size = size
+        self.model_complexity = model_complexity
+        self._models: "queue.Queue" = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='pose')
+
+    def _create_model(self):
+        return mp.solutions.pose.Pose(
+            static_image_mode=True,
+            model_complexity=self.model_complexity,
+            min_detection_confidence=0.5
+        )
+
+    @contextmanager
+    def model(self):
+        """Check out a warm model, creating one if the pool has not reached its size yet"""
+        try:
+            model = self._models.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            model = self._create_model() if create else self._models.get()
+        try:
+            yield model
+        finally:
+            self._models.put(model)
+
+    def _infer(self, frame_bgr) -> Optional[np.ndarray]:
+        rgb = cv2.cvtColor(_downscale(frame_bgr, INFERENCE_MAX_SIDE), cv2.COLOR_BGR2RGB)
+        with self.model() as model:
+            result = model.process(rgb)
+        if not result.pose_landmarks:
+            return None
+        return np.array(
+            [(lm.x, lm.y, lm.z, lm.visibility) for lm in result.pose_landmarks.landmark],
+            dtype=np.float32
+        )
+
+    def infer_batch(self, frames_bgr: List[Any]) -> List[Optional[np.ndarray]]:
+        """Run pose inference on a batch of BGR frames, spread over the pool's models"""
+        return list(self._executor.map(self._infer, frames_bgr))
+
+
+_POOL: Optional[PoseModelPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pose_model_pool() -> PoseModelPool:
+    """This process's shared model pool"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = PoseModelPool(size=getattr(settings, 'POSE_MODEL_POOL_SIZE', 2))
+    return _POOL
+
+
+@dataclass
+class LandmarkTrack:
+    """Pose landmarks for the sampled frames of one clip"""
+    timestamps_ms: np.ndarray      # (N,) int
+    landmarks: np.ndarray          # (N, 33, 4) float32, NaN where no pose was found
+    width: int
+    height: int
+    frame_indices: Optional[np.ndarray] = None  # (N,) int, position of each sample in the video
+
+    def __len__(self) -> int:
+        return len(self.timestamps_ms)
+
+    @property
+    def detected(self) -> np.ndarray:
+        """Mask of frames with a pose"""
+        return ~np.isnan(self.landmarks[:, 0, 0])
+
+    @property
+    def coverage(self) -> float:
+        return float(self.detected.mean()) if len(self) else 0.0
+
+
+def _downscale(frame, max_side: int):
+    height, width = frame.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def read_sampled_frames(video_path: str, sample_fps: float = 10, max_frames: int = 120,
+                        max_side: Optional[int] = None) -> Tuple[List[Any], List[int], List[int], Tuple[int, int]]:
+    """
+    Decode frames at roughly ``sample_fps`` (at most ``max_frames``), downscaled to
+    ``max_side`` as they are read so full-resolution frames are never held. Returns the
+    frames, their timestamps (ms), their indices in the video and the source (width, height).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, int(round(fps / sample_fps)))
+    if total_frames > 0:
+        step = max(step, -(-total_frames // max_frames))
+
+    frames, timestamps, indices = [], [], []
+    size = (0, 0)
+    index = 0
+    while len(frames) < max_frames:
+        # grab() skips decoding work for frames we do not keep
+        if not cap.grab():
+            break
+        if index % step == 0:
+            ok, frame = cap.retrieve()
+            if ok:
+                size = (frame.shape[1], frame.shape[0])
+                frames.append(_downscale(frame, max_side) if max_side else frame)
+                timestamps.append(int(index * 1000 / fps))
+                indices.append(index)
+        index += 1
+
+    cap.release()
+    return frames, timestamps, indices, size
+
+
+def read_frames_at(video_path: str, frame_indices: List[int]) -> List[Optional[Any]]:
+    """Decode the frames at ``frame_indices`` at full resolution (None for any that cannot be read)"""
+    wanted = set(frame_indices)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file")
+
+    frames = {}
+    index = 0
+    # A sequential pass: seeking by frame number is inexact for many codecs
+    while len(frames) < len(wanted) and index <= max(wanted, default=-1):
+        if not cap.grab():
+            break
+        if index in wanted:
+            ok, frame = cap.retrieve()
+            if ok:
+                frames[index] = frame
+        index += 1
+
+    cap.release()
+    return [frames.get(i) for i in frame_indices]
+
+
+def extract_pose_track(video_path: str) -> LandmarkTrack:
+    """
+    Sample a clip and run pose inference on inference-sized copies of the frames. Only the
+    landmark track is kept; key frames are read again at full resolution with
+    ``read_frames_at`` once they are chosen.
+    """
+    frames, timestamps, indices, (width, height) = read_sampled_frames(
+        video_path,
+        sample_fps=getattr(settings, 'POSE_SAMPLE_FPS', 10),
+        max_frames=getattr(settings, 'POSE_MAX_FRAMES', 120),
+        max_side=INFERENCE_MAX_SIDE
+    )
+    if not frames:
+        raise ValueError("No frames could be extracted from video")
+
+    results = get_pose_model_pool().infer_batch(frames)
+    del frames
+    landmarks = np.full((len(results), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    for i, points in enumerate(results):
+        if points is not None:
+            landmarks[i] = points
+
+    track = LandmarkTrack(
+        np.array(timestamps, dtype=np.int64), landmarks, width, height, np.array(indices, dtype=np.int64)
+    )
+    logger.info(f"Pose track: {len(track)} frames sampled, {track.coverage:.0%} with a pose")
+    return track
+
+
+def select_key_frames(track: LandmarkTrack, count: int = 6, min_gap_ms: int = 300) -> List[int]:
+    """
+    Indices of the ``count`` most distinctive poses in the clip, in time order.
+
+    Each detected frame is scored by how far its hip-centred, torso-normalised pose is from
+    the clip's median pose, so extremes of the movement (squat bottom, top of the swing,
+    release) win over the many near-identical in-between frames. Picks closer than
+    ``min_gap_ms`` to an earlier pick are suppressed. The first detected frame is always
+    kept to show the setup.
+    """
+    detected = np.flatnonzero(track.detected)
+    if len(detected) == 0:
+        return []
+
+    poses = track.landmarks[detected]
+    visible = poses[:, :, VISIBILITY] > 0.5
+    centres = np.stack([midpoint(p, LEFT_HIP, RIGHT_HIP) for p in poses])
+    scales = np.array([torso_length(p) for p in poses])
+    normalised = (poses[:, :, [X, Y]] - centres[:, None, :]) / scales[:, None, None]
+    median_pose = np.median(normalised, axis=0)
+    distances = np.linalg.norm(normalised - median_pose, axis=2)
+    scores = np.where(visible, distances, 0.0).sum(axis=1) / np.maximum(visible.sum(axis=1), 1)
+
+    picked = [int(detected[0])]
+    for i in np.argsort(-scores):
+        if len(picked) >= count:
+            break
+        candidate = int(detected[i])
+        if all(abs(int(track.timestamps_ms[candidate]) - int(track.timestamps_ms[p])) >= min_gap_ms for p in picked):
+            picked.append(candidate)
+    return sorted(picked)
+
+
+def crop_to_pose(frame, points: Optional[np.ndarray], margin: float = 0.15, min_visibility: float = 0.5,
+                 max_side: Optional[int] = KEY_FRAME_MAX_SIDE):
+    """Crop a BGR frame to the bounding box of the visible landmarks plus a margin, at most ``max_side`` px"""
+    frame = _crop(frame, points, margin, min_visibility)
+    return _downscale(frame, max_side) if max_side else frame
+
+
+def _crop(frame, points: Optional[np.ndarray], margin: float, min_visibility: float):
+    if points is None or np.isnan(points[0, 0]):
+        return frame
+    visible = points[points[:, VISIBILITY] >= min_visibility]
+    if len(visible) < 4:
+        return frame
+
+    height, width = frame.shape[:2]
+    x0, y0 = np.clip(visible[:, [X, Y]].min(axis=0), 0, 1)
+    x1, y1 = np.clip(visible[:, [X, Y]].max(axis=0), 0, 1)
+    pad_x, pad_y = (x1 - x0) * margin, (y1 - y0) * margin
+    left, right = int(max(0.0, x0 - pad_x) * width), int(min(1.0, x1 + pad_x) * width)
+    top, bottom = int(max(0.0, y0 - pad_y) * height), int(min(1.0, y1 + pad_y) * height)
+    if right - left < 32 or bottom - top < 32:
+        return frame
+    return frame[top:bottom, left:right]
@@ -1,7 +1,26 @@
 import time
 import logging
-from typing import Dict, Any, Optional, List
+import numpy as np
+from typing import Dict, Any, Optional, List, Tuple
+from django.conf import settings
 from .gemini_service import GeminiAnalysisService
+from .session_store import create_session_store, SessionStateConflict
+from .session_manager import LiveSessionManager
+from .pose import NUM_LANDMARKS, TORSO_LANDMARKS, expand_landmarks, landmarks_to_array, landmarks_to_rows
+from .landmark_filter import LandmarkFilter
+from .motion_gate import MotionGate
+from .hold_tracker import HOLD_PROFILES, HoldTracker, get_hold_kind
+from .kinematics import PoseHistory
+from .form_rules import FormRuleEngine
+from .form_scoring import FormScorer, RepScore
+from .pacing import PacingController
+from .request_context import RequestContext
+from .feedback_cache import FeedbackCache
+from .rep_index import RepFeedbackIndex
+from .session_aggregates import SessionAggregates
+from .templates import get_tracking_landmarks, resolve_template_id
+from .rep_segmenter import SEGMENTER_PROFILES, RepSegmenter, get_segmenter_kind
+from .coaching_pipeline import CoachingPipeline
 
 logger = logging.getLogger(__name__)
 
@@ -10,13 +29,51 @@ class RealtimeCoachingService:
     Real-time coaching service that provides expert feedback after each rep
     """
     
+    # Compare-and-set attempts before giving up on a contended session update
+    MAX_STATE_UPDATE_RETRIES = 5
+    
     def __init__(self):
         self.gemini_service = GeminiAnalysisService()
-        self.last_coaching_time = {}
-        self.user_states = {}  # Track user coaching state per session
+        # Per-session coaching state, shared across workers depending on LIVE_SESSION_BACKEND
+        self.session_store = create_session_store()
+        # Instant form cues evaluated locally on every frame
+        self.form_rules = FormRuleEngine()
+        # Objective per-rep scores against the template's reference trajectory
+        self.form_scorer = FormScorer()
+        # Batch feedback reused when the same faults come up again (shared by this worker's sessions)
+        self.feedback_cache = FeedbackCache(
+            max_keys=getattr(settings, 'LIVE_FEEDBACK_CACHE_MAX_KEYS', 1024),
+            ttl=getattr(settings, 'LIVE_FEEDBACK_CACHE_TTL_SECONDS', 900),
+            variants=getattr(settings, 'LIVE_FEEDBACK_CACHE_VARIANTS', 2)
+        )
+        # Feedback of kinematically similar past batches (nearest-neighbour match)
+        self.rep_index = RepFeedbackIndex(
+            capacity=getattr(settings, 'LIVE_REP_INDEX_CAPACITY', 5000),
+            max_rms_deg=getattr(settings, 'LIVE_REP_INDEX_MAX_RMS_DEG', 8.0),
+            ttl=getattr(settings, 'LIVE_REP_INDEX_TTL_SECONDS', 900)
+        )
+        # Scales coaching intervals with observed Gemini latency, calls in flight and quota use
+        self.pacing = PacingController(
+            target_latency=getattr(settings, 'LIVE_PACING_TARGET_LATENCY_SECONDS', 2.0),
+            max_in_flight=getattr(settings, 'LIVE_PACING_MAX_IN_FLIGHT', 32),
+            quota_per_minute=getattr(settings, 'LIVE_PACING_QUOTA_PER_MINUTE', 600),
+            min_scale=getattr(settings, 'LIVE_PACING_MIN_SCALE', 0.75),
+            max_scale=getattr(settings, 'LIVE_PACING_MAX_SCALE', 4.0)
+        )
+        # Worker-local session resources (frame buffers) with idle expiry and a memory budget
+        self.sessions = LiveSessionManager(
+            self.session_store,
+            idle_ttl=getattr(settings, 'LIVE_SESSION_IDLE_TTL_SECONDS', 300),
+            memory_budget=getattr(settings, 'LIVE_SESSION_MEMORY_BUDGET_BYTES', 256 * 1024 * 1024),
+            sweep_interval=getattr(settings, 'LIVE_SESSION_SWEEP_INTERVAL_SECONDS', 30)
+        )
+        # Clients may negotiate sending only the activity's landmarks (see landmark_projection)
+        self.landmark_projections = getattr(settings, 'LIVE_LANDMARK_PROJECTION', True)
+        # The one path every live frame takes, whichever endpoint it arrived on
+        self.pipeline = CoachingPipeline(self)
     
     def get_coaching_interval(self, activity_type: str) -> float:
-        """Get appropriate coaching interval for each activity type"""
+        """Unloaded coaching interval for each activity type (see ``effective_coaching_interval``)"""
         intervals = {
             # Discrete rep exercises - feedback after each rep/set
             'basketball': 3.0,  # After each shot attempt - longer to avoid overlap
@@ -58,646 +115,223 @@ class RealtimeCoachingService:
         else:
             return intervals['custom']
     
-    def should_provide_coaching(self, user_id: str, activity_type: str) -> bool:
-        """Rate limiting for coaching feedback with activity-specific logic"""
-        current_time = time.time()
-        interval = self.get_coaching_interval(activity_type)
-        
-        if user_id not in self.last_coaching_time:
-            self.last_coaching_time[user_id] = 0
-            
-        if current_time - self.last_coaching_time[user_id] >= interval:
-            self.last_coaching_time[user_id] = current_time
-            return True
-            
-        return False
+    def effective_coaching_interval(self, activity_type: str) -> float:
+        """Activity interval widened under Gemini load, tightened when there is spare capacity"""
+        return self.pacing.interval(self.get_coaching_interval(activity_type))
+    
+    def _new_user_state(self) -> Dict[str, Any]:
+        """Fresh coaching state for a session (must stay picklable for shared session stores)"""
+        return {
+            'phase': 'setup',
+            'rep_count': 0,
+            'last_feedback_time': None,
+            'last_coaching_time': 0,
+            'movement_detected': False,
+            # One-Euro landmark smoothing and streaming RepSegmenter, created on first use
+            'landmark_filter': None,
+            'segmenter': None,
+            # Landmark indices the client sends, when it negotiated a projection at session start
+            'landmark_indices': None,
+            'last_api_call_time': 0,
+            # Batching state
+            'last_batch_time': 0,
+            'reps_since_last_batch': 0,
+            # Kinematic features of the most recent reps (see kinematics.rep_features)
+            'rep_features': [],
+            # Form-rule cooldowns (rule id -> last cue ms) and cues to mention to the next batch
+            'rule_cooldowns': {},
+            # (rep, float16 embedding bytes) of the most recent reps (see rep_index.rep_embedding)
+            'rep_embeddings': [],
+            'cues_since_last_batch': [],
+            # Batch feedback already delivered this session, most recent last (not reused from the rep index)
+            'feedback_heard': [],
+            # Finished background batch feedback waiting for the next poll
+            'pending_feedback': None,
+            # Running rep, tempo, score, angle and cue statistics for the session summary
+            'aggregates': SessionAggregates()
+        }
+    
+    async def get_user_state(self, user_id: str) -> Dict[str, Any]:
+        """Get user coaching state (a fresh state if the session is unknown)"""
+        _, user_state = await self.session_store.load(user_id)
+        return user_state if user_state is not None else self._new_user_state()
     
-    def should_analyze_frame(self, user_id: str, current_time: int) -> bool:
+    async def update_user_state(self, user_id: str, mutate):
         """
-        Check if we should analyze this frame (rate limiting for real-time analysis)
+        Apply ``mutate(user_state)`` and persist it with optimistic versioning.
+        
+        ``mutate`` must be synchronous and safe to re-run: on a version conflict the
+        latest state is reloaded and the mutation is applied again.
         """
-        # Convert milliseconds to seconds
-        current_time_sec = current_time / 1000
+        self.sessions.touch(user_id)
+        for _ in range(self.MAX_STATE_UPDATE_RETRIES):
+            version, user_state = await self.session_store.load(user_id)
+            if user_state is None:
+                user_state = self._new_user_state()
+            result = mutate(user_state)
+            if await self.session_store.save(user_id, user_state, version):
+                return result
+            logger.debug(f"Session state conflict for user {user_id}, retrying")
+        raise SessionStateConflict(f"Could not update session state for user {user_id}")
+    
+    async def start_session(self, user_id: str, landmark_indices: Optional[Tuple[int, ...]] = None) -> Dict[str, Any]:
+        """Reset coaching progress at the start of a live session, recording its landmark projection"""
+        # The previous session may never have been stopped (reloaded tab, crashed client)
+        self.sessions.restart_session(user_id)
         
-        if user_id not in self.last_coaching_time:
-            self.last_coaching_time[user_id] = 0
-            return True
-            
-        # Allow analysis every 2 seconds for real-time coaching
-        time_diff = current_time_sec - self.last_coaching_time[user_id]
-        return time_diff >= 2.0
+        def reset_progress(user_state: Dict[str, Any]) -> Dict[str, Any]:
+            user_state['phase'] = 'setup'
+            user_state['rep_count'] = 0
+            user_state['movement_detected'] = False
+            user_state['aggregates'] = SessionAggregates()
+            user_state['feedback_heard'] = []
+            # A rep or hold left open by the previous session must not carry over
+            user_state['segmenter'] = None
+            user_state['hold_tracker'] = None
+            if user_state.get('landmark_indices') != landmark_indices:
+                # The filter and motion gate are sized to the landmarks the client sends
+                user_state['landmark_indices'] = landmark_indices
+                user_state['landmark_filter'] = None
+                user_state['motion_gate'] = None
+            return user_state
+            
+        return await self.update_user_state(user_id, reset_progress)
     
-    def get_user_state(self, user_id: str) -> Dict[str, Any]:
-        """Get or create user coaching state"""
-        if user_id not in self.user_states:
-            self.user_states[user_id] = {
-                'phase': 'setup',
-                'rep_count': 0,
-                'last_feedback_time': None,
-                'movement_detected': False,
-                'squat_state': 'standing',
-                'last_squat_position': None,
-                'squat_depth_threshold': 0.08,
-                'position_history': [],
-                'jumping_jack_state': {'phase': 'down'},
-                'last_api_call_time': 0,
-                # Add frame buffer and batching state
-                'frame_buffer': [], # Stores (frame_data, pose_data) for batch analysis
-                'last_batch_time': 0,
-                'reps_since_last_batch': 0
-            }
-        return self.user_states[user_id]
+    def landmark_projection(self, activity_type: str) -> Optional[Tuple[int, ...]]:
+        """
+        Landmark indices live sessions of this activity need: the template's compiled
+        tracking_points plus whatever the server itself reads (torso for scale, the rep
+        segmenter or hold tracker, form rules, the exemplar's angles). None keeps all 33.
+        """
+        template_id = resolve_template_id(activity_type)
+        tracked = get_tracking_landmarks(template_id)
+        if tracked is None:
+            return None
+        needed = set(tracked) | set(TORSO_LANDMARKS)
+        hold_kind = get_hold_kind(activity_type)
+        kind = get_segmenter_kind(activity_type)
+        if hold_kind is not None:
+            needed |= set(HOLD_PROFILES[hold_kind].joints)
+        elif kind is not None:
+            needed |= set(SEGMENTER_PROFILES[kind].joints)
+        needed |= self.form_rules.landmarks(template_id) | self.form_scorer.landmarks(template_id)
+        return tuple(sorted(needed)) if len(needed) < NUM_LANDMARKS else None
     
-    def detect_movement_completion(self, pose_data: Dict[str, Any], activity_type: str) -> bool:
-        """Detect when a rep/movement is completed based on pose analysis"""
+    def detect_rep_events(self, pose_data: Dict[str, Any], activity_type: str, user_state: Dict[str, Any],
+                          timestamp: Optional[int] = None,
+                          pose_history: Optional[PoseHistory] = None) -> List[Dict[str, Any]]:
+        """
+        Feed one pose frame to the session's rep segmenter and return the rep events it
+        produced (start, bottom, end, abort). Isometric activities (plank, wall sit) are
+        timed by the session's hold tracker instead: each hold milestone is an ``end``
+        (``hold_ms`` set) and a broken hold an ``abort``. Other activities without a
+        segmenter profile report an ``end`` when the motion gate sees a bout of movement finish.
+        Smoothed landmarks (any activity) are recorded in ``pose_history`` when given, only
+        the session's projected landmarks if it negotiated a projection.
+        """
         if not pose_data or 'landmarks' not in pose_data:
-            return False
+            return []
             
         landmarks = pose_data['landmarks']
-        
-        # Debug logging to see what activity we're detecting
-        logger.info(f"🔍 Movement detection called for activity: '{activity_type}' with {len(landmarks)} landmarks")
+        if timestamp is None:
+            timestamp = pose_data.get('timestamp') or int(time.time() * 1000)
+        kind = get_segmenter_kind(activity_type)
+        hold_kind = get_hold_kind(activity_type)
         
         try:
-            if activity_type.lower().find('squat') != -1:
-                logger.info("🏋️ Using squat detection")
-                return self._detect_squat_completion(landmarks)
-            elif activity_type.lower().find('pushup') != -1 or activity_type.lower().find('push-up') != -1:
-                logger.info("💪 Using pushup detection")
-                return self._detect_pushup_completion(landmarks)
-            elif activity_type.lower().find('jumping jack') != -1:
-                logger.info("🤸 Using jumping jack detection")
-                return self._detect_jumping_jack_completion(landmarks)
-            elif activity_type.lower().find('basketball') != -1:
-                logger.info("🏀 Using basketball detection")
-                return self._detect_basketball_shot_completion(landmarks)
-            elif activity_type.lower().find('tennis') != -1 or activity_type.lower().find('golf') != -1:
-                logger.info("🎾 Using swing detection")
-                return self._detect_swing_completion(landmarks)
-            elif activity_type.lower().find('plank') != -1:
-                logger.info("🏃 Using plank detection")
-                return self._detect_plank_hold_completion(landmarks)
+            # With a landmark projection the filter, motion gate and pose history only ever
+            # hold the projected rows
+            landmark_indices = user_state.get('landmark_indices')
+            rows = landmarks_to_rows(landmarks, landmark_indices)
+            if rows is None:
+                return []
+            landmark_filter = user_state.get('landmark_filter')
+            if landmark_filter is None:
+                landmark_filter = user_state['landmark_filter'] = LandmarkFilter()
+            rows = landmark_filter.update(int(timestamp), rows)
+            if pose_history is not None:
+                pose_history.append(int(timestamp), rows, landmark_indices)
+            motion_gate = user_state.get('motion_gate')
+            if motion_gate is None:
+                motion_gate = user_state['motion_gate'] = MotionGate(landmarks=landmark_indices)
+            bout = motion_gate.update(int(timestamp), rows, landmark_filter.velocity)
+            # The segmenter and hold tracker look joints up by landmark id, on a per-frame view
+            points = expand_landmarks(rows, landmark_indices)
+                    
+            if hold_kind is not None:
+                hold_tracker = user_state.get('hold_tracker')
+                if hold_tracker is None or hold_tracker.kind != hold_kind:
+                    hold_tracker = user_state['hold_tracker'] = HoldTracker(hold_kind)
+                events = [self._hold_rep_event(event) for event in hold_tracker.update(int(timestamp), points)]
+                if hold_tracker.holding:
+                    motion_gate.mark_active(int(timestamp))
+            elif kind is None:
+                completed = self._detect_generic_movement_completion(bout)
+                return [{'type': 'end', 'timestamp': timestamp}] if completed else []
             else:
-                # Generic movement detection
-                logger.info(f"❓ Using generic detection for unknown activity: '{activity_type}'")
-                return self._detect_generic_movement_completion(landmarks)
+                segmenter = user_state.get('segmenter')
+                if segmenter is None or segmenter.kind != kind:
+                    segmenter = user_state['segmenter'] = RepSegmenter(kind)
+                events = segmenter.update(int(timestamp), points)
+                if events:
+                    # A rep in progress is movement, even one slower than the gate's energy threshold
+                    motion_gate.mark_active(int(timestamp))
                         
-        except (KeyError, IndexError, TypeError) as e:
+        except (KeyError, IndexError, TypeError, ValueError) as e:
             logger.warning(f"Error in movement detection for {activity_type}: {e}")
+            return []
             
-        return False
-
-    def _detect_squat_completion(self, landmarks: List[Dict]) -> bool:
-        """
-        Detect squat completion by tracking the full down-up cycle
-        Uses state machine to track: standing -> descending -> bottom -> ascending -> standing (COMPLETED)
-        """
-        if len(landmarks) < 28:
-            return False
-            
-        try:
-            # Get key landmarks for squat analysis
-            left_hip = landmarks[23]
-            right_hip = landmarks[24]
-            left_knee = landmarks[25]
-            right_knee = landmarks[26]
-            left_ankle = landmarks[27] if len(landmarks) > 27 else None
-            right_ankle = landmarks[28] if len(landmarks) > 28 else None
-            
-            if not (left_ankle and right_ankle):
-                return False
-            
-            # Calculate position metrics
-            hip_avg_y = (left_hip.get('y', 0) + right_hip.get('y', 0)) / 2
-            knee_avg_y = (left_knee.get('y', 0) + right_knee.get('y', 0)) / 2
-            ankle_avg_y = (left_ankle.get('y', 0) + right_ankle.get('y', 0)) / 2
-            
-            # Hip-to-knee distance (positive = hips above knees, negative = hips below knees)
-            hip_knee_diff = knee_avg_y - hip_avg_y
-            
-            # Get or create state tracking for this detection cycle
-            if not hasattr(self, '_squat_detection_state'):
-                self._squat_detection_state = {
-                    'current_state': 'standing',
-                    'min_depth_reached': 0,
-                    'position_history': []
-                }
-            
-            state = self._squat_detection_state
-            
-            # Track position history for smoothing
-            state['position_history'].append(hip_knee_diff)
-            if len(state['position_history']) > 5:
-                state['position_history'].pop(0)
-            
-            # Use average of recent positions to smooth detection
-            avg_position = sum(state['position_history']) / len(state['position_history'])
-            
-            # State machine for squat detection
-            if state['current_state'] == 'standing':
-                # Looking for start of descent
-                if avg_position < 0.02:  # Hips starting to drop below knee level
-                    state['current_state'] = 'descending'
-                    state['min_depth_reached'] = avg_position
-                    print(f"🔽 Squat: Started descending (hip-knee diff: {avg_position:.3f})")
-                    
-            elif state['current_state'] == 'descending':
-                # Track depth and look for bottom position
-                state['min_depth_reached'] = min(state['min_depth_reached'], avg_position)
-                
-                if avg_position < -0.08:  # Good depth reached
-                    state['current_state'] = 'bottom'
-                    print(f"⬇️ Squat: Reached bottom, depth: {state['min_depth_reached']:.3f}")
-                elif avg_position > 0.02:  # Started going back up without good depth
-                    state['current_state'] = 'ascending'
-                    print(f"🔼 Squat: Ascending (shallow, depth: {state['min_depth_reached']:.3f})")
-                    
-            elif state['current_state'] == 'bottom':
-                # Look for start of ascent
-                if avg_position > state['min_depth_reached'] + 0.03:  # Clear upward movement
-                    state['current_state'] = 'ascending'
-                    print(f"⬆️ Squat: Started ascending from depth {state['min_depth_reached']:.3f}")
-                    
-            elif state['current_state'] == 'ascending':
-                # Look for return to standing position
-                if avg_position > 0.05:  # Back to standing position
-                    # Check if this was a valid squat (good depth)
-                    if state['min_depth_reached'] < -0.08:
-                        print(f"🎯 Squat COMPLETED! Depth: {state['min_depth_reached']:.3f} ✅")
-                        # Reset state for next squat
-                        state['current_state'] = 'standing'
-                        state['min_depth_reached'] = 0
-                        state['position_history'] = []
-                        return True  # SQUAT COMPLETED!
-                    else:
-                        print(f"❌ Squat incomplete - insufficient depth: {state['min_depth_reached']:.3f} (need < -0.08)")
-                        # Reset state - shallow squat doesn't count
-                        state['current_state'] = 'standing'
-                        state['min_depth_reached'] = 0
-                        state['position_history'] = []
-            
-            return False  # No completed squat yet
-            
-        except (KeyError, TypeError) as e:
-            logger.error(f"Error in squat detection: {e}")
-            return False
-
-    def _simple_squat_feedback(self, depth: float) -> str:
-        """Generate heuristic squat feedback if AI fails (no generic fluff)"""
-        depth_cm = round(abs(depth) * 100, 1)
-        if depth < -0.15:
-            depth_comment = f"Great depth (~{depth_cm}cm below knees)."
-        elif depth < -0.08:
-            depth_comment = f"Solid depth (~{depth_cm}cm). Aim a bit lower for full range."
-        else:
-            depth_comment = f"Depth was shallow (~{depth_cm}cm). Squat deeper next rep."
-
-        torso_comment = "Keep chest upright" if depth < -0.08 else "Engage core to avoid leaning forward"
-        return f"{depth_comment} {torso_comment}."
-
-    def _detect_pushup_completion(self, landmarks: List[Dict]) -> bool:
-        """Detect pushup completion using shoulder and wrist positions"""
-        if len(landmarks) < 16:
-            return False
-            
-        try:
-            left_shoulder = landmarks[11]
-            right_shoulder = landmarks[12]
-            left_wrist = landmarks[15]
-            right_wrist = landmarks[16]
-            
-            # Calculate average positions
-            shoulder_avg_y = (left_shoulder.get('y', 0) + right_shoulder.get('y', 0)) / 2
-            wrist_avg_y = (left_wrist.get('y', 0) + right_wrist.get('y', 0)) / 2
-            
-            # Pushup completed when shoulders are above wrists (up position)
-            shoulder_wrist_diff = wrist_avg_y - shoulder_avg_y
-            
-            return shoulder_wrist_diff > 0.05  # Shoulders sufficiently above wrists
-            
-        except (KeyError, TypeError):
-            return False
-
-    def _detect_jumping_jack_completion(self, landmarks: List[Dict]) -> bool:
-        """Detect jumping-jack rep completion with a simple two-phase state machine.
-
-        Phase definitions (mirrors the frontend `detectJumpingJackCompletion`):
-        1. DOWN  – starting/ending pose: arms down, legs together
-        2. UP    – mid-jack pose: arms overhead, legs wide
-
-        A rep is counted when the athlete transitions **UP → DOWN** (i.e. returns to the
-        starting pose after having reached the fully stretched position).
-        """
-
-        if len(landmarks) < 30:
-            return False
-
-        try:
-            # -------- Landmark extraction --------
-            ls, rs = landmarks[11], landmarks[12]   # shoulders
-            lw, rw = landmarks[15], landmarks[16]   # wrists
-            lh, rh = landmarks[23], landmarks[24]   # hips
-            la = landmarks[27] if len(landmarks) > 27 else None  # ankles
-            ra = landmarks[28] if len(landmarks) > 28 else None
-
-            if not (la and ra):
-                return False
-
-            # -------- Pose features --------
-            # Arms are up if both wrists are above corresponding shoulders (lower y == higher)
-            arms_up = (lw.get('y', 1) < ls.get('y', 1)) and (rw.get('y', 1) < rs.get('y', 1))
-
-            # Legs wide if ankle separation clearly exceeds shoulder width
-            shoulder_dist = abs(ls.get('x', 0) - rs.get('x', 0))
-            ankle_dist = abs(la.get('x', 0) - ra.get('x', 0))
-            legs_wide = ankle_dist > shoulder_dist * 1.5
-
-            # Legs together if ankles roughly under hips (allow small variance)
-            legs_together = ankle_dist < shoulder_dist * 1.2
-
-            arms_down = not arms_up
-
-            # -------- Simple state machine --------
-            if not hasattr(self, '_jj_detection_state'):
-                # Store last phase so we only count once per rep
-                self._jj_detection_state = {
-                    'phase': 'down'  # initial expected phase when session starts
-                }
-
-            state = self._jj_detection_state
-
-            # Debug log (prints are OK for dev server)
-            print(f"JJ detect | phase={state['phase']} arms_up={arms_up} legs_wide={legs_wide} legs_together={legs_together}")
-            logger.info(f"🤸 JJ State: phase={state['phase']} | arms_up={arms_up} legs_wide={legs_wide} legs_together={legs_together}")
-
-            if state['phase'] == 'down' and arms_up and legs_wide:
-                # Transition: start jumping up
-                state['phase'] = 'up'
-                logger.info("🔼 JJ: Transitioned to UP phase")
-                return False
-
-            if state['phase'] == 'up' and arms_down and legs_together:
-                # Completed the jack (returned to starting pose)
-                state['phase'] = 'down'
-                print("🎯 Jumping Jack COMPLETED! ✅")
-                logger.info("🎯 Jumping Jack COMPLETED! ✅")
-                return True
-
-            return False
-
-        except (KeyError, TypeError):
-            return False
-
-    def _detect_basketball_shot_completion(self, landmarks: List[Dict]) -> bool:
-        """Detect basketball shot completion"""
-        if len(landmarks) < 16:
-            return False
-            
-        try:
-            left_wrist = landmarks[15]
-            right_wrist = landmarks[16]
-            nose = landmarks[0]
-            
-            # Shot completed when both wrists are below nose level (arms down after shot)
-            wrist_avg_y = (left_wrist.get('y', 0) + right_wrist.get('y', 0)) / 2
-            nose_y = nose.get('y', 0)
-            
-            return wrist_avg_y > nose_y + 0.1  # Wrists clearly below nose
-            
-        except (KeyError, TypeError):
-            return False
-
-    def _detect_swing_completion(self, landmarks: List[Dict]) -> bool:
-        """Detect tennis/golf swing completion"""
-        if len(landmarks) < 16:
-            return False
-            
-        try:
-            left_wrist = landmarks[15]
-            right_wrist = landmarks[16]
-            left_shoulder = landmarks[11]
-            right_shoulder = landmarks[12]
-            
-            # Swing completed when arms return to neutral position
-            # Check if wrists are near shoulder level (resting position)
-            shoulder_avg_y = (left_shoulder.get('y', 0) + right_shoulder.get('y', 0)) / 2
-            wrist_avg_y = (left_wrist.get('y', 0) + right_wrist.get('y', 0)) / 2
-            
-            return abs(wrist_avg_y - shoulder_avg_y) < 0.15  # Wrists near shoulder level
-            
-        except (KeyError, TypeError):
-            return False
-
-    def _detect_plank_hold_completion(self, landmarks: List[Dict]) -> bool:
-        """Detect plank hold completion (time-based)"""
-        # For plank, we'd typically track time in proper position
-        # This is a simplified version - in practice, you'd track duration
-        if len(landmarks) < 16:
-            return False
-            
-        try:
-            # Check if body is in plank position
-            left_shoulder = landmarks[11]
-            right_shoulder = landmarks[12]
-            left_hip = landmarks[23]
-            right_hip = landmarks[24]
-            
-            # Body should be relatively straight
-            shoulder_avg_y = (left_shoulder.get('y', 0) + right_shoulder.get('y', 0)) / 2
-            hip_avg_y = (left_hip.get('y', 0) + right_hip.get('y', 0)) / 2
-            
-            # For demo purposes, return True occasionally to simulate hold completion
-            body_straight = abs(shoulder_avg_y - hip_avg_y) < 0.1
-            return body_straight and (time.time() % 10 < 1)  # Simulate 10-second holds
-            
-        except (KeyError, TypeError):
-            return False
-
-    def _detect_generic_movement_completion(self, landmarks: List[Dict]) -> bool:
-        """Generic movement detection for unknown activities"""
-        if len(landmarks) < 10:
-            return False
-            
-        # Very basic detection - return True occasionally
-        return time.time() % 8 < 1  # Simulate movement every 8 seconds
+        for event in events:
+            logger.debug(f"Rep event for {activity_type}: {event}")
+        return events
     
-    def get_expert_coaching_prompt(self, activity_type: str, phase: str, pose_data: Dict[str, Any], user_state: Dict[str, Any]) -> str:
-        """Get expert-level coaching prompts based on activity and phase"""
-        
-        base_expert_context = """
-        You are a world-class expert coach analyzing real-time video. Give specific, actionable feedback like a top-tier personal trainer would.
-        
-        Focus on:
-        - Specific technical improvements 
-        - What they did wrong/right in that exact rep
-        - Immediate corrections for next rep
-        - Safety concerns
-        
-        Keep responses brief (1-2 sentences max), direct, and expert-level.
-        """
-        
-        expert_personas = {
-            'basketball': """
-            You are Phil Jackson's shooting coach. You've trained Kobe, MJ, and countless NBA champions.
-            
-            Key areas to analyze:
-            - Shooting form: elbow alignment, follow-through, arc
-            - Footwork: base, balance, jump mechanics  
-            - Release: consistent form, proper rotation
-            - Shot selection: positioning, timing
-            
-            Common issues to catch:
-            - Shooting off the dribble vs set shot
-            - Elbow flare, inconsistent release point
-            - Poor footwork, off-balance shots
-            - Low arc, poor follow-through
-            """,
-            
-            'squat': """
-            You are Louie Simmons from Westside Barbell. You've coached world record holders and powerlifting champions.
-            
-            Key areas to analyze:
-            - Depth: hip crease below knee level
-            - Knee tracking: knees out, no valgus collapse
-            - Back position: neutral spine, chest up
-            - Hip drive: proper hip hinge pattern
-            
-            Common issues to catch:
-            - Knee cave (valgus), insufficient depth
-            - Forward lean, butt wink
-            - Heel rise, weight on toes
-            - Poor hip drive, quad dominance
-            """,
-            
-            'pushup': """
-            You are a Navy SEAL instructor who has trained thousands of elite operators.
-            
-            Key areas to analyze:
-            - Body alignment: straight line from head to heels
-            - Depth: chest touches ground or close
-            - Elbow position: 45-degree angle, not flared
-            - Core engagement: no sagging hips
-            
-            Common issues to catch:
-            - Sagging hips, piked position
-            - Partial range of motion
-            - Elbow flare, shoulder impingement
-            - Head position, neck strain
-            """,
-            
-            'tennis': """
-            You are Brad Gilbert, former coach to Andre Agassi and Andy Roddick.
-            
-            Key areas to analyze:
-            - Grip: proper continental/eastern grip
-            - Swing path: low to high, proper contact point
-            - Footwork: split step, recovery
-            - Follow-through: complete swing, balance
-            
-            Common issues to catch:
-            - Late preparation, rushed swing
-            - Poor contact point, timing
-            - Incomplete follow-through
-            - Footwork problems, off-balance finish
-            """,
-            
-            'golf': """
-            You are Butch Harmon, who coached Tiger Woods to 6 major championships.
-            
-            Key areas to analyze:
-            - Setup: grip, stance, ball position, alignment
-            - Backswing: proper rotation, club plane
-            - Downswing: sequence, weight transfer
-            - Impact: club face, swing path
-            - Follow-through: balance, finish position
-            
-            Common issues to catch:
-            - Over-the-top swing, early extension
-            - Poor weight transfer, reverse pivot
-            - Club face issues at impact
-            - Loss of posture, balance problems
-            """,
-            
-            'custom': """
-            You are a world-class movement specialist who has trained Olympic athletes across all sports.
-            
-            Analyze whatever movement you see and provide expert feedback on:
-            - Movement quality and efficiency
-            - Safety and injury prevention
-            - Technical improvements
-            - Performance optimization
-            """,
-        }
-        
-        activity_prompt = expert_personas.get(activity_type, expert_personas['custom'])
-        
-        if phase == 'setup':
-            return f"""
-            {base_expert_context}
-            {activity_prompt}
-            
-            The user is just getting started. Give them expert setup instructions to get into proper position.
-            Be specific about stance, grip, positioning - whatever they need to know before starting.
-            
-            Do NOT give generic template advice. Be specific and expert-level.
-            """
-            
-        elif phase == 'post_rep':
-            rep_count = user_state.get('rep_count', 0)
-            return f"""
-            {base_expert_context}
-            {activity_prompt}
-            
-            The user just completed rep #{rep_count}. Analyze their form in this specific rep and give immediate feedback.
-            
-            Based on the pose data, tell them:
-            1. What they did wrong (if anything)
-            2. What to focus on for the next rep
-            
-            Be direct, specific, and actionable. No generic advice.
-            
-            Pose analysis data: {pose_data}
-            """
-            
-        return f"{base_expert_context}\n{activity_prompt}\n\nProvide expert coaching based on what you observe."
+    def score_rep_landmarks(self, activity_type: str, landmark_frames: List[List[Dict]]) -> Optional[RepScore]:
+        """Score a rep sent as a list of client landmark frames (frames without a full pose are skipped)"""
+        template_id = resolve_template_id(activity_type)
+        if not self.form_scorer.has_exemplar(template_id) or not isinstance(landmark_frames, list):
+            return None
+        indices = self.landmark_projection(activity_type)
+        frames = [
+            points for points in (landmarks_to_array(landmarks, indices) for landmarks in landmark_frames)
+            if points is not None
+        ]
+        if len(frames) < 2:
+            return None
+        return self.form_scorer.score(template_id, np.stack(frames))
+
+    @staticmethod
+    def _hold_rep_event(event: Dict[str, Any]) -> Dict[str, Any]:
+        """Hold tracker event in rep-event terms: a milestone completes a "rep", a break aborts the hold"""
+        if event['type'] == 'milestone':
+            return {'type': 'end', 'timestamp': event['timestamp'], 'hold_ms': event['held_ms'],
+                    'milestone': event['milestone']}
+        if event['type'] == 'break':
+            return {'type': 'abort', 'timestamp': event['timestamp'], 'hold_ms': event['held_ms'],
+                    'reason': f"hold_{event['reason']}"}
+        return event
+
+    def _detect_generic_movement_completion(self, bout: Optional[Dict[str, Any]]) -> bool:
+        """Generic movement detection for unknown activities: a bout of movement just ended"""
+        return bout is not None
     
-    async def get_coaching_feedback(self, user_id: str, activity_type: str, pose_data: Dict[str, Any], frame_data: str) -> Optional[str]:
-        """
-        Provide expert coaching feedback based on movement analysis
-        """
-        try:
-            if not self.should_provide_coaching(user_id, activity_type):
-                return None
-                
-            user_state = self.get_user_state(user_id)
-            
-            # Detect if movement/rep was completed
-            movement_completed = self.detect_movement_completion(pose_data, activity_type)
-            
-            # State management
-            if user_state['phase'] == 'setup':
-                # First time - give setup instructions
-                phase = 'setup'
-                user_state['phase'] = 'monitoring'
-                
-            elif movement_completed and user_state['phase'] == 'monitoring':
-                # Rep completed - give post-rep feedback
-                phase = 'post_rep'
-                user_state['rep_count'] += 1
-                user_state['movement_detected'] = True
-                
-            else:
-                # Still monitoring - no feedback needed
-                return None
-            
-            # Get expert coaching prompt
-            coaching_prompt = self.get_expert_coaching_prompt(activity_type, phase, pose_data, user_state)
-            
-            # Get AI coaching response
-            full_prompt = f"""
-            {coaching_prompt}
-            
-            Frame data: {frame_data}
-            """
-            
-            response = await self.gemini_service.analyze_video_frame(
-                frame_data, 
-                full_prompt
-            )
-            
-            if response:
-                user_state['last_feedback'] = response
-                logger.info(f"Coaching feedback provided for {activity_type} - Phase: {phase}, Rep: {user_state['rep_count']}")
-                return response
-                
-        except Exception as e:
-            logger.error(f"Error getting coaching feedback: {e}")
-            
-        return None
+    async def session_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Summary of a live session from its running aggregates (None if the session is unknown)"""
+        _, user_state = await self.session_store.load(user_id)
+        if user_state is None or user_state.get('aggregates') is None:
+            return None
+        summary = user_state['aggregates'].summary()
+        hold_tracker = user_state.get('hold_tracker')
+        if hold_tracker is not None:
+            # Includes the hold still in progress when the session stops
+            summary['best_hold_ms'] = max(hold_tracker.best_ms, hold_tracker.held_ms)
+        return summary
     
-    def reset_user_state(self, user_id: str):
+    async def reset_user_state(self, user_id: str):
         """Reset user state for new session"""
-        if user_id in self.user_states:
-            del self.user_states[user_id]
-        if user_id in self.last_coaching_time:
-            del self.last_coaching_time[user_id]
+        await self.sessions.end_session(user_id)
     
-    async def analyze_live_frame(self, frame_data: str, activity_type: str, context: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Analyze a live frame for real-time coaching, using batching to reduce API calls.
-        """
-        user_id = context.get('user_id', 'anonymous')
-        pose_data = context.get('pose_data', {})
-        current_time = context.get('timestamp', int(time.time() * 1000))
-        user_state = self.get_user_state(user_id)
-
-        # Always add the current frame to the buffer
-        if frame_data:
-            user_state['frame_buffer'].append(frame_data)
-        
-        # Trim buffer to keep it from growing too large (e.g., last 100 frames)
-        if len(user_state['frame_buffer']) > 100:
-            user_state['frame_buffer'].pop(0)
-
-        movement_completed = self.detect_movement_completion(pose_data, activity_type)
-        response_data = {
-            'success': True,
-            'movement_completed': False,
-            'should_provide_feedback': False,
-            'feedback': None
-        }
-
-        if movement_completed:
-            user_state['rep_count'] += 1
-            user_state['reps_since_last_batch'] += 1
-            response_data.update({
-                'movement_completed': True,
-                'rep_count': user_state['rep_count']
-            })
-
-            # --- Batching Logic ---
-            # Condition 1: Rep-based trigger (e.g., every 5 reps)
-            rep_trigger = user_state['reps_since_last_batch'] >= 5
-            # Condition 2: Time-based trigger (e.g., every 7 seconds)
-            time_trigger = (current_time - user_state.get('last_batch_time', 0)) > 7000
-            
-            # If either trigger is met and we have frames, process the batch
-            if (rep_trigger or time_trigger) and user_state['frame_buffer']:
-                logger.info(f"✅ Batch trigger met for user {user_id}: {user_state['reps_since_last_batch']} reps, {(current_time - user_state.get('last_batch_time', 0)) / 1000}s elapsed.")
-                
-                # Use a subset of frames to avoid sending too much data (e.g., 5 frames)
-                frames_for_analysis = user_state['frame_buffer'][-5:]
-                
-                prompt = self.get_activity_prompt(activity_type, user_state['rep_count'], 'rep_group_analysis')
-                
-                try:
-                    feedback = await self.gemini_service.analyze_video_frames(frames_for_analysis, prompt)
-                    
-                    response_data.update({
-                        'should_provide_feedback': True,
-                        'feedback': feedback,
-                        'feedback_type': 'batch_analysis'
-                    })
-                    logger.info(f"🧠 AI batch feedback generated for {activity_type}")
-
-                except Exception as e:
-                    logger.error(f"Error during batched Gemini analysis: {e}")
-                    # Use heuristic fallback if AI fails
-                    feedback = self._simple_jumping_jack_feedback(user_state['rep_count'])
-                    response_data.update({
-                        'should_provide_feedback': True,
-                        'feedback': feedback,
-                        'feedback_type': 'heuristic_fallback'
-                    })
-
-                # Reset batch state
-                user_state['frame_buffer'] = []
-                user_state['reps_since_last_batch'] = 0
-                user_state['last_batch_time'] = current_time
-
-        return response_data
-
-    def analyze_complete_rep(self, activity_type: str, rep_data: Dict[str, Any], user_context: Dict[str, Any]) -> str:
+    async def analyze_complete_rep(self, activity_type: str, rep_data: Dict[str, Any], user_context: Dict[str, Any],
+                                   ctx: Optional[RequestContext] = None) -> str:
         """
         Analyze a complete rep and provide expert coaching feedback - ONLY AI GENERATED
         
@@ -705,6 +339,7 @@ class RealtimeCoachingService:
             activity_type: Type of exercise/activity
             rep_data: Complete rep data including phases, landmarks, scores
             user_context: User session context (total reps, performance trends)
+            ctx: Request context whose deadline and cancellation the Gemini call honours
         
         Returns:
             Expert coaching feedback string (AI generated only)
@@ -714,7 +349,10 @@ class RealtimeCoachingService:
             prompt = self.get_complete_rep_prompt(activity_type, rep_data, user_context)
             
             # Use AI analysis ONLY - no fallback to pre-written messages
-            response = self.gemini_service.analyze_movement_data(prompt, rep_data)
+            with self.pacing.track_call():
+                response = await self.gemini_service.analyze_movement_data(
+                    prompt, rep_data, ctx=ctx, landmark_indices=self.landmark_projection(activity_type)
+                )
             
             if response and len(response.strip()) > 0:
                 return response
@@ -732,13 +370,25 @@ class RealtimeCoachingService:
         rep_number = rep_data.get('number', 1)
         form_score = rep_data.get('formScore', 80)
         phases = rep_data.get('phases', [])
+        # Measured against the template's reference rep, when the client sent the rep's landmarks
+        server_score = rep_data.get('serverScore')
+        if server_score:
+            deviations = ", ".join(
+                f"{joint['joint']} {joint['deviation_deg']:+.0f} deg" for joint in server_score['worst_joints']
+            ) or "none above 10 deg"
+            form_score = (
+                f"{server_score['score']}% (measured vs a reference rep; mean deviation "
+                f"{server_score['deviation_deg']} deg; largest joint deviations: {deviations})"
+            )
+        else:
+            form_score = f"{form_score}%"
         
         base_prompt = f"""
         You are a world-class expert coach analyzing a complete {activity_type} rep. 
         
         REP DATA:
         - Rep #{rep_number}
-        - Form Score: {form_score}%
+        - Form Score: {form_score}
         - Phases: {len(phases)} movement phases detected
         - Duration: {rep_data.get('endTime', 0) - rep_data.get('startTime', 0)}ms
         
@@ -829,129 +479,31 @@ class RealtimeCoachingService:
         
         return base_prompt + activity_prompt
     
-    def get_activity_feedback_strategy(self, activity_type: str) -> str:
-        """Determine feedback strategy based on activity type"""
-        activity_lower = activity_type.lower()
-        
-        if 'plank' in activity_lower or 'wall sit' in activity_lower:
-            return 'continuous_hold'  # Form feedback during holds
-        elif 'golf' in activity_lower or 'tennis' in activity_lower:
-            return 'per_swing'       # Analyze each complete swing
-        elif any(term in activity_lower for term in ['pushup', 'push-up', 'push up', 'squat', 'jumping jack']):
-            return 'rep_groups'      # Group multiple reps for analysis
-        elif 'basketball' in activity_lower:
-            return 'per_attempt'     # Each shot attempt
-        else:
-            return 'general'         # Default strategy
-    
-    def get_live_coaching_prompt(self, activity_type: str, feedback_strategy: str, user_state: Dict[str, Any]) -> str:
-        """Generate activity-specific coaching prompts for real-time feedback"""
-        rep_count = user_state.get('reps_completed', 0)
-        
-        if feedback_strategy == 'continuous_hold':
-            # For plank, wall sit, etc.
-            return f"""
-            You are an expert fitness coach providing real-time form feedback for {activity_type}.
-            
-            The user is currently holding the {activity_type} position. Analyze their form and provide:
-            - Brief (10-15 words) encouragement or form correction
-            - Focus on core stability, alignment, and breathing
-            - Keep the user motivated during the hold
-            - Avoid repetitive feedback
-            
-            Current hold duration: {rep_count * 8} seconds
-            
-            Provide specific, actionable feedback based on what you see in the video frame.
-            """
-            
-        elif feedback_strategy == 'per_swing':
-            # For golf, tennis
-            return f"""
-            You are an expert {activity_type} coach providing real-time swing analysis.
-            
-            Analyze the user's current posture and swing technique. Provide:
-            - Brief (15-20 words) technical feedback
-            - Focus on stance, swing plane, balance, tempo
-            - If you can see a golf club, comment on grip and club position
-            - If you cannot clearly see a club, focus on body mechanics and setup
-            - Specific corrections for improvement
-            - Professional coaching tone
-            
-            Swing number: {rep_count + 1}
-            
-            Provide expert coaching feedback based on what you can observe in the video frame.
-            """
-            
-        elif feedback_strategy == 'rep_groups':
-            # For pushups, squats, etc.
-            return f"""
-            You are an expert strength coach providing real-time form feedback for {activity_type}.
-            
-            The user is performing {activity_type} exercises. Analyze their current form and provide:
-            - Brief (10-15 words) form correction or encouragement
-            - Focus on proper range of motion, alignment, and control
-            - Motivational but corrective feedback
-            - Specific technique tips
-            
-            Current rep: {rep_count + 1}
-            
-            Provide specific feedback based on their current movement quality.
-            """
-            
-        elif feedback_strategy == 'per_attempt':
-            # For basketball
-            return f"""
-            You are an expert basketball shooting coach providing real-time feedback.
-            
-            The user just attempted a shot. Analyze their shooting form and provide:
-            - Brief (15-20 words) technical feedback
-            - Focus on shooting mechanics, follow-through, balance
-            - Specific improvements for next shot
-            - Encouraging but instructive tone
-            
-            Shot attempt: {rep_count + 1}
-            
-            Analyze their shooting form and provide coaching feedback.
-            """
-            
-        else:
-            # General strategy
-            return f"""
-            You are an expert fitness coach providing real-time feedback for {activity_type}.
-            
-            Analyze the user's current form and movement. Provide:
-            - Brief (10-15 words) feedback
-            - Focus on proper technique and safety
-            - Encouraging and motivational tone
-            - Specific, actionable advice
-            
-            Movement count: {rep_count + 1}
-            
-            Provide helpful coaching feedback based on what you observe.
-            """
-
-    def _simple_jumping_jack_feedback(self, rep_count: int) -> str:
-        """Generate heuristic jumping jack feedback if AI fails (no generic fluff)"""
-        feedback_options = [
-            f"Rep {rep_count} completed! Keep your arms straight overhead.",
-            f"Good jack #{rep_count}! Land softer on your feet next time.",
-            f"Rep {rep_count} done! Sync your arm and leg movements better.",
-            f"Jack #{rep_count} complete! Jump higher and spread legs wider.",
-            f"Rep {rep_count} finished! Keep your core tight throughout."
-        ]
-        return feedback_options[(rep_count - 1) % len(feedback_options)]
-
-    def get_activity_prompt(self, activity_type: str, rep_count: int, prompt_type: str) -> str:
+    def get_activity_prompt(self, activity_type: str, rep_count: int, prompt_type: str,
+                            frame_phases: Optional[List[str]] = None, kinematics: str = "",
+                            cues_given: Optional[List[str]] = None) -> str:
         """Get a specific prompt for the activity and context."""
         
         base_prompt = f"You are an expert AI fitness coach for {activity_type}."
 
         if prompt_type == 'rep_group_analysis':
+            frames_description = "a batch of frames covering the most recent reps"
+            if frame_phases:
+                frames_description = (
+                    f"{len(frame_phases)} key frames from the most recent reps, in order, "
+                    f"captured at these movement phases: {', '.join(frame_phases)}"
+                )
+            kinematics_section = f"Measured kinematics from pose tracking:\n{kinematics}" if kinematics else ""
+            if cues_given:
+                kinematics_section += (
+                    f"\nInstant cues already given (do not repeat them): {'; '.join(dict.fromkeys(cues_given))}"
+                )
             return f"""
                 {base_prompt}
                 
-                You are analyzing a batch of frames covering the last 5 reps.
+                You are analyzing {frames_description}.
                 The user has completed {rep_count} total reps.
+                {kinematics_section}
                 
                 Analyze the sequence of images to identify the most important form correction the user should make.
                 Provide a single, concise, and actionable tip (15-20 words).
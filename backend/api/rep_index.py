@@ -0,0 +1,173 @@
+"""
+Nearest-neighbour index of coached reps.
+
+A rep is embedded as its joint-angle trajectory resampled to a fixed number of steps, so
+reps of different speed and camera distance are comparable. The index stores embeddings
+with the Gemini feedback they received; a new batch whose reps look like an already
+coached batch (RMS joint-angle difference under a threshold) reuses that feedback. Entries
+expire after a TTL, and a session is never handed advice it has already heard: the match
+is skipped and the batch goes to Gemini, which also fills the feedback cache's variants.
+
+Search is brute force in NumPy while the index is small. Past ``lsh_min_size`` entries a
+p-stable LSH tier (Datar et al., 2004) narrows the candidates before the exact re-rank.
+"""
+
+import time
+from collections import defaultdict
+from typing import Any, Collection, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .kinematics import ANGLE_JOINTS, is_tracked, joint_angles
+
+EMBEDDING_STEPS = 16
+EMBEDDING_DIM = len(ANGLE_JOINTS) * EMBEDDING_STEPS
+
+
+def rep_embedding(landmarks: np.ndarray, steps: int = EMBEDDING_STEPS) -> Optional[np.ndarray]:
+    """
+    Fixed-length embedding of a rep from its ``(N, 33, 4)`` landmarks: every joint angle
+    resampled to ``steps`` points over the rep, in units of 180 degrees. None for < 2 frames.
+    """
+    if len(landmarks) < 2:
+        return None
+    angles = joint_angles(landmarks)
+    source = np.linspace(0.0, 1.0, len(landmarks))
+    target = np.linspace(0.0, 1.0, steps)
+    # Angles a landmark projection left unmeasurable stay at zero rather than adding noise
+    trajectory = np.stack([
+        np.interp(target, source, angles[name]) if is_tracked(landmarks, joints) else np.zeros(steps)
+        for name, joints in ANGLE_JOINTS.items()
+    ])
+    return (trajectory.ravel() / 180.0).astype(np.float32)
+
+
+class RepIndex:
+    """Fixed-capacity vector index (oldest entries overwritten first) with an optional LSH tier"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM, capacity: int = 5000, lsh_min_size: int = 2048,
+                 lsh_tables: int = 8, lsh_bits: int = 6, lsh_width: float = 2.0, seed: int = 0):
+        self.dim = dim
+        self.capacity = capacity
+        self.lsh_min_size = lsh_min_size
+        # Storage grows by doubling up to capacity
+        initial = min(capacity, 256)
+        self._vectors = np.zeros((initial, dim), dtype=np.float32)
+        self._norms = np.zeros(initial, dtype=np.float32)
+        self._payloads: List[Any] = [None] * initial
+        self._size = 0
+        self._next = 0
+        # h(v) = floor((a . v + b) / w) per bit; a bucket key is the tuple of a table's bits.
+        # w is ~4x the match radius (8 deg RMS is ~0.5 in embedding units), which keeps
+        # near neighbours colliding in at least one table ~90% of the time
+        rng = np.random.default_rng(seed)
+        self._lsh_width = lsh_width
+        self._projections = rng.standard_normal((lsh_tables, lsh_bits, dim)).astype(np.float32)
+        self._offsets = rng.uniform(0, lsh_width, (lsh_tables, lsh_bits)).astype(np.float32)
+        self._buckets: List[Dict[bytes, Set[int]]] = [defaultdict(set) for _ in range(lsh_tables)]
+        self._bucket_keys: List[Optional[List[bytes]]] = [None] * initial
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _hash(self, vector: np.ndarray) -> List[bytes]:
+        codes = np.floor((self._projections @ vector + self._offsets) / self._lsh_width).astype(np.int32)
+        return [code.tobytes() for code in codes]
+
+    def _grow(self):
+        extra = min(self.capacity, 2 * len(self._vectors)) - len(self._vectors)
+        self._vectors = np.concatenate([self._vectors, np.zeros((extra, self.dim), dtype=np.float32)])
+        self._norms = np.concatenate([self._norms, np.zeros(extra, dtype=np.float32)])
+        self._payloads.extend([None] * extra)
+        self._bucket_keys.extend([None] * extra)
+
+    def add(self, vector: np.ndarray, payload: Any):
+        slot = self._next
+        if slot >= len(self._vectors):
+            self._grow()
+        old_keys = self._bucket_keys[slot]
+        if old_keys is not None:
+            for table, key in zip(self._buckets, old_keys):
+                table[key].discard(slot)
+                if not table[key]:
+                    del table[key]
+
+        self._vectors[slot] = vector
+        self._norms[slot] = float(vector @ vector)
+        self._payloads[slot] = payload
+        keys = self._hash(vector)
+        for table, key in zip(self._buckets, keys):
+            table[key].add(slot)
+        self._bucket_keys[slot] = keys
+
+        self._next = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _candidates(self, vector: np.ndarray) -> np.ndarray:
+        if self._size < self.lsh_min_size:
+            return np.arange(self._size)
+        slots: Set[int] = set()
+        for table, key in zip(self._buckets, self._hash(vector)):
+            slots |= table.get(key, set())
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+    def nearest(self, vector: np.ndarray) -> Optional[Tuple[Any, float]]:
+        """Payload and squared Euclidean distance of the closest entry, or None"""
+        candidates = self._candidates(vector)
+        if len(candidates) == 0:
+            return None
+        # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, one matrix-vector product for all candidates
+        distances = self._norms[candidates] - 2 * (self._vectors[candidates] @ vector) + float(vector @ vector)
+        best = int(np.argmin(distances))
+        return self._payloads[candidates[best]], max(float(distances[best]), 0.0)
+
+
+class RepFeedbackIndex:
+    """Per-activity rep indexes mapping coached batches to the feedback they received"""
+
+    def __init__(self, capacity: int = 5000, max_rms_deg: float = 8.0, lsh_min_size: int = 2048, ttl: float = 900):
+        self.capacity = capacity
+        self.max_rms_deg = max_rms_deg
+        self.lsh_min_size = lsh_min_size
+        self.ttl = ttl
+        self._indexes: Dict[Hashable, RepIndex] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _index(self, activity_key: Hashable) -> RepIndex:
+        if activity_key not in self._indexes:
+            self._indexes[activity_key] = RepIndex(capacity=self.capacity, lsh_min_size=self.lsh_min_size)
+        return self._indexes[activity_key]
+
+    def add(self, activity_key: Hashable, embedding: Optional[np.ndarray], feedback: str):
+        if embedding is None or not feedback:
+            return
+        self._index(activity_key).add(embedding, (feedback, time.monotonic()))
+
+    def lookup(self, activity_key: Hashable, embedding: Optional[np.ndarray], record: bool = True,
+               heard: Collection[str] = ()) -> Optional[Tuple[str, float]]:
+        """
+        Feedback of the nearest coached batch and its RMS joint-angle difference (degrees), if
+        close enough, not expired and not in ``heard`` (advice the session already got).
+        ``record=False`` leaves the hit/miss counters alone (a peek).
+        """
+        index = self._indexes.get(activity_key)
+        match = index.nearest(embedding) if index is not None and embedding is not None else None
+        if match is not None:
+            (feedback, created), squared = match
+            rms_deg = float(np.sqrt(squared / embedding.size)) * 180.0
+            fresh = time.monotonic() - created <= self.ttl
+            if rms_deg <= self.max_rms_deg and fresh and feedback not in heard:
+                self.hits += record
+                return feedback, rms_deg
+        self.misses += record
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': sum(len(index) for index in self._indexes.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
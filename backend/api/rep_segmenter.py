@@ -0,0 +1,218 @@
+"""
+Streaming rep segmentation for live coaching.
+
+Each activity is reduced to a 1-D movement signal (in torso lengths, so it does not depend on
+distance to the camera) that sits at a minimum in the rest position and peaks at the key
+moment of the rep: squat bottom, arms overhead, shot release, top of the swing. The
+segmenter tracks that signal frame by frame with O(1) work:
+
+- the rest baseline is a rolling minimum over recent rest frames (monotonic deque)
+- a rep starts when the signal rises ``enter`` above baseline and ends when it falls back
+  below ``exit`` (hysteresis, so jitter around one threshold cannot double count)
+- the key moment ("bottom") is emitted once the signal turns ``turn`` below its peak,
+  provided the peak reached ``min_amplitude``
+- reps shorter than ``min_rep_ms``, longer than ``max_rep_ms`` or starting within
+  ``min_period_ms`` of the previous rep are rejected
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .pose import (
+    NOSE, LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_WRIST, RIGHT_WRIST, LEFT_HIP, RIGHT_HIP,
+    LEFT_KNEE, RIGHT_KNEE, VISIBILITY, Y, midpoint, torso_length
+)
+
+
+def _hips_below_knees(points: np.ndarray) -> float:
+    return (midpoint(points, LEFT_HIP, RIGHT_HIP)[1] - midpoint(points, LEFT_KNEE, RIGHT_KNEE)[1]) / torso_length(points)
+
+
+def _shoulders_towards_wrists(points: np.ndarray) -> float:
+    return (midpoint(points, LEFT_SHOULDER, RIGHT_SHOULDER)[1] - midpoint(points, LEFT_WRIST, RIGHT_WRIST)[1]) / torso_length(points)
+
+
+def _wrists_above_nose(points: np.ndarray) -> float:
+    return (points[NOSE, Y] - midpoint(points, LEFT_WRIST, RIGHT_WRIST)[1]) / torso_length(points)
+
+
+def _wrists_above_hips(points: np.ndarray) -> float:
+    return (midpoint(points, LEFT_HIP, RIGHT_HIP)[1] - midpoint(points, LEFT_WRIST, RIGHT_WRIST)[1]) / torso_length(points)
+
+
+@dataclass(frozen=True)
+class SegmenterProfile:
+    """Signal and thresholds for one kind of movement (thresholds in torso lengths)"""
+    signal: Callable[[np.ndarray], float]
+    joints: Tuple[int, ...]
+    enter: float
+    exit: float
+    min_amplitude: float
+    turn: float
+    min_rep_ms: int
+    max_rep_ms: int
+    min_period_ms: int
+    # Frame phase labels for rest, rising towards the key moment, and returning from it
+    labels: Dict[str, str] = field(default_factory=dict)
+    baseline_window_ms: int = 5000
+
+    @property
+    def key_phase_labels(self) -> List[str]:
+        """Phase labels of the frames that say most about form, in priority order"""
+        return [self.labels['active'], self.labels['return']]
+
+
+SEGMENTER_PROFILES = {
+    'squat': SegmenterProfile(
+        signal=_hips_below_knees,
+        joints=(LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP, LEFT_KNEE, RIGHT_KNEE),
+        enter=0.15, exit=0.08, min_amplitude=0.3, turn=0.05,
+        min_rep_ms=500, max_rep_ms=8000, min_period_ms=300,
+        labels={'rest': 'standing', 'active': 'bottom', 'return': 'ascent'}
+    ),
+    'pushup': SegmenterProfile(
+        signal=_shoulders_towards_wrists,
+        joints=(LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_WRIST, RIGHT_WRIST, LEFT_HIP, RIGHT_HIP),
+        enter=0.12, exit=0.06, min_amplitude=0.25, turn=0.05,
+        min_rep_ms=500, max_rep_ms=8000, min_period_ms=300,
+        labels={'rest': 'top', 'active': 'bottom', 'return': 'press'}
+    ),
+    'jumping_jack': SegmenterProfile(
+        signal=_shoulders_towards_wrists,
+        joints=(LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_WRIST, RIGHT_WRIST, LEFT_HIP, RIGHT_HIP),
+        enter=0.3, exit=0.15, min_amplitude=0.8, turn=0.1,
+        min_rep_ms=300, max_rep_ms=3000, min_period_ms=200,
+        labels={'rest': 'arms down', 'active': 'arms overhead', 'return': 'return'}
+    ),
+    'basketball': SegmenterProfile(
+        signal=_wrists_above_nose,
+        joints=(NOSE, LEFT_WRIST, RIGHT_WRIST, LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP),
+        enter=0.3, exit=0.15, min_amplitude=0.8, turn=0.1,
+        min_rep_ms=400, max_rep_ms=6000, min_period_ms=1500,
+        labels={'rest': 'set', 'active': 'release', 'return': 'follow-through'}
+    ),
+    # Golf/tennis hands rise twice per swing (backswing, finish); min_period_ms merges them
+    'swing': SegmenterProfile(
+        signal=_wrists_above_hips,
+        joints=(LEFT_WRIST, RIGHT_WRIST, LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP),
+        enter=0.3, exit=0.15, min_amplitude=0.6, turn=0.1,
+        min_rep_ms=400, max_rep_ms=6000, min_period_ms=1500,
+        labels={'rest': 'address', 'active': 'top of swing', 'return': 'follow-through'}
+    ),
+}
+
+
+def get_segmenter_kind(activity_type: str) -> Optional[str]:
+    """Map a live activity name onto a segmenter profile (None if reps are not segmented)"""
+    activity_lower = activity_type.lower()
+    if 'squat' in activity_lower:
+        return 'squat'
+    if 'pushup' in activity_lower or 'push-up' in activity_lower or 'push up' in activity_lower:
+        return 'pushup'
+    if 'jumping jack' in activity_lower:
+        return 'jumping_jack'
+    if 'basketball' in activity_lower:
+        return 'basketball'
+    if 'tennis' in activity_lower or 'golf' in activity_lower:
+        return 'swing'
+    return None
+
+
+class RepSegmenter:
+    """Incremental rep segmenter for one session (picklable, so it can live in session state)"""
+
+    MIN_VISIBILITY = 0.3
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.state = 'rest'            # rest | active | return
+        self.baseline = None
+        self.signal = 0.0              # last signal value, also used to rank frames
+        self.rep_count = 0
+        self._rest_window = deque()    # (timestamp, signal), increasing signal -> rolling min
+        self._last_timestamp = None
+        self._last_end = None
+        self._start = None
+        self._peak = None
+        self._peak_time = None
+
+    @property
+    def profile(self) -> SegmenterProfile:
+        return SEGMENTER_PROFILES[self.kind]
+
+    @property
+    def phase_label(self) -> str:
+        return self.profile.labels.get(self.state, self.state)
+
+    def update(self, timestamp: int, points: np.ndarray) -> List[Dict]:
+        """Feed one frame of landmarks; returns the rep events it completes"""
+        profile = self.profile
+        if self._last_timestamp is not None and timestamp <= self._last_timestamp:
+            return []  # out of order or duplicate
+        if np.min(points[list(profile.joints), VISIBILITY]) < self.MIN_VISIBILITY:
+            return []
+        self._last_timestamp = timestamp
+
+        s = float(profile.signal(points))
+        self.signal = s
+        events = []
+
+        if self.state == 'rest':
+            self._push_rest_sample(timestamp, s)
+            ready = self._last_end is None or timestamp - self._last_end >= profile.min_period_ms
+            if s - self.baseline > profile.enter and ready:
+                self.state = 'active'
+                self._start = timestamp
+                self._peak, self._peak_time = s, timestamp
+                events.append({'type': 'start', 'timestamp': timestamp})
+            return events
+
+        if self.state == 'active':
+            if s > self._peak:
+                self._peak, self._peak_time = s, timestamp
+            elif self._peak - self.baseline >= profile.min_amplitude and self._peak - s >= profile.turn:
+                self.state = 'return'
+                events.append({
+                    'type': 'bottom',
+                    'timestamp': self._peak_time,
+                    'amplitude': round(self._peak - self.baseline, 3)
+                })
+
+        if s - self.baseline < profile.exit:
+            duration = timestamp - self._start
+            if self.state == 'return' and duration >= profile.min_rep_ms:
+                self.rep_count += 1
+                self._last_end = timestamp
+                events.append({
+                    'type': 'end',
+                    'timestamp': timestamp,
+                    'rep': self.rep_count,
+                    'start': self._start,
+                    'bottom': self._peak_time,
+                    'duration_ms': duration,
+                    'amplitude': round(self._peak - self.baseline, 3)
+                })
+            else:
+                events.append({'type': 'abort', 'timestamp': timestamp, 'reason': 'shallow_or_short'})
+            self.state = 'rest'
+            self._push_rest_sample(timestamp, s)
+        elif timestamp - self._start > profile.max_rep_ms:
+            # Stuck mid-rep (e.g. the athlete changed position); relearn the rest baseline
+            events.append({'type': 'abort', 'timestamp': timestamp, 'reason': 'timeout'})
+            self.state = 'rest'
+            self._rest_window.clear()
+            self._push_rest_sample(timestamp, s)
+
+        return events
+
+    def _push_rest_sample(self, timestamp: int, s: float):
+        window = self._rest_window
+        while window and window[-1][1] >= s:
+            window.pop()
+        window.append((timestamp, s))
+        while window[0][0] < timestamp - self.profile.baseline_window_ms:
+            window.popleft()
+        self.baseline = window[0][1]
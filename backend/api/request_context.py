@@ -0,0 +1,119 @@
+"""
+Deadlines and cancellation for Gemini calls.
+
+A RequestContext carries an absolute deadline and a cancellation token from the view,
+through RealtimeCoachingService, into the Gemini transport. ``run`` races the HTTP call
+against both: when the deadline passes or the context is cancelled, the request task is
+cancelled, which makes httpx abort the connection instead of waiting for a reply no one
+will read. Contexts form a tree: each live session has a root context that
+``stop_live_coaching`` (or idle expiry) cancels, and every request and background task of
+the session works under a child of it, so one cancel reaches all of its calls.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, List, Optional
+
+
+class RequestCancelled(Exception):
+    """The context was cancelled (session stopped, client gone) before the call finished"""
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The context's deadline passed before the call finished"""
+
+
+class RequestContext:
+    """Absolute deadline (monotonic seconds, or None) plus a cancellation token"""
+
+    def __init__(self, deadline: Optional[float] = None, parent: Optional['RequestContext'] = None):
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self._cancelled = asyncio.Event()
+        self._children: List['RequestContext'] = []
+        self._parent = parent
+        if parent is not None:
+            if parent.cancelled:
+                self.cancel(parent.reason)
+            else:
+                parent._children.append(self)
+
+    @classmethod
+    def with_timeout(cls, seconds: Optional[float], parent: Optional['RequestContext'] = None) -> 'RequestContext':
+        return cls(time.monotonic() + seconds if seconds is not None else None, parent)
+
+    def child(self, timeout: Optional[float] = None) -> 'RequestContext':
+        """A context cancelled with this one, with a deadline no later than this one's"""
+        return RequestContext.with_timeout(timeout, parent=self)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (never negative), or None without one"""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = 'cancelled'):
+        if self.cancelled:
+            return
+        self.reason = reason
+        self._cancelled.set()
+        for child in self._children:
+            child.cancel(reason)
+        self._children.clear()
+
+    def close(self):
+        """Detach from the parent once the work is done, so long-lived parents don't accumulate children"""
+        if self._parent is not None:
+            try:
+                self._parent._children.remove(self)
+            except ValueError:
+                pass
+            self._parent = None
+
+    def __enter__(self) -> 'RequestContext':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def check(self):
+        """Raise if the context is already cancelled or past its deadline"""
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+        if self.remaining() == 0.0:
+            raise DeadlineExceeded()
+
+    async def run(self, awaitable: Awaitable) -> Any:
+        """Await ``awaitable``, cancelling it if the deadline passes or the context is cancelled first"""
+        try:
+            self.check()
+        except (RequestCancelled, DeadlineExceeded):
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+        task = asyncio.ensure_future(awaitable)
+        cancelled = asyncio.ensure_future(self._cancelled.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {task, cancelled}, timeout=self.remaining(), return_when=asyncio.FIRST_COMPLETED
+            )
+        except asyncio.CancelledError:
+            # Our caller was cancelled (e.g. the client disconnected): take the call down too
+            task.cancel()
+            raise
+        finally:
+            cancelled.cancel()
+        if task in done:
+            return task.result()
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+        raise DeadlineExceeded()
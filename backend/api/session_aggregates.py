@@ -0,0 +1,159 @@
+"""
+Running aggregates of a live session.
+
+The end-of-session summary used to be rebuilt from whatever the client sent: the stop
+endpoint echoed the client's rep count, and the session analysis listed the first ten
+reps of the client's JSON and dropped the rest. ``SessionAggregates`` lives in the session
+state instead and is updated as the pipeline counts reps, gives cues and times holds:
+rep count, tempo, form scores and the key angles of every rep are kept as running
+mean/variance/min/max (Welford), so stopping a session reads a summary in O(1) and the
+analysis prompt is the same size after 5 reps or 500.
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+# Per-rep features that describe the rep's timing (see kinematics.rep_features), in seconds
+TEMPO_FEATURES = ('dur', 'down', 'up')
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream of numbers (Welford's online algorithm)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float):
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 until there are two values)"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self, digits: int = 2) -> Dict[str, Any]:
+        return {
+            'n': self.count,
+            'mean': round(self.mean, digits),
+            'sd': round(self.std, digits),
+            'min': round(self.min, digits) if self.min is not None else None,
+            'max': round(self.max, digits) if self.max is not None else None
+        }
+
+
+class SessionAggregates:
+    """Incremental summary of one live session (picklable, so it can live in session state)"""
+
+    def __init__(self):
+        self.started_at: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        self.reps = 0
+        # Feature name -> running stats over the reps that had it (tempo, angles, score, ...)
+        self.features: Dict[str, RunningStats] = {}
+        # Cue id (form rule, hold break) -> times given
+        self.cues: Dict[str, int] = {}
+        # Finished holds, in seconds
+        self.holds = RunningStats()
+
+    def observe(self, timestamp: int):
+        """Extend the session's time span to a frame's timestamp (ms)"""
+        if self.started_at is None or timestamp < self.started_at:
+            self.started_at = timestamp
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+
+    def add_rep(self, features: Optional[Dict[str, Any]] = None):
+        """Count a rep and fold in its numeric features"""
+        self.reps += 1
+        for name, value in (features or {}).items():
+            if name == 'rep' or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            self.features.setdefault(name, RunningStats()).add(value)
+
+    def add_cue(self, cue_id: str):
+        self.cues[cue_id] = self.cues.get(cue_id, 0) + 1
+
+    def add_hold(self, held_ms: int):
+        self.holds.add(held_ms / 1000)
+
+    @property
+    def duration_ms(self) -> int:
+        if self.started_at is None:
+            return 0
+        return self.last_timestamp - self.started_at
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serialisable summary; its size depends on the features and cues seen, not on the rep count"""
+        minutes = self.duration_ms / 60000
+        score = self.features.get('score')
+        return {
+            'total_reps': self.reps,
+            'duration_ms': self.duration_ms,
+            'reps_per_minute': round(self.reps / minutes, 1) if minutes else None,
+            'score': score.to_dict(1) if score else None,
+            'tempo': {name: self.features[name].to_dict() for name in TEMPO_FEATURES if name in self.features},
+            'kinematics': {
+                name: stats.to_dict() for name, stats in sorted(self.features.items())
+                if name != 'score' and name not in TEMPO_FEATURES
+            },
+            'cues': dict(sorted(self.cues.items(), key=lambda item: -item[1])),
+            'holds': self.holds.to_dict(1) if self.holds.count else None
+        }
+
+    @classmethod
+    def from_client_session(cls, coaching_data: Dict[str, Any]) -> 'SessionAggregates':
+        """Aggregates of a session as recorded by the client (the CoachingSession JSON of the analyze upload)"""
+        aggregates = cls()
+        start, end = coaching_data.get('startTime'), coaching_data.get('endTime')
+        if isinstance(start, (int, float)) and isinstance(end, (int, float)) and end > start:
+            aggregates.observe(int(start))
+            aggregates.observe(int(end))
+        for rep in coaching_data.get('reps', []):
+            features = {'score': rep.get('formScore')}
+            if rep.get('endTime') and rep.get('startTime'):
+                features['dur'] = (rep['endTime'] - rep['startTime']) / 1000
+            aggregates.add_rep(features)
+        return aggregates
+
+
+def _describe(stats: Dict[str, Any], unit: str = '') -> str:
+    return f"{stats['mean']}{unit} ± {stats['sd']} [{stats['min']}-{stats['max']}]"
+
+
+def format_session_summary(summary: Dict[str, Any]) -> str:
+    """Prompt text for a ``SessionAggregates.summary()`` (mean ± sd [min-max] over the session's reps)"""
+    lines: List[str] = [f"Total Reps Completed: {summary.get('total_reps', 0)}"]
+    if summary.get('duration_ms'):
+        pace = f", {summary['reps_per_minute']} reps/min" if summary.get('reps_per_minute') else ''
+        lines.append(f"Session Duration: {summary['duration_ms'] / 1000:.1f} seconds{pace}")
+    if summary.get('score'):
+        lines.append(f"Form Score per Rep: {_describe(summary['score'], '%')}")
+    if summary.get('tempo'):
+        lines.append("Tempo per Rep (s): " + ", ".join(
+            f"{name} {_describe(stats)}" for name, stats in summary['tempo'].items()
+        ))
+    if summary.get('kinematics'):
+        lines.append("Kinematics per Rep (angles deg, path in torso lengths):")
+        lines.extend(f"  {name}: {_describe(stats)}" for name, stats in summary['kinematics'].items())
+    if summary.get('holds'):
+        holds = summary['holds']
+        lines.append(f"Holds: {holds['n']}, {holds['mean']}s on average, longest {holds['max']}s")
+    if summary.get('best_hold_ms'):
+        lines.append(f"Longest Hold: {summary['best_hold_ms'] / 1000:.1f} seconds")
+    if summary.get('cues'):
+        lines.append("Coaching Cues Given: " + ", ".join(f"{cue} x{count}" for cue, count in summary['cues'].items()))
+    return "\n".join(lines)
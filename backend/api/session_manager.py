@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, Optional, Set, Tuple
+
+from django.conf import settings
+
+from .frame_buffer import FrameRingBuffer, PhaseReservoir
+from .frame_intake import FrameIntake
+from .request_context import RequestContext
+from .kinematics import PoseHistory
+from .session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class LiveSessionManager:
+    """
+    Lifecycle of live-coaching sessions held by this worker.
+
+    Sessions are normally ended by ``stop_live_coaching``, but abandoned tabs and crashed
+    clients never call it. The manager tracks when each session was last seen and a
+    background sweeper:
+    - expires sessions idle for longer than ``idle_ttl`` seconds
+    - evicts least-recently-used sessions while buffered bytes exceed ``memory_budget``
+    """
+
+    def __init__(self, store: SessionStore, idle_ttl: float = 300, memory_budget: int = 256 * 1024 * 1024,
+                 sweep_interval: float = 30):
+        self.store = store
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.sweep_interval = sweep_interval
+        # Worker-local JPEG ring buffers, keyed by session
+        self.frame_buffers: Dict[str, FrameRingBuffer] = {}
+        # Best frame per rep and phase for the next batch, keyed by session
+        self.reservoirs: Dict[str, PhaseReservoir] = {}
+        # Smoothed landmarks of recent frames for per-rep kinematics, keyed by session
+        self.pose_histories: Dict[str, PoseHistory] = {}
+        # Latest-wins admission of incoming frames, keyed by session
+        self.frame_intakes: Dict[str, FrameIntake] = {}
+        # Background analysis tasks started by this worker, keyed by session
+        self.tasks: Dict[str, Set[asyncio.Task]] = {}
+        # Root request context per session; cancelling it aborts the session's Gemini calls
+        self.contexts: Dict[str, RequestContext] = {}
+        # Speculative batch requests (rep they were started for, task), keyed by session
+        self.speculations: Dict[str, Tuple[int, asyncio.Task]] = {}
+        self.speculation_counts = {'started': 0, 'committed': 0, 'cancelled': 0}
+        # session -> last seen (monotonic), least recently used first
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.expired_total = 0
+        self.evicted_total = 0
+
+    def touch(self, session_key: str):
+        """Mark a session as active and make sure the sweeper is running"""
+        self._last_seen[session_key] = time.monotonic()
+        self._last_seen.move_to_end(session_key)
+        self._ensure_sweeper()
+
+    def frame_buffer(self, session_key: str) -> FrameRingBuffer:
+        """Get or create this worker's frame buffer for the session"""
+        if session_key not in self.frame_buffers:
+            self.frame_buffers[session_key] = FrameRingBuffer(
+                max_frames=getattr(settings, 'LIVE_FRAME_BUFFER_MAX_FRAMES', 30),
+                max_bytes=getattr(settings, 'LIVE_FRAME_BUFFER_MAX_BYTES', 2 * 1024 * 1024)
+            )
+        return self.frame_buffers[session_key]
+
+    def reservoir(self, session_key: str) -> PhaseReservoir:
+        """Get or create this worker's phase reservoir for the session"""
+        if session_key not in self.reservoirs:
+            self.reservoirs[session_key] = PhaseReservoir()
+        return self.reservoirs[session_key]
+
+    def pose_history(self, session_key: str) -> PoseHistory:
+        """Get or create this worker's landmark history for the session"""
+        if session_key not in self.pose_histories:
+            self.pose_histories[session_key] = PoseHistory()
+        return self.pose_histories[session_key]
+
+    def frame_intake(self, session_key: str) -> FrameIntake:
+        """Get or create this worker's frame intake for the session"""
+        if session_key not in self.frame_intakes:
+            self.frame_intakes[session_key] = FrameIntake(
+                max_age_ms=getattr(settings, 'LIVE_FRAME_MAX_AGE_MS', 1500)
+            )
+        return self.frame_intakes[session_key]
+
+    def request_context(self, session_key: str, timeout: Optional[float] = None) -> RequestContext:
+        """A context for one request or task of the session, cancelled when the session ends"""
+        self.touch(session_key)
+        if session_key not in self.contexts:
+            self.contexts[session_key] = RequestContext()
+        return self.contexts[session_key].child(timeout)
+
+    def live_request_context(self, session_key: str, timeout: Optional[float] = None) -> RequestContext:
+        """
+        Like ``request_context`` for a request that may come without a live session: it is
+        tied to the session only if one is active, and never creates or touches one
+        """
+        if session_key not in self._last_seen:
+            return RequestContext.with_timeout(timeout)
+        if session_key not in self.contexts:
+            self.contexts[session_key] = RequestContext()
+        return self.contexts[session_key].child(timeout)
+
+    def spawn(self, session_key: str, coro: Awaitable) -> asyncio.Task:
+        """Run ``coro`` in the background on behalf of a session"""
+        task = asyncio.get_running_loop().create_task(coro)
+        tasks = self.tasks.setdefault(session_key, set())
+        tasks.add(task)
+        task.add_done_callback(lambda done: self._forget_task(session_key, done))
+        return task
+
+    def has_pending_tasks(self, session_key: str) -> bool:
+        return bool(self.tasks.get(session_key))
+
+    def speculate(self, session_key: str, rep: int, coro: Awaitable) -> asyncio.Task:
+        """
+        Start a speculative request for the batch that ``rep`` is expected to close. It does not
+        count as a pending task; it is committed with ``take_speculation`` or cancelled.
+        """
+        self.cancel_speculation(session_key)
+        task = asyncio.get_running_loop().create_task(coro)
+        # Failures are handled when the speculation is committed; don't log them as unretrieved
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self.speculations[session_key] = (rep, task)
+        self.speculation_counts['started'] += 1
+        return task
+
+    def take_speculation(self, session_key: str, rep: int) -> Optional[asyncio.Task]:
+        """The session's speculative request if it was started for ``rep`` (otherwise it is cancelled)"""
+        entry = self.speculations.pop(session_key, None)
+        if entry is None:
+            return None
+        speculated_rep, task = entry
+        if speculated_rep != rep:
+            task.cancel()
+            self.speculation_counts['cancelled'] += 1
+            return None
+        self.speculation_counts['committed'] += 1
+        return task
+
+    def cancel_speculation(self, session_key: str):
+        entry = self.speculations.pop(session_key, None)
+        if entry is not None:
+            entry[1].cancel()
+            self.speculation_counts['cancelled'] += 1
+
+    def _forget_task(self, session_key: str, task: asyncio.Task):
+        tasks = self.tasks.get(session_key)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self.tasks[session_key]
+
+    async def end_session(self, session_key: str):
+        """Drop every trace of a session (explicit stop)"""
+        self._release(session_key)
+        await self.store.delete(session_key)
+
+    def restart_session(self, session_key: str):
+        """
+        Drop this worker's resources for a session that is starting over: a client that reloaded
+        without stopping numbers its frames from 1 again, which the old intake would drop as out of order
+        """
+        self._release(session_key)
+
+    async def _evict(self, session_key: str):
+        """Free this worker's resources for a session; shared state is only dropped if it lives here"""
+        self._release(session_key)
+        if self.store.is_process_local:
+            await self.store.delete(session_key)
+
+    def _release(self, session_key: str):
+        self._last_seen.pop(session_key, None)
+        self.frame_buffers.pop(session_key, None)
+        self.reservoirs.pop(session_key, None)
+        self.pose_histories.pop(session_key, None)
+        self.frame_intakes.pop(session_key, None)
+        self.cancel_speculation(session_key)
+        context = self.contexts.pop(session_key, None)
+        if context is not None:
+            context.cancel('session ended')
+        for task in self.tasks.pop(session_key, set()):
+            task.cancel()
+
+    @property
+    def bytes_held(self) -> int:
+        """Bytes held in this worker's frame buffers, reservoirs (frames in both count twice) and pose histories"""
+        return (
+            sum(buffer.nbytes for buffer in self.frame_buffers.values())
+            + sum(reservoir.nbytes for reservoir in self.reservoirs.values())
+            + sum(history.nbytes for history in self.pose_histories.values())
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Gauges and counters for monitoring"""
+        return {
+            'active_sessions': len(self._last_seen),
+            'bytes_held': self.bytes_held,
+            'background_tasks': sum(len(tasks) for tasks in self.tasks.values()),
+            'frames': self._frame_counts(),
+            'speculations': dict(self.speculation_counts, in_flight=len(self.speculations)),
+            'memory_budget': self.memory_budget,
+            'idle_ttl_seconds': self.idle_ttl,
+            'expired_total': self.expired_total,
+            'evicted_total': self.evicted_total,
+        }
+
+    def _frame_counts(self) -> Dict[str, int]:
+        """Frames processed and dropped (by reason) across this worker's current sessions"""
+        counts: Dict[str, int] = {}
+        for intake in self.frame_intakes.values():
+            for reason, count in intake.stats().items():
+                counts[reason] = counts.get(reason, 0) + count
+        return counts
+
+    async def sweep(self):
+        """Expire idle sessions, then evict LRU sessions until under the memory budget"""
+        cutoff = time.monotonic() - self.idle_ttl
+        idle = [key for key, last_seen in self._last_seen.items() if last_seen < cutoff]
+        for session_key in idle:
+            await self._evict(session_key)
+        self.expired_total += len(idle)
+
+        # Orphaned buffers (e.g. created by a request that failed) count as idle too
+        orphans = {
+            key for key in (*self.frame_buffers, *self.pose_histories, *self.frame_intakes)
+            if key not in self._last_seen
+        }
+        for session_key in orphans:
+            self.frame_buffers.pop(session_key, None)
+            self.reservoirs.pop(session_key, None)
+            self.pose_histories.pop(session_key, None)
+            self.frame_intakes.pop(session_key, None)
+
+        evicted = 0
+        bytes_held = self.bytes_held
+        while bytes_held > self.memory_budget and self._last_seen:
+            session_key = next(iter(self._last_seen))
+            held_by_session = (
+                self.frame_buffers.get(session_key),
+                self.reservoirs.get(session_key),
+                self.pose_histories.get(session_key)
+            )
+            for held in held_by_session:
+                bytes_held -= held.nbytes if held else 0
+            await self._evict(session_key)
+            evicted += 1
+        self.evicted_total += evicted
+
+        # Shared backends expire state written by any worker
+        expired_shared = await self.store.expire_idle(self.idle_ttl)
+
+        if idle or evicted or expired_shared:
+            logger.info(
+                f"Live session sweep: expired {len(idle)} idle, evicted {evicted} over budget, "
+                f"dropped {expired_shared} stored; {len(self._last_seen)} active, {bytes_held} bytes held"
+            )
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None and not self._sweeper.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._sweeper = loop.create_task(self._sweep_forever())
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Live session sweep failed: {e}")
@@ -0,0 +1,228 @@
+"""
+Pluggable storage for live-coaching session state.
+
+Frames from one live session can land on any gunicorn worker, so rep counts, detector
+state and batch triggers have to live somewhere all workers can see. Each backend stores a
+pickled state dict together with a version number; writers use compare-and-set on that
+version (optimistic concurrency) and retry on conflict.
+
+Backends:
+- ``memory``: per-process dict, zero-copy (single worker / development)
+- ``sqlite``: a local SQLite file shared by all workers on the host
+- ``redis``: any Redis-compatible server, shared across hosts
+"""
+
+import asyncio
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+
+# Make redis optional - only needed for the redis backend
+try:
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStateConflict(Exception):
+    """Raised when a session update keeps losing compare-and-set races"""
+
+
+class SessionStore:
+    """
+    Versioned key/value store for per-session state.
+
+    ``load`` returns ``(version, state)`` with version 0 and state None for unknown sessions.
+    ``save`` only succeeds if the stored version still equals ``version``; the stored
+    version is then incremented.
+    """
+
+    # True when state lives in this worker's memory (evicting it frees memory here)
+    is_process_local = False
+
+    async def load(self, session_key: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    async def save(self, session_key: str, state: Dict[str, Any], version: int) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, session_key: str):
+        raise NotImplementedError
+
+    async def expire_idle(self, max_idle_seconds: float) -> int:
+        """Drop sessions not written for ``max_idle_seconds``; returns how many were dropped"""
+        return 0
+
+    @staticmethod
+    def serialize(state: Dict[str, Any]) -> bytes:
+        # Same trust model as Django's cache backends: only our own workers write here
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def deserialize(data: bytes) -> Dict[str, Any]:
+        return pickle.loads(data)
+
+
+class InProcessSessionStore(SessionStore):
+    """Per-process store that keeps live state objects directly (no serialization)"""
+
+    is_process_local = True
+
+    def __init__(self):
+        # session_key -> (version, state, updated_at)
+        self._entries: Dict[str, Tuple[int, Dict[str, Any], float]] = {}
+
+    async def load(self, session_key):
+        version, state, _ = self._entries.get(session_key, (0, None, 0))
+        return version, state
+
+    async def save(self, session_key, state, version):
+        current_version = self._entries.get(session_key, (0, None, 0))[0]
+        if current_version != version:
+            return False
+        self._entries[session_key] = (version + 1, state, time.time())
+        return True
+
+    async def delete(self, session_key):
+        self._entries.pop(session_key, None)
+
+    async def expire_idle(self, max_idle_seconds):
+        cutoff = time.time() - max_idle_seconds
+        expired = [key for key, (_, _, updated_at) in self._entries.items() if updated_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store backed by a local SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS live_sessions ('
+            'session_key TEXT PRIMARY KEY, version INTEGER NOT NULL, '
+            'updated_at REAL NOT NULL, data BLOB NOT NULL)'
+        )
+
+    def _fetchone(self, sql: str, params: tuple) -> Optional[tuple]:
+        # The connection is shared by threads: read the result before another statement runs
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        """Run a write statement; returns the number of rows it changed"""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _load(self, session_key):
+        row = self._fetchone(
+            'SELECT version, data FROM live_sessions WHERE session_key = ?', (session_key,)
+        )
+        if row is None:
+            return 0, None
+        return row[0], self.deserialize(row[1])
+
+    def _save(self, session_key, state, version):
+        data = self.serialize(state)
+        if version == 0:
+            changed = self._execute(
+                'INSERT OR IGNORE INTO live_sessions (session_key, version, updated_at, data) '
+                'VALUES (?, 1, ?, ?)',
+                (session_key, time.time(), data)
+            )
+        else:
+            changed = self._execute(
+                'UPDATE live_sessions SET version = version + 1, updated_at = ?, data = ? '
+                'WHERE session_key = ? AND version = ?',
+                (time.time(), data, session_key, version)
+            )
+        return changed == 1
+
+    async def load(self, session_key):
+        return await asyncio.to_thread(self._load, session_key)
+
+    async def save(self, session_key, state, version):
+        return await asyncio.to_thread(self._save, session_key, state, version)
+
+    async def delete(self, session_key):
+        await asyncio.to_thread(
+            self._execute, 'DELETE FROM live_sessions WHERE session_key = ?', (session_key,)
+        )
+
+    async def expire_idle(self, max_idle_seconds):
+        return await asyncio.to_thread(
+            self._execute, 'DELETE FROM live_sessions WHERE updated_at < ?',
+            (time.time() - max_idle_seconds,)
+        )
+
+
+class RedisSessionStore(SessionStore):
+    """Store backed by a Redis-compatible server, shared across hosts"""
+
+    # Compare-and-set: only write if the stored version is still the one we read
+    _CAS_SCRIPT = """
+    local current = redis.call('HGET', KEYS[1], 'v')
+    if (current or '0') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'v', ARGV[2], 'd', ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    return 1
+    """
+
+    def __init__(self, url: str, key_prefix: str = 'live_session:', idle_ttl: int = 300):
+        if not REDIS_AVAILABLE:
+            raise ValueError("redis not available. Please install redis to use the redis session backend.")
+        self.key_prefix = key_prefix
+        # Idle expiry is delegated to Redis key TTLs, refreshed on every write
+        self.idle_ttl = idle_ttl
+        self._client = redis_asyncio.from_url(url)
+        self._cas = self._client.register_script(self._CAS_SCRIPT)
+
+    def _key(self, session_key: str) -> str:
+        return f"{self.key_prefix}{session_key}"
+
+    async def load(self, session_key):
+        version, data = await self._client.hmget(self._key(session_key), 'v', 'd')
+        if version is None or data is None:
+            return 0, None
+        return int(version), self.deserialize(data)
+
+    async def save(self, session_key, state, version):
+        result = await self._cas(
+            keys=[self._key(session_key)],
+            args=[str(version), str(version + 1), self.serialize(state), str(self.idle_ttl)]
+        )
+        return result == 1
+
+    async def delete(self, session_key):
+        await self._client.delete(self._key(session_key))
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store configured by ``LIVE_SESSION_BACKEND``"""
+    backend = getattr(settings, 'LIVE_SESSION_BACKEND', 'memory')
+
+    if backend == 'sqlite':
+        return SQLiteSessionStore(settings.LIVE_SESSION_SQLITE_PATH)
+    if backend == 'redis':
+        return RedisSessionStore(
+            settings.LIVE_SESSION_REDIS_URL,
+            idle_ttl=int(getattr(settings, 'LIVE_SESSION_IDLE_TTL_SECONDS', 300))
+        )
+    if backend != 'memory':
+        logger.warning(f"Unknown LIVE_SESSION_BACKEND '{backend}', using in-process store")
+    return InProcessSessionStore()
@@ -2,6 +2,8 @@
 Activity templates for AI analysis
 """
 
+from .pose import TRACKING_POINT_LANDMARKS
+
 ACTIVITY_TEMPLATES = [
     {
         "id": "basketball_shooting",
@@ -372,4 +374,28 @@ def get_templates_by_category(category=None):
     """Get templates by category, or all if no category specified"""
     if not category:
         return ACTIVITY_TEMPLATES
-    return [t for t in ACTIVITY_TEMPLATES if t['category'] == category] 
\ No newline at end of file
+    return [t for t in ACTIVITY_TEMPLATES if t['category'] == category] 
+
+def resolve_template_id(activity_type):
+    """Template id for a template id or display name (as sent by live coaching), or None"""
+    if not activity_type:
+        return None
+    key = activity_type.strip().lower()
+    for template in ACTIVITY_TEMPLATES:
+        if key == template['id'] or key == template['name'].lower():
+            return template['id']
+    return None
+
+def compile_tracking_points(tracking_points):
+    """Sorted MediaPipe landmark indices behind a template's ``tracking_points`` (KeyError on unknown names)"""
+    return tuple(sorted({index for point in tracking_points for index in TRACKING_POINT_LANDMARKS[point]}))
+
+# Landmark index set per template id, compiled once from its tracking_points
+TRACKING_LANDMARKS = {
+    template['id']: compile_tracking_points(template.get('tracking_points', []))
+    for template in ACTIVITY_TEMPLATES
+}
+
+def get_tracking_landmarks(template_id):
+    """Landmark indices a template tracks, or None for an unknown template"""
+    return TRACKING_LANDMARKS.get(template_id)
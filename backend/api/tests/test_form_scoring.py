@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from api.form_scoring import band_diagonals, dtw
+
+
+def reference_dtw(cost: np.ndarray, band: int) -> float:
+    """Textbook O(n * m) DTW with a Sakoe-Chiba band"""
+    n, m = cost.shape
+    band = max(band, abs(n - m))
+    acc = np.full((n + 1, m + 1), np.inf)
+    acc[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if abs(i - j) <= band:
+                acc[i, j] = cost[i - 1, j - 1] + min(acc[i - 1, j], acc[i, j - 1], acc[i - 1, j - 1])
+    return acc[n, m]
+
+
+class BandedDTWTests(unittest.TestCase):
+
+    def test_matches_reference(self):
+        rng = np.random.default_rng(7)
+        for n, m, band in ((32, 32, 8), (32, 32, 2), (20, 26, 3), (10, 10, 10)):
+            cost = rng.random((n, m))
+            total, _ = dtw(cost, band_diagonals(n, m, band))
+            self.assertAlmostEqual(total, reference_dtw(cost, band))
+
+    def test_identical_sequences_follow_the_diagonal(self):
+        a = np.sin(np.linspace(0, np.pi, 16))
+        total, path = dtw(np.abs(a[:, None] - a[None, :]), band_diagonals(16, 16, 4))
+        self.assertEqual(total, 0.0)
+        self.assertEqual(path, [(i, i) for i in range(16)])
+
+    def test_path_is_monotonic_and_within_band(self):
+        rng = np.random.default_rng(3)
+        band = 3
+        cost = rng.random((24, 24))
+        _, path = dtw(cost, band_diagonals(24, 24, band))
+        self.assertEqual(path[0], (0, 0))
+        self.assertEqual(path[-1], (23, 23))
+        for (i0, j0), (i1, j1) in zip(path, path[1:]):
+            self.assertIn((i1 - i0, j1 - j0), ((1, 0), (0, 1), (1, 1)))
+        self.assertTrue(all(abs(i - j) <= band for i, j in path))
+
+    def test_warping_absorbs_a_time_shift(self):
+        t = np.linspace(0, 1, 32)
+        exemplar = np.sin(np.pi * t)
+        slow_start = np.sin(np.pi * np.clip(t * 1.2 - 0.2, 0, 1))
+        cost = np.abs(exemplar[:, None] - slow_start[None, :])
+        warped, _ = dtw(cost, band_diagonals(32, 32, 8))
+        rigid, _ = dtw(cost, band_diagonals(32, 32, 0))
+        self.assertLess(warped, rigid / 2)
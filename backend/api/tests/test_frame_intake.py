@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+
+from api.frame_intake import OUT_OF_ORDER, STALE, SUPERSEDED, FrameIntake
+
+
+class FrameIntakeOrderingTests(unittest.IsolatedAsyncioTestCase):
+
+    async def admit(self, intake, sequence, timestamp):
+        async with intake.admit(sequence, timestamp) as ticket:
+            return ticket.dropped
+
+    async def test_drops_older_sequence(self):
+        intake = FrameIntake()
+        self.assertIsNone(await self.admit(intake, 2, 1000))
+        self.assertEqual(await self.admit(intake, 1, 1400), OUT_OF_ORDER)
+        self.assertIsNone(await self.admit(intake, 3, 1400))
+
+    async def test_unsequenced_frames_ordered_by_timestamp(self):
+        intake = FrameIntake()
+        self.assertIsNone(await self.admit(intake, None, 1000))
+        self.assertEqual(await self.admit(intake, None, 1000), OUT_OF_ORDER)
+        self.assertEqual(await self.admit(intake, None, 900), OUT_OF_ORDER)
+        self.assertIsNone(await self.admit(intake, None, 1100))
+
+    async def test_mixed_endpoints_same_moment(self):
+        # analyze-frame posts a sequence; the continuous-feedback call may post the same
+        # timestamp without one and must not be dropped against it
+        intake = FrameIntake()
+        self.assertIsNone(await self.admit(intake, 1, 1000))
+        self.assertIsNone(await self.admit(intake, None, 1000))
+        self.assertIsNone(await self.admit(intake, 2, 1000))
+        self.assertEqual(intake.stats()[OUT_OF_ORDER], 0)
+
+    async def test_mixed_endpoints_both_sequenced(self):
+        intake = FrameIntake()
+        self.assertIsNone(await self.admit(intake, 1, 1000))
+        self.assertIsNone(await self.admit(intake, 2, 1000))
+        self.assertEqual(await self.admit(intake, 1, 1000), OUT_OF_ORDER)
+
+
+class FrameIntakeLatestWinsTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_newer_frame_supersedes_waiting_frame(self):
+        intake = FrameIntake()
+        release = asyncio.Event()
+        results = {}
+
+        async def frame(sequence, hold=False):
+            async with intake.admit(sequence, sequence * 100) as ticket:
+                results[sequence] = ticket.dropped
+                if hold:
+                    await release.wait()
+
+        first = asyncio.create_task(frame(1, hold=True))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(frame(2))
+        await asyncio.sleep(0)
+        third = asyncio.create_task(frame(3))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, second, third)
+        self.assertEqual(results, {1: None, 2: SUPERSEDED, 3: None})
+
+    async def test_frame_expires_while_waiting(self):
+        intake = FrameIntake(max_age_ms=20)
+        release = asyncio.Event()
+        results = {}
+
+        async def frame(sequence, hold=False):
+            async with intake.admit(sequence, sequence * 100) as ticket:
+                results[sequence] = ticket.dropped
+                if hold:
+                    await release.wait()
+
+        first = asyncio.create_task(frame(1, hold=True))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(frame(2))
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.gather(first, second)
+        self.assertEqual(results, {1: None, 2: STALE})
+        self.assertFalse(intake._busy)
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from api.landmark_filter import LandmarkFilter
+from api.pose import NUM_LANDMARKS, VISIBILITY
+
+
+def frame(x: float, y: float = 0.5, visibility: float = 1.0, rows: int = NUM_LANDMARKS) -> np.ndarray:
+    points = np.zeros((rows, 4))
+    points[:, 0], points[:, 1], points[:, VISIBILITY] = x, y, visibility
+    return points
+
+
+class LandmarkFilterTests(unittest.TestCase):
+
+    def test_first_frame_passes_through(self):
+        landmark_filter = LandmarkFilter()
+        points = frame(0.4)
+        np.testing.assert_array_equal(landmark_filter.update(0, points), points)
+        np.testing.assert_array_equal(landmark_filter.velocity, 0.0)
+
+    def test_smooths_jitter_and_converges(self):
+        landmark_filter = LandmarkFilter()
+        rng = np.random.default_rng(0)
+        raw, smoothed = [], []
+        for step in range(60):
+            x = 0.5 + rng.normal(0, 0.01)
+            raw.append(x)
+            smoothed.append(landmark_filter.update(step * 33, frame(x))[0, 0])
+        # Jitter around a still joint is damped...
+        self.assertLess(np.std(smoothed[10:]), np.std(raw[10:]) / 2)
+        # ...and a step to a new position is followed within a few hundred ms
+        for step in range(60, 75):
+            out = landmark_filter.update(step * 33, frame(0.7))
+        self.assertAlmostEqual(out[0, 0], 0.7, delta=0.01)
+
+    def test_fast_motion_has_less_lag_than_slow(self):
+        def lag(speed):
+            landmark_filter = LandmarkFilter()
+            for step in range(30):
+                out = landmark_filter.update(step * 33, frame(0.1 + speed * step * 0.033))
+            return 0.1 + speed * 29 * 0.033 - out[0, 0]
+        # Lag in units of distance per second of motion: the cutoff rises with speed
+        self.assertLess(lag(1.0) / 1.0, lag(0.1) / 0.1)
+
+    def test_low_visibility_landmark_moves_less(self):
+        confident, unsure = LandmarkFilter(), LandmarkFilter()
+        confident.update(0, frame(0.5))
+        unsure.update(0, frame(0.5))
+        self.assertGreater(confident.update(33, frame(0.6))[0, 0], unsure.update(33, frame(0.6, visibility=0.2))[0, 0])
+
+    def test_missing_landmark_holds_position(self):
+        landmark_filter = LandmarkFilter()
+        landmark_filter.update(0, frame(0.5))
+        out = landmark_filter.update(33, frame(0.0, y=0.0, visibility=0.0))
+        # Visibility passes through; the position stays put instead of jumping to (0, 0)
+        self.assertEqual(out[0, VISIBILITY], 0.0)
+        self.assertEqual((out[0, 0], out[0, 1]), (0.5, 0.5))
+        np.testing.assert_array_equal(landmark_filter.velocity, 0.0)
+
+    def test_out_of_order_and_long_gap(self):
+        landmark_filter = LandmarkFilter(max_gap_ms=1000)
+        landmark_filter.update(1000, frame(0.5))
+        landmark_filter.update(1033, frame(0.6))
+        position = landmark_filter.position.copy()
+        # A late frame is answered with the current estimate and leaves the state alone
+        self.assertEqual(landmark_filter.update(1010, frame(0.9))[0, 0], position[0, 0])
+        np.testing.assert_array_equal(landmark_filter.position, position)
+        # After a long pause the filter restarts from the measurement
+        self.assertEqual(landmark_filter.update(3000, frame(0.2))[0, 0], 0.2)
+
+    def test_restarts_when_projection_changes(self):
+        landmark_filter = LandmarkFilter()
+        landmark_filter.update(0, frame(0.5))
+        landmark_filter.update(33, frame(0.6))
+        out = landmark_filter.update(66, frame(0.3, rows=12))
+        self.assertEqual(out.shape, (12, 4))
+        self.assertEqual(landmark_filter.position.shape, (12, 3))
+        self.assertEqual(out[0, 0], 0.3)
+        np.testing.assert_array_equal(landmark_filter.velocity, 0.0)
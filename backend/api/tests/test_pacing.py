@@ -0,0 +1,41 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from api.pacing import PacingController
+from api.request_context import RequestCancelled
+
+
+class TrackCallTests(unittest.TestCase):
+
+    def call(self, pacing, seconds, raises=None):
+        clock = [100.0]
+        with mock.patch('api.pacing.time.monotonic', side_effect=lambda: clock[0]):
+            try:
+                with pacing.track_call():
+                    clock[0] += seconds
+                    if raises is not None:
+                        raise raises
+            except BaseException:
+                pass
+
+    def test_completed_call_updates_latency(self):
+        pacing = PacingController(target_latency=2.0, smoothing=0.5)
+        self.call(pacing, 3.0)
+        self.assertAlmostEqual(pacing.latency, 2.0)
+        self.assertEqual(pacing.in_flight, 0)
+
+    def test_failed_call_updates_latency_and_errors(self):
+        pacing = PacingController(target_latency=2.0, smoothing=0.5)
+        self.call(pacing, 3.0, raises=ValueError())
+        self.assertAlmostEqual(pacing.latency, 2.0)
+        self.assertEqual(pacing.errors, 1)
+
+    def test_cancelled_call_leaves_latency(self):
+        pacing = PacingController(target_latency=2.0, smoothing=0.5)
+        self.call(pacing, 0.01, raises=asyncio.CancelledError())
+        self.call(pacing, 0.01, raises=RequestCancelled('stopped'))
+        self.assertAlmostEqual(pacing.latency, 1.0)
+        self.assertEqual((pacing.errors, pacing.in_flight), (0, 0))
+        self.assertEqual(len(pacing._calls), 2)
+
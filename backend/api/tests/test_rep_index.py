@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from api.rep_index import EMBEDDING_DIM, RepFeedbackIndex
+
+
+class RepFeedbackIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = [1000.0]
+        patcher = mock.patch('api.rep_index.time.monotonic', side_effect=lambda: self.clock[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.embedding = np.random.default_rng(0).random(EMBEDDING_DIM).astype(np.float32)
+
+    def test_similar_batch_reuses_feedback(self):
+        index = RepFeedbackIndex(max_rms_deg=8.0)
+        index.add('squat', self.embedding, 'tip 1')
+        feedback, rms_deg = index.lookup('squat', self.embedding + 0.01)
+        self.assertEqual(feedback, 'tip 1')
+        self.assertAlmostEqual(rms_deg, 1.8, places=3)
+        self.assertIsNone(index.lookup('squat', self.embedding + 0.1))
+        self.assertIsNone(index.lookup('pushup', self.embedding))
+
+    def test_skips_feedback_the_session_heard(self):
+        index = RepFeedbackIndex()
+        index.add('squat', self.embedding, 'tip 1')
+        self.assertIsNone(index.lookup('squat', self.embedding, heard=['tip 1']))
+        self.assertEqual(index.lookup('squat', self.embedding, heard=['tip 2'])[0], 'tip 1')
+        self.assertEqual((index.hits, index.misses), (1, 1))
+
+    def test_entries_expire(self):
+        index = RepFeedbackIndex(ttl=900)
+        index.add('squat', self.embedding, 'tip 1')
+        self.clock[0] += 900
+        self.assertIsNotNone(index.lookup('squat', self.embedding))
+        self.clock[0] += 1
+        self.assertIsNone(index.lookup('squat', self.embedding))
+
+    def test_peek_does_not_count(self):
+        index = RepFeedbackIndex()
+        index.add('squat', self.embedding, 'tip 1')
+        index.lookup('squat', self.embedding, record=False)
+        self.assertEqual((index.hits, index.misses), (0, 0))
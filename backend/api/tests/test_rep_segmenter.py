@@ -0,0 +1,114 @@
+import unittest
+
+import numpy as np
+
+from api.pose import (
+    LEFT_HIP, LEFT_KNEE, LEFT_SHOULDER, NUM_LANDMARKS, RIGHT_HIP, RIGHT_KNEE, RIGHT_SHOULDER, VISIBILITY, X, Y
+)
+from api.rep_segmenter import SEGMENTER_PROFILES, RepSegmenter
+
+SQUAT = SEGMENTER_PROFILES['squat']
+
+
+def squat_frame(signal: float, visibility: float = 1.0) -> np.ndarray:
+    """Landmarks whose squat signal (hips below knees, in torso lengths) is ``signal``"""
+    points = np.zeros((NUM_LANDMARKS, 4))
+    points[:, VISIBILITY] = visibility
+    torso, knee_y = 0.3, 0.7
+    hip_y = knee_y + signal * torso
+    for left, right, y in ((LEFT_SHOULDER, RIGHT_SHOULDER, hip_y - torso), (LEFT_HIP, RIGHT_HIP, hip_y),
+                           (LEFT_KNEE, RIGHT_KNEE, knee_y)):
+        points[left, [X, Y]] = 0.45, y
+        points[right, [X, Y]] = 0.55, y
+    return points
+
+
+def feed(segmenter, signals, start_ms=0, step_ms=100):
+    """Feed one frame per signal value; returns the events and the next timestamp"""
+    events = []
+    timestamp = start_ms
+    for signal in signals:
+        events.extend(segmenter.update(timestamp, squat_frame(signal)))
+        timestamp += step_ms
+    return events, timestamp
+
+
+def types(events):
+    return [event['type'] for event in events]
+
+
+def rep(depth=0.5, frames=10):
+    """Stand, descend to ``depth`` and come back up, over ``2 * frames`` frames"""
+    down = np.linspace(0.0, depth, frames)
+    return list(down) + list(down[::-1])
+
+
+class RepSegmenterTests(unittest.TestCase):
+
+    def test_one_clean_rep(self):
+        segmenter = RepSegmenter('squat')
+        events, _ = feed(segmenter, [0.0] * 5 + rep() + [0.0] * 5)
+        self.assertEqual(types(events), ['start', 'bottom', 'end'])
+        end = events[-1]
+        self.assertEqual(end['rep'], 1)
+        self.assertLessEqual(end['start'], end['bottom'])
+        self.assertAlmostEqual(end['amplitude'], 0.5, places=2)
+
+    def test_hysteresis_does_not_double_count(self):
+        # Bouncing at the bottom and jitter between the exit and enter thresholds on the
+        # way up stay within one rep
+        segmenter = RepSegmenter('squat')
+        between = (SQUAT.exit + SQUAT.enter) / 2
+        signals = [0.0] * 5 + rep()[:10] + [0.3, 0.5, 0.3, 0.5] + [between, SQUAT.enter + 0.01] * 3 + [0.0] * 5
+        events, _ = feed(segmenter, signals)
+        self.assertEqual(types(events).count('end'), 1)
+        self.assertEqual(types(events).count('start'), 1)
+        self.assertEqual(segmenter.rep_count, 1)
+
+    def test_shallow_rep_is_aborted(self):
+        segmenter = RepSegmenter('squat')
+        events, _ = feed(segmenter, [0.0] * 5 + rep(depth=SQUAT.min_amplitude - 0.05) + [0.0] * 5)
+        self.assertEqual(types(events), ['start', 'abort'])
+        self.assertEqual(segmenter.rep_count, 0)
+
+    def test_short_rep_is_aborted(self):
+        segmenter = RepSegmenter('squat')
+        events, _ = feed(segmenter, [0.0] * 5 + [0.5, 0.0], step_ms=SQUAT.min_rep_ms // 2 - 1)
+        self.assertEqual(types(events)[-1], 'abort')
+        self.assertNotIn('end', types(events))
+        self.assertEqual(events[-1]['reason'], 'shallow_or_short')
+
+    def test_min_period_between_reps(self):
+        segmenter = RepSegmenter('squat')
+        events, timestamp = feed(segmenter, [0.0] * 5 + rep())
+        self.assertEqual(types(events)[-1], 'end')
+        end_ms = events[-1]['timestamp']
+        # A rise right after the rep ended is not a new rep...
+        early = segmenter.update(end_ms + SQUAT.min_period_ms // 2, squat_frame(0.5))
+        self.assertEqual(early, [])
+        self.assertEqual(segmenter.state, 'rest')
+        # ...but one after the minimum period is
+        segmenter.update(end_ms + SQUAT.min_period_ms, squat_frame(0.0))
+        late = segmenter.update(end_ms + SQUAT.min_period_ms + 100, squat_frame(0.5))
+        self.assertEqual(types(late), ['start'])
+
+    def test_stuck_rep_times_out(self):
+        segmenter = RepSegmenter('squat')
+        events, _ = feed(segmenter, [0.0] * 5 + [0.5] * 2 + [0.5] * 5, step_ms=SQUAT.max_rep_ms // 5)
+        self.assertIn('timeout', [event.get('reason') for event in events])
+        self.assertEqual(segmenter.state, 'rest')
+
+    def test_ignores_out_of_order_and_invisible_frames(self):
+        segmenter = RepSegmenter('squat')
+        feed(segmenter, [0.0] * 5)
+        self.assertEqual(segmenter.update(100, squat_frame(0.5)), [])
+        self.assertEqual(segmenter.update(1000, squat_frame(0.5, visibility=0.1)), [])
+        self.assertEqual(segmenter.state, 'rest')
+
+    def test_baseline_follows_rest_minimum(self):
+        segmenter = RepSegmenter('squat')
+        feed(segmenter, [0.05, 0.02, 0.04, 0.03])
+        self.assertAlmostEqual(segmenter.baseline, 0.02)
+        # Samples older than the baseline window drop out
+        feed(segmenter, [0.06] * 3, start_ms=SQUAT.baseline_window_ms + 1000)
+        self.assertAlmostEqual(segmenter.baseline, 0.06)
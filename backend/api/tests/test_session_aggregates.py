@@ -0,0 +1,81 @@
+import json
+import pickle
+import unittest
+
+import numpy as np
+
+from api.session_aggregates import RunningStats, SessionAggregates, format_session_summary
+
+
+class RunningStatsTests(unittest.TestCase):
+
+    def test_matches_numpy(self):
+        values = np.random.default_rng(1).normal(120, 15, 500)
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        self.assertEqual(stats.count, 500)
+        self.assertAlmostEqual(stats.mean, values.mean())
+        self.assertAlmostEqual(stats.variance, values.var(ddof=1))
+        self.assertEqual((stats.min, stats.max), (values.min(), values.max()))
+
+    def test_stable_with_large_offset(self):
+        # The naive sum-of-squares formula loses all precision here
+        stats = RunningStats()
+        for value in (1e9 + 4, 1e9 + 7, 1e9 + 13, 1e9 + 16):
+            stats.add(value)
+        self.assertAlmostEqual(stats.variance, 30.0)
+
+    def test_empty_and_single(self):
+        stats = RunningStats()
+        self.assertEqual(stats.to_dict(), {'n': 0, 'mean': 0.0, 'sd': 0.0, 'min': None, 'max': None})
+        stats.add(3)
+        self.assertEqual((stats.variance, stats.mean), (0.0, 3.0))
+
+
+class SessionAggregatesTests(unittest.TestCase):
+
+    def session(self, reps: int) -> SessionAggregates:
+        aggregates = SessionAggregates()
+        for rep in range(reps):
+            aggregates.observe(1000 + rep * 2000)
+            aggregates.add_rep({'rep': rep + 1, 'dur': 1.5 + rep % 3 * 0.1, 'knee_min': 80 + rep % 5, 'score': 70 + rep % 10})
+            if rep % 4 == 0:
+                aggregates.add_cue('squat_depth')
+        return aggregates
+
+    def test_summary(self):
+        summary = self.session(10).summary()
+        self.assertEqual(summary['total_reps'], 10)
+        self.assertEqual(summary['duration_ms'], 18000)
+        self.assertEqual(summary['tempo']['dur']['n'], 10)
+        self.assertEqual(summary['score']['max'], 79)
+        self.assertEqual(list(summary['kinematics']), ['knee_min'])
+        self.assertEqual(summary['cues'], {'squat_depth': 3})
+        json.dumps(summary)
+
+    def test_summary_size_does_not_grow_with_reps(self):
+        short, long = self.session(5).summary(), self.session(500).summary()
+        self.assertEqual(long['total_reps'], 500)
+        self.assertLess(abs(len(format_session_summary(long)) - len(format_session_summary(short))), 40)
+
+    def test_picklable(self):
+        aggregates = self.session(3)
+        aggregates.add_hold(12500)
+        restored = pickle.loads(pickle.dumps(aggregates))
+        self.assertEqual(restored.summary(), aggregates.summary())
+        self.assertEqual(restored.summary()['holds']['max'], 12.5)
+
+    def test_ignores_non_numeric_features(self):
+        aggregates = SessionAggregates()
+        aggregates.add_rep({'rep': 1, 'score': None, 'valgus': True, 'label': 'x', 'rom': 90})
+        self.assertEqual(list(aggregates.features), ['rom'])
+
+    def test_from_client_session(self):
+        aggregates = SessionAggregates.from_client_session({
+            'startTime': 0, 'endTime': 60000,
+            'reps': [{'startTime': 1000 * k, 'endTime': 1000 * k + 800, 'formScore': 80} for k in range(1, 13)]
+        })
+        summary = aggregates.summary()
+        self.assertEqual((summary['total_reps'], summary['duration_ms'], summary['reps_per_minute']), (12, 60000, 12.0))
+        self.assertAlmostEqual(summary['tempo']['dur']['mean'], 0.8)
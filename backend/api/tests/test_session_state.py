@@ -0,0 +1,102 @@
+import unittest
+
+from api.realtime_coaching import RealtimeCoachingService
+from api.rep_segmenter import RepSegmenter
+from api.session_store import InProcessSessionStore, SessionStateConflict
+
+
+class ContendedStore(InProcessSessionStore):
+    """Loses the first ``conflicts`` compare-and-set races, as if another worker wrote first"""
+
+    def __init__(self, conflicts: int):
+        super().__init__()
+        self.conflicts = conflicts
+        self.saves = 0
+
+    async def save(self, session_key, state, version):
+        self.saves += 1
+        if self.conflicts:
+            self.conflicts -= 1
+            # The other writer's update lands, bumping the version
+            current_version, current_state = await self.load(session_key)
+            other = dict(current_state or {})
+            other['rep_count'] = 100 * self.saves
+            await super().save(session_key, other, current_version)
+            return False
+        return await super().save(session_key, state, version)
+
+
+class UpdateUserStateTests(unittest.IsolatedAsyncioTestCase):
+
+    def service(self, store) -> RealtimeCoachingService:
+        service = RealtimeCoachingService()
+        service.session_store = store
+        return service
+
+    async def test_retries_mutation_on_latest_state(self):
+        store = ContendedStore(conflicts=2)
+        service = self.service(store)
+        calls = []
+
+        def mutate(user_state):
+            calls.append(user_state.get('rep_count', 0))
+            user_state['rep_count'] = user_state.get('rep_count', 0) + 1
+            return user_state['rep_count']
+
+        result = await service.update_user_state('1', mutate)
+        # Re-run on each reloaded state, so the other writer's update is kept
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(result, 201)
+        self.assertEqual((await store.load('1'))[1]['rep_count'], 201)
+
+    async def test_gives_up_after_max_retries(self):
+        store = ContendedStore(conflicts=RealtimeCoachingService.MAX_STATE_UPDATE_RETRIES)
+        service = self.service(store)
+        with self.assertRaises(SessionStateConflict):
+            await service.update_user_state('1', lambda user_state: None)
+        self.assertEqual(store.saves, RealtimeCoachingService.MAX_STATE_UPDATE_RETRIES)
+
+
+class StartSessionTests(unittest.IsolatedAsyncioTestCase):
+
+    async def admit(self, service, sequence):
+        async with service.sessions.frame_intake('1').admit(sequence, sequence * 100) as ticket:
+            return ticket.dropped
+
+    async def test_restart_without_stop(self):
+        # A client that reloads mid-session starts again without calling stop, numbering frames from 1
+        service = RealtimeCoachingService()
+        await service.start_session('1')
+        for sequence in range(1, 200):
+            self.assertIsNone(await self.admit(service, sequence))
+        service.sessions.pose_history('1')
+
+        def open_rep(user_state):
+            user_state['rep_count'] = 7
+            user_state['segmenter'] = RepSegmenter('squat')
+        await service.update_user_state('1', open_rep)
+
+        user_state = await service.start_session('1')
+        self.assertEqual(user_state['rep_count'], 0)
+        self.assertIsNone(user_state['segmenter'])
+        self.assertNotIn('1', service.sessions.pose_histories)
+        for sequence in range(1, 4):
+            self.assertIsNone(await self.admit(service, sequence))
+        self.assertEqual(service.sessions.stats()['active_sessions'], 1)
+
+
+class LiveRequestContextTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_without_live_session(self):
+        service = RealtimeCoachingService()
+        with service.sessions.live_request_context('1', timeout=2.0) as ctx:
+            self.assertLessEqual(ctx.remaining(), 2.0)
+        self.assertEqual(service.sessions.stats()['active_sessions'], 0)
+        self.assertNotIn('1', service.sessions.contexts)
+
+    async def test_cancelled_with_live_session(self):
+        service = RealtimeCoachingService()
+        await service.start_session('1')
+        with service.sessions.live_request_context('1') as ctx:
+            await service.reset_user_state('1')
+            self.assertTrue(ctx.cancelled)
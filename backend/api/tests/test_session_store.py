@@ -0,0 +1,76 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from api.session_store import InProcessSessionStore, SQLiteSessionStore
+
+
+class CompareAndSetMixin:
+
+    def make_store(self):
+        raise NotImplementedError
+
+    async def test_unknown_session(self):
+        store = self.make_store()
+        self.assertEqual(await store.load('missing'), (0, None))
+
+    async def test_save_bumps_version(self):
+        store = self.make_store()
+        self.assertTrue(await store.save('s', {'rep_count': 1}, 0))
+        self.assertEqual(await store.load('s'), (1, {'rep_count': 1}))
+        self.assertTrue(await store.save('s', {'rep_count': 2}, 1))
+        self.assertEqual(await store.load('s'), (2, {'rep_count': 2}))
+
+    async def test_stale_version_rejected(self):
+        store = self.make_store()
+        await store.save('s', {'rep_count': 1}, 0)
+        await store.save('s', {'rep_count': 2}, 1)
+        self.assertFalse(await store.save('s', {'rep_count': 99}, 1))
+        self.assertFalse(await store.save('s', {'rep_count': 99}, 0))
+        self.assertEqual(await store.load('s'), (2, {'rep_count': 2}))
+
+    async def test_concurrent_increments_are_not_lost(self):
+        store = self.make_store()
+
+        async def increment():
+            while True:
+                version, state = await store.load('s')
+                state = dict(state or {'rep_count': 0})
+                state['rep_count'] += 1
+                if await store.save('s', state, version):
+                    return
+
+        await asyncio.gather(*(increment() for _ in range(40)))
+        version, state = await store.load('s')
+        self.assertEqual((version, state['rep_count']), (40, 40))
+
+    async def test_expire_idle(self):
+        store = self.make_store()
+        await store.save('s', {}, 0)
+        self.assertEqual(await store.expire_idle(60), 0)
+        self.assertEqual(await store.expire_idle(-1), 1)
+        self.assertEqual(await store.load('s'), (0, None))
+
+
+class InProcessSessionStoreTests(CompareAndSetMixin, unittest.IsolatedAsyncioTestCase):
+
+    def make_store(self):
+        return InProcessSessionStore()
+
+
+class SQLiteSessionStoreTests(CompareAndSetMixin, unittest.IsolatedAsyncioTestCase):
+
+    def make_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteSessionStore(os.path.join(directory.name, 'sessions.db'))
+
+    async def test_rowcount_read_under_lock(self):
+        # Interleaved writes on the shared connection from worker threads: each save must
+        # see its own statement's rowcount, so exactly one writer per version wins
+        store = self.make_store()
+        await store.save('s', {'rep_count': 0}, 0)
+        results = await asyncio.gather(*(store.save('s', {'rep_count': n}, 1) for n in range(20)))
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual((await store.load('s'))[0], 2)
@@ -15,4 +15,6 @@ urlpatterns = [
     path('live-coaching/stop/', views.stop_live_coaching, name='stop_live_coaching'),
     path('live-coaching/analyze-frame/', views.analyze_live_frame, name='analyze_live_frame'),
     path('live-coaching/feedback/', views.get_live_feedback, name='get_live_feedback'),
+    path('live-coaching/rep-event/', views.submit_rep_event, name='submit_rep_event'),
+    path('live-coaching/metrics/', views.live_coaching_metrics, name='live_coaching_metrics'),
 ] 
\ No newline at end of file
@@ -6,16 +6,20 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
 import json
 import time
 import logging
+from typing import Optional
 
 from .templates import ACTIVITY_TEMPLATES, get_template_by_id
 from .gemini_service import GeminiAnalysisService
 from .analytics import analytics
 from .realtime_coaching import RealtimeCoachingService
+from .coaching_pipeline import LiveFrame, LiveRepEvent
 from .elevenlabs_service import ElevenLabsService
+from .decorators import async_api_view
 
 User = get_user_model()
 
@@ -24,12 +28,84 @@ logger = logging.getLogger(__name__)
 # Create a single coaching service instance that persists across requests
 COACHING_SERVICE = RealtimeCoachingService()
 
+
+def _live_frame(request, activity_type: str) -> Optional[LiveFrame]:
+    """The live frame posted to any of the live coaching endpoints, or None if it is malformed"""
+    pose_data = request.data.get('pose_data') or {}
+    if not isinstance(pose_data, dict):
+        return None
+    timestamp = request.data.get('timestamp') or pose_data.get('timestamp') or int(time.time() * 1000)
+    sequence = request.data.get('sequence')
+    frame_data = request.data.get('frame_data')
+    if not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool):
+        return None
+    if sequence is not None and (not isinstance(sequence, int) or isinstance(sequence, bool)):
+        return None
+    if frame_data is not None and not isinstance(frame_data, str):
+        return None
+    return LiveFrame(
+        user_id=str(request.user.id),
+        activity_type=activity_type,
+        frame_data=frame_data,
+        pose_data=pose_data,
+        timestamp=int(timestamp),
+        sequence=sequence
+    )
+
+
+def _live_rep_event(request, activity_type: str) -> Optional[LiveRepEvent]:
+    """
+    The rep event posted to the event protocol endpoint, or None if it is malformed. The
+    trajectory is ``{"timestamps": [...], "landmarks": [...]}`` with one landmark set per
+    timestamp (``{x, y, z, visibility}`` dicts or the flat 33 x 4 number list).
+    """
+    trajectory = request.data.get('trajectory') or {}
+    timestamps = trajectory.get('timestamps') if isinstance(trajectory, dict) else None
+    landmarks = trajectory.get('landmarks') if isinstance(trajectory, dict) else None
+    if not isinstance(timestamps, list) or not isinstance(landmarks, list) or not timestamps:
+        return None
+    if len(timestamps) != len(landmarks) or len(timestamps) > COACHING_SERVICE.pipeline.max_trajectory_frames:
+        return None
+    keyframes = request.data.get('keyframes') or []
+    if not isinstance(keyframes, list) or len(keyframes) > COACHING_SERVICE.pipeline.max_keyframes:
+        return None
+    if not all(isinstance(keyframe, dict) for keyframe in keyframes):
+        return None
+    if any(keyframe.get('frame_data') and not isinstance(keyframe['frame_data'], str) for keyframe in keyframes):
+        return None
+    sequence = request.data.get('sequence')
+    if sequence is not None and (not isinstance(sequence, int) or isinstance(sequence, bool)):
+        return None
+    try:
+        return LiveRepEvent(
+            user_id=str(request.user.id),
+            activity_type=activity_type,
+            trajectory=[(int(timestamp), frame) for timestamp, frame in zip(timestamps, landmarks)],
+            keyframes=[
+                (int(keyframe.get('timestamp') or timestamps[-1]), keyframe['frame_data'])
+                for keyframe in keyframes if keyframe.get('frame_data')
+            ],
+            sequence=sequence
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
     """Health check endpoint"""
     return Response({'status': 'healthy', 'message': 'Motion Mentor API is running'})
 
+@async_api_view(['GET'], admin_only=True)
+async def live_coaching_metrics(request):
+    """Live-coaching session gauges for this worker (read on the event loop that updates them)"""
+    return JsonResponse({
+        **COACHING_SERVICE.sessions.stats(),
+        'feedback_cache': COACHING_SERVICE.feedback_cache.stats(),
+        'rep_index': COACHING_SERVICE.rep_index.stats(),
+        'pacing': COACHING_SERVICE.pacing.stats()
+    })
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_templates(request):
@@ -181,7 +257,9 @@ def analyze_video(request):
         if coaching_data:
             analysis_result = gemini_service.analyze_coaching_session(coaching_data, prompt)
         else:
-            analysis_result = gemini_service.analyze_activity(video_file, prompt)
+            analysis_result = gemini_service.analyze_activity(
+                video_file, prompt, activity_type=template['name'] if template_id else ''
+            )
         
         processing_time = time.time() - start_time
         
@@ -261,69 +339,45 @@ def verify_google_token(request):
             'error': str(e)
         }, status=status.HTTP_401_UNAUTHORIZED)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-@csrf_exempt
-def realtime_coaching(request):
+@async_api_view(['POST'])
+async def realtime_coaching(request):
     """Real-time coaching analysis for live feedback"""
-    import asyncio
+    frame_data = request.data.get('frame_data')
+    activity_type = request.data.get('activity_type')  # Frontend sends activity_type
+    
+    if not frame_data or not activity_type:
+        return JsonResponse({
+            'success': False,
+            'error': 'Missing frame_data or activity_type'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    frame = _live_frame(request, activity_type)
+    if frame is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid pose_data, timestamp or sequence'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        data = json.loads(request.body)
-        frame_data = data.get('frame_data')
-        activity_type = data.get('activity_type')  # Frontend sends activity_type
-        pose_data = data.get('pose_data', {})
-        
-        if not frame_data or not activity_type:
-            return Response({
-                'success': False,
-                'error': 'Missing frame_data or activity_type'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Build context from request data
-        context = {
-            'user_id': str(request.user.id),
-            'timestamp': pose_data.get('timestamp', int(time.time() * 1000)),
-            'pose_data': pose_data
-        }
-        
-        # Initialize coaching service
-        coaching_service = COACHING_SERVICE
+        # Every frame goes through the session's coaching pipeline, which does its own pacing
+        result = await COACHING_SERVICE.pipeline.submit(frame)
         
-        # Check if we should analyze this frame (avoid spam)
-        user_id = context['user_id']
-        current_time = context['timestamp']
-        
-        if not coaching_service.should_analyze_frame(user_id, current_time):
-            return Response({
-                'success': False,
-                'message': 'Analysis skipped - too frequent'
-            })
-        
-        # Analyze the frame using asyncio.run for async compatibility
-        result = asyncio.run(coaching_service.analyze_live_frame(frame_data, activity_type, context))
-        
-        if result['success']:
+        if result.get('should_provide_feedback'):
             # Track coaching interaction
-            analytics.track_coaching_feedback(
-                user_id=user_id,
+            await sync_to_async(analytics.track_coaching_feedback, thread_sensitive=False)(
+                user_id=str(request.user.id),
                 activity_type=activity_type,
-                feedback_type=result.get('type', 'tip'),
-                feedback_length=len(result.get('feedback', ''))
+                feedback_type=result.get('feedback_type', 'tip'),
+                feedback_length=len(result.get('feedback') or '')
             )
         
-        return Response(result)
+        return JsonResponse(result)
         
-    except json.JSONDecodeError:
-        return Response({
-            'success': False,
-            'error': 'Invalid JSON data'
-        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-                 return Response({
-             'success': False,
-             'error': str(e)
-         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -393,74 +447,79 @@ def generate_speech(request):
             'fallback': True
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-@csrf_exempt
-def analyze_complete_rep(request):
+@async_api_view(['POST'])
+async def analyze_complete_rep(request):
     """Analyze a complete rep after it's finished for expert coaching feedback"""
+    activity_type = request.data.get('activity_type')
+    rep_data = request.data.get('rep_data', {})
+    user_context = request.data.get('user_context') or {}
+    
+    if not activity_type or not rep_data:
+        return JsonResponse({
+            'success': False,
+            'error': 'Missing activity_type or rep_data'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(rep_data, dict) or not isinstance(user_context, dict):
+        return JsonResponse({
+            'success': False,
+            'error': 'rep_data and user_context must be objects'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
     try:
-        data = json.loads(request.body)
-        activity_type = data.get('activity_type')
-        rep_data = data.get('rep_data', {})
-        user_context = data.get('user_context', {})
-        
-        if not activity_type or not rep_data:
-            return Response({
-                'success': False,
-                'error': 'Missing activity_type or rep_data'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         # Initialize coaching service
         coaching_service = COACHING_SERVICE
         
-        # Create complete rep coaching feedback
-        feedback = coaching_service.analyze_complete_rep(
-            activity_type=activity_type,
-            rep_data=rep_data,
-            user_context=user_context
-        )
+        # Score the rep server-side when its landmark frames were sent
+        score = coaching_service.score_rep_landmarks(activity_type, rep_data.get('landmarkFrames'))
+        if score:
+            rep_data = {**rep_data, 'serverScore': score.to_dict()}
+        
+        # Text-only Gemini call with a strict deadline, so it lands before the next rep;
+        # stopping the live session (if one is running) abandons it
+        with coaching_service.sessions.live_request_context(str(request.user.id)) as ctx:
+            feedback = await coaching_service.analyze_complete_rep(
+                activity_type=activity_type,
+                rep_data=rep_data,
+                user_context=user_context,
+                ctx=ctx
+            )
         
         if feedback:
             # Track rep analysis
-            analytics.track_event('rep_analyzed', str(request.user.id), {
+            await sync_to_async(analytics.track_event, thread_sensitive=False)('rep_analyzed', str(request.user.id), {
                 'activity_type': activity_type,
                 'rep_number': rep_data.get('number', 0),
-                'form_score': rep_data.get('formScore', 0),
+                'form_score': score.score if score else rep_data.get('formScore', 0),
                 'feedback_length': len(feedback)
             })
             
-            return Response({
+            return JsonResponse({
                 'success': True,
-                'feedback': feedback
+                'feedback': feedback,
+                'form_score': score.to_dict() if score else None
             })
         else:
-            return Response({
+            return JsonResponse({
                 'success': False,
-                'error': 'No feedback generated'
+                'error': 'No feedback generated',
+                'form_score': score.to_dict() if score else None
             })
             
-    except json.JSONDecodeError:
-        return Response({
-            'success': False,
-            'error': 'Invalid JSON data'
-        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        return Response({
+        return JsonResponse({
             'success': False,
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-@csrf_exempt
-def start_live_coaching(request):
+@async_api_view(['POST'])
+async def start_live_coaching(request):
     """Start a live coaching session for continuous analysis"""
     user = request.user
     
     # Check rate limits
-    can_analyze, message = user.can_analyze()
+    can_analyze, message = await user.acan_analyze()
     if not can_analyze:
-        return Response({
+        return JsonResponse({
             'error': 'Rate limit exceeded',
             'message': message
         }, status=status.HTTP_429_TOO_MANY_REQUESTS)
@@ -468,18 +527,20 @@ def start_live_coaching(request):
     try:
         activity_type = request.data.get('activity_type', 'general')
         
-        # Initialize live coaching service
         coaching_service = COACHING_SERVICE
+        # Clients that detect reps themselves may ask for the event protocol
+        events = request.data.get('protocol') == 'events' and coaching_service.pipeline.event_protocol
+        # ... and to send only the landmarks the activity needs
+        landmark_indices = None
+        if request.data.get('landmark_projection') and coaching_service.landmark_projections:
+            landmark_indices = coaching_service.landmark_projection(activity_type)
         
-        # Create or get user state
-        user_state = coaching_service.get_user_state(str(user.id))
-        user_state['phase'] = 'setup'
-        user_state['rep_count'] = 0
-        user_state['movement_detected'] = False
+        # Create or reset the shared session state
+        user_state = await coaching_service.start_session(str(user.id), landmark_indices)
         
         # Track live coaching session start
         if analytics:
-            analytics.track_analysis_request(
+            await sync_to_async(analytics.track_analysis_request, thread_sensitive=False)(
                 user_id=str(user.id),
                 activity_type=f"Live Coaching: {activity_type}",
                 template_id=None,
@@ -487,163 +548,185 @@ def start_live_coaching(request):
                 custom_prompt=False
             )
         
-        return Response({
+        response_data = {
             'success': True,
             'message': 'Live coaching session started',
             'session_id': f"live_{user.id}_{int(time.time())}",
             'activity_type': activity_type,
-            'user_state': user_state
-        })
+            'coaching_interval_ms': int(coaching_service.effective_coaching_interval(activity_type) * 1000),
+            'protocol': 'events' if events else 'frames',
+            # Send landmarks as exactly these MediaPipe indices, in this order (null: all 33)
+            'landmark_indices': list(landmark_indices) if landmark_indices is not None else None,
+            'user_state': {
+                'phase': user_state['phase'],
+                'rep_count': user_state['rep_count'],
+                'movement_detected': user_state['movement_detected']
+            }
+        }
+        if events:
+            # Post one /live-coaching/rep-event/ per rep, within these limits
+            response_data['event_limits'] = {
+                'max_trajectory_frames': coaching_service.pipeline.max_trajectory_frames,
+                'max_keyframes': coaching_service.pipeline.max_keyframes
+            }
+        
+        return JsonResponse(response_data)
         
     except Exception as e:
-        return Response({
+        return JsonResponse({
             'error': 'Failed to start live coaching session',
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-@csrf_exempt
-def stop_live_coaching(request):
+@async_api_view(['POST'])
+async def stop_live_coaching(request):
     """Stop a live coaching session"""
     user = request.user
     
     try:
         session_id = request.data.get('session_id')
-        coaching_data = request.data.get('coaching_data', {})
+        coaching_data = request.data.get('coaching_data') or {}
+        if not isinstance(coaching_data, dict):
+            return JsonResponse({'error': 'coaching_data must be an object'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Initialize coaching service
         coaching_service = COACHING_SERVICE
         
+        # Read the server's running aggregates before the session state goes away
+        aggregates = await coaching_service.session_summary(str(user.id))
+        
         # Reset user state
-        coaching_service.reset_user_state(str(user.id))
+        await coaching_service.reset_user_state(str(user.id))
+        
+        session_summary = {
+            'total_reps': coaching_data.get('total_reps', 0),
+            'session_duration': coaching_data.get('duration', 0),
+            'feedback_given': coaching_data.get('feedback_count', 0)
+        }
+        if aggregates is not None:
+            # Reps and duration as the server counted them, not as the client reports them
+            session_summary.update({
+                'total_reps': aggregates['total_reps'],
+                'session_duration': aggregates['duration_ms'],
+                'aggregates': aggregates
+            })
         
         # Track session completion
         if analytics:
-            analytics.track_analysis_completion(
+            await sync_to_async(analytics.track_analysis_completion, thread_sensitive=False)(
                 user_id=str(user.id),
                 activity_type="Live Coaching Session",
                 success=True,
                 processing_time=0,
-                frames_analyzed=coaching_data.get('total_reps', 0)
+                frames_analyzed=session_summary['total_reps']
             )
         
-        return Response({
+        return JsonResponse({
             'success': True,
             'message': 'Live coaching session stopped',
-            'session_summary': {
-                'total_reps': coaching_data.get('total_reps', 0),
-                'session_duration': coaching_data.get('duration', 0),
-                'feedback_given': coaching_data.get('feedback_count', 0)
-            }
+            'session_summary': session_summary
         })
         
     except Exception as e:
-        return Response({
+        return JsonResponse({
             'error': 'Failed to stop live coaching session',
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-@csrf_exempt
+@async_api_view(['POST'])
 async def analyze_live_frame(request):
     """Analyze a single frame for live coaching feedback with batching."""
-    user = request.user
-    
     try:
-        frame_data = request.data.get('frame_data')
-        activity_type = request.data.get('activity_type', 'general')
-        pose_data = request.data.get('pose_data', {})
-        current_time = request.data.get('timestamp', int(time.time() * 1000))
-        
-        if not frame_data and not pose_data:
-            return Response({'error': 'No frame data or pose data provided'}, status=status.HTTP_400_BAD_REQUEST)
+        frame = _live_frame(request, request.data.get('activity_type', 'general'))
         
-        coaching_service = COACHING_SERVICE
-        context = {
-            'user_id': str(user.id),
-            'pose_data': pose_data,
-            'timestamp': current_time
-        }
+        if frame is None:
+            return JsonResponse({'error': 'Invalid pose_data, timestamp or sequence'}, status=status.HTTP_400_BAD_REQUEST)
+        if not frame.frame_data and not frame.pose_data:
+            return JsonResponse({'error': 'No frame data or pose data provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # The service method is now async, so we can await it directly
-        response_data = await coaching_service.analyze_live_frame(
-            frame_data, activity_type, context
-        )
+        response_data = await COACHING_SERVICE.pipeline.submit(frame)
         
-        return Response(response_data)
+        return JsonResponse(response_data)
 
     except Exception as e:
         logger.error(f"Error in analyze_live_frame view: {e}", exc_info=True)
-        return Response(
+        return JsonResponse(
             {'error': 'An unexpected error occurred during frame analysis.'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-@csrf_exempt
-def get_live_feedback(request):
+@async_api_view(['POST'])
+async def submit_rep_event(request):
+    """Event protocol: verify a rep the client detected from its landmark trajectory and coach on it"""
+    if not COACHING_SERVICE.pipeline.event_protocol:
+        return JsonResponse({'error': 'Event protocol is disabled'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        event = _live_rep_event(request, request.data.get('activity_type', 'general'))
+        
+        if event is None:
+            return JsonResponse({'error': 'Invalid rep event trajectory, keyframes or sequence'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response_data = await COACHING_SERVICE.pipeline.submit_event(event)
+        
+        return JsonResponse(response_data)
+
+    except Exception as e:
+        logger.error(f"Error in submit_rep_event view: {e}", exc_info=True)
+        return JsonResponse(
+            {'error': 'An unexpected error occurred during rep event analysis.'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@async_api_view(['POST'])
+async def get_live_feedback(request):
     """Get continuous form feedback during live coaching - CONSOLIDATED to prevent overlapping speech"""
     user = request.user
     
     try:
         activity_type = request.data.get('activity_type', 'general')
-        pose_data = request.data.get('pose_data', {})
-        frame_data = request.data.get('frame_data', '')  # Get actual frame data
-        current_time = request.data.get('timestamp', int(time.time() * 1000))
-        
-        # Initialize coaching service
-        coaching_service = COACHING_SERVICE
-        
-        # Check if we should provide feedback (rate limiting to prevent overlap)
-        if not coaching_service.should_provide_coaching(str(user.id), activity_type):
-            return Response({
+        frame = _live_frame(request, activity_type)
+        if frame is None:
+            return JsonResponse({
                 'should_provide_feedback': False,
-                'message': 'Feedback rate limited'
-            })
+                'error': 'Invalid pose_data, timestamp or sequence'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Use the consolidated analyze_live_frame method to prevent timing conflicts
+        # The same pipeline as the other live endpoints (one throttle, no double counting)
         try:
-            import asyncio
-            context = {
-                'user_id': str(user.id),
-                'timestamp': current_time,
-                'pose_data': pose_data
-            }
-            
-            # Use the same method as other endpoints to prevent conflicts
-            result = asyncio.run(coaching_service.analyze_live_frame(frame_data, activity_type, context))
+            result = await COACHING_SERVICE.pipeline.submit(frame)
+            coaching_interval_ms = result.get(
+                'coaching_interval_ms', int(COACHING_SERVICE.effective_coaching_interval(activity_type) * 1000)
+            )
             
             if result.get('success') and result.get('feedback'):
                 # Record analysis usage
-                user.record_analysis()
+                await user.arecord_analysis()
                 
-                return Response({
+                return JsonResponse({
                     'should_provide_feedback': True,
                     'feedback': result['feedback'],
-                    'feedback_type': result.get('type', 'ai_analysis'),
-                    'activity': result.get('activity', activity_type),
-                    'rep_count': result.get('rep_count', 0)
+                    'feedback_type': result.get('feedback_type', 'ai_analysis'),
+                    'activity': activity_type,
+                    'rep_count': result.get('rep_count', 0),
+                    'coaching_interval_ms': coaching_interval_ms
                 })
             else:
-                return Response({
+                return JsonResponse({
                     'should_provide_feedback': False,
-                    'message': result.get('message', 'No feedback needed at this time')
+                    'message': result.get('message', 'No feedback needed at this time'),
+                    'coaching_interval_ms': coaching_interval_ms
                 })
             
         except Exception as e:
             logger.error(f"Error in get_live_feedback: {e}")
             # NO FALLBACK FEEDBACK - return empty response
-            return Response({
+            return JsonResponse({
                 'should_provide_feedback': False,
                 'error': f'AI feedback failed: {str(e)}'
             })
         
     except Exception as e:
         logger.error(f"Error in get_live_feedback endpoint: {e}")
-        return Response({
+        return JsonResponse({
             'error': 'Failed to get live feedback',
             'message': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,21 @@
+"""
+pytest setup for the backend's unit tests.
+
+The project settings need deployment credentials (Google client, Gemini key), which the
+unit tests never touch, so pytest runs them against minimal settings instead; the modules
+under test read their tuning with ``getattr(settings, ..., default)``.
+"""
+
+import django
+from django.conf import settings
+
+
+def pytest_configure():
+    if not settings.configured:
+        settings.configure(
+            INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth'],
+            DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+            LIVE_SESSION_BACKEND='memory',
+            GEMINI_API_KEY='test-key',
+        )
+        django.setup()
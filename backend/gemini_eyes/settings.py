@@ -62,6 +62,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'gemini_eyes.wsgi.application'
+# Live-coaching views are native async; serve them from an ASGI worker (see render.yaml)
+ASGI_APPLICATION = 'gemini_eyes.asgi.application'
 
 # Database
 DATABASE_URL = config('DATABASE_URL', default=None)
@@ -146,6 +148,70 @@ ANALYSIS_COOLDOWN_MINUTES = config('ANALYSIS_COOLDOWN_MINUTES', default=0, cast=
 VIDEO_MAX_SIZE_MB = 10
 VIDEO_MAX_DURATION_SECONDS = 30
 
+# Live coaching frame buffer (per session, raw JPEG bytes)
+LIVE_FRAME_BUFFER_MAX_FRAMES = config('LIVE_FRAME_BUFFER_MAX_FRAMES', default=30, cast=int)
+LIVE_FRAME_BUFFER_MAX_BYTES = config('LIVE_FRAME_BUFFER_MAX_BYTES', default=2 * 1024 * 1024, cast=int)
+# Live frames are processed latest-wins per session; a frame's feedback is withheld if it
+# is ready later than this after the frame arrived
+LIVE_FRAME_MAX_AGE_MS = config('LIVE_FRAME_MAX_AGE_MS', default=1500, cast=int)
+# Start a batch's Gemini request when the rep that will close it passes its key phase
+# (squat bottom, shot release) and cancel it if the rep is aborted
+LIVE_SPECULATIVE_BATCHES = config('LIVE_SPECULATIVE_BATCHES', default=True, cast=bool)
+# Background batch requests are abandoned after this long; stop_live_coaching cancels them
+# (and in-request Gemini calls of the session) immediately
+LIVE_BATCH_DEADLINE_SECONDS = config('LIVE_BATCH_DEADLINE_SECONDS', default=20.0, cast=float)
+# Event protocol (/live-coaching/rep-event/): clients that detect reps themselves send one
+# request per rep, with its landmark trajectory and up to LIVE_EVENT_MAX_KEYFRAMES frames,
+# instead of a frame per tick; the server re-segments the trajectory before coaching on it
+LIVE_EVENT_PROTOCOL = config('LIVE_EVENT_PROTOCOL', default=True, cast=bool)
+LIVE_EVENT_MAX_TRAJECTORY_FRAMES = config('LIVE_EVENT_MAX_TRAJECTORY_FRAMES', default=300, cast=int)
+LIVE_EVENT_MAX_KEYFRAMES = config('LIVE_EVENT_MAX_KEYFRAMES', default=2, cast=int)
+# Clients may ask at session start to send only the landmarks the activity's template tracks
+# (plus those the server's detectors read) instead of all 33
+LIVE_LANDMARK_PROJECTION = config('LIVE_LANDMARK_PROJECTION', default=True, cast=bool)
+
+# Live coaching session state backend: memory (single worker), sqlite (workers on one host)
+# or redis (any number of hosts)
+LIVE_SESSION_BACKEND = config('LIVE_SESSION_BACKEND', default='memory')
+LIVE_SESSION_SQLITE_PATH = config('LIVE_SESSION_SQLITE_PATH', default=str(BASE_DIR / 'live_sessions.sqlite3'))
+LIVE_SESSION_REDIS_URL = config('LIVE_SESSION_REDIS_URL', default='redis://localhost:6379/0')
+# Sessions abandoned without stop_live_coaching are expired after this much idle time
+LIVE_SESSION_IDLE_TTL_SECONDS = config('LIVE_SESSION_IDLE_TTL_SECONDS', default=300, cast=int)
+# Per-worker cap on buffered frame bytes; least recently used sessions are evicted beyond it
+LIVE_SESSION_MEMORY_BUDGET_BYTES = config('LIVE_SESSION_MEMORY_BUDGET_BYTES', default=256 * 1024 * 1024, cast=int)
+LIVE_SESSION_SWEEP_INTERVAL_SECONDS = config('LIVE_SESSION_SWEEP_INTERVAL_SECONDS', default=30, cast=int)
+# Per-worker cache of batch feedback keyed by fault signature; a key is served once it holds
+# LIVE_FEEDBACK_CACHE_VARIANTS responses
+LIVE_FEEDBACK_CACHE_MAX_KEYS = config('LIVE_FEEDBACK_CACHE_MAX_KEYS', default=1024, cast=int)
+LIVE_FEEDBACK_CACHE_TTL_SECONDS = config('LIVE_FEEDBACK_CACHE_TTL_SECONDS', default=900, cast=int)
+LIVE_FEEDBACK_CACHE_VARIANTS = config('LIVE_FEEDBACK_CACHE_VARIANTS', default=2, cast=int)
+# Per-worker nearest-neighbour index of coached batches; a batch within this RMS joint-angle
+# difference of a coached one reuses its feedback, unless the session already heard it
+LIVE_REP_INDEX_CAPACITY = config('LIVE_REP_INDEX_CAPACITY', default=5000, cast=int)
+LIVE_REP_INDEX_MAX_RMS_DEG = config('LIVE_REP_INDEX_MAX_RMS_DEG', default=8.0, cast=float)
+LIVE_REP_INDEX_TTL_SECONDS = config('LIVE_REP_INDEX_TTL_SECONDS', default=900, cast=int)
+# Post-rep text analysis (/api/analyze-rep/): give up after this long so advice lands before
+# the next rep, and keep replies to a sentence or two
+LIVE_REP_ANALYSIS_DEADLINE_SECONDS = config('LIVE_REP_ANALYSIS_DEADLINE_SECONDS', default=2.5, cast=float)
+LIVE_REP_ANALYSIS_MAX_OUTPUT_TOKENS = config('LIVE_REP_ANALYSIS_MAX_OUTPUT_TOKENS', default=80, cast=int)
+# Adaptive coaching intervals: per-activity intervals are scaled by this worker's Gemini
+# latency (vs the target), calls in flight and use of its share of the per-minute quota,
+# between MIN_SCALE (spare capacity) and MAX_SCALE (overloaded)
+LIVE_PACING_TARGET_LATENCY_SECONDS = config('LIVE_PACING_TARGET_LATENCY_SECONDS', default=2.0, cast=float)
+LIVE_PACING_MAX_IN_FLIGHT = config('LIVE_PACING_MAX_IN_FLIGHT', default=32, cast=int)
+LIVE_PACING_QUOTA_PER_MINUTE = config('LIVE_PACING_QUOTA_PER_MINUTE', default=600, cast=int)
+LIVE_PACING_MIN_SCALE = config('LIVE_PACING_MIN_SCALE', default=0.75, cast=float)
+LIVE_PACING_MAX_SCALE = config('LIVE_PACING_MAX_SCALE', default=4.0, cast=float)
+
+# Server-side pose extraction for uploaded videos (needs opencv-python and mediapipe)
+POSE_EXTRACTION_ENABLED = config('POSE_EXTRACTION_ENABLED', default=True, cast=bool)
+# Warm pose models per worker process
+POSE_MODEL_POOL_SIZE = config('POSE_MODEL_POOL_SIZE', default=2, cast=int)
+POSE_SAMPLE_FPS = config('POSE_SAMPLE_FPS', default=10, cast=int)
+POSE_MAX_FRAMES = config('POSE_MAX_FRAMES', default=120, cast=int)
+# Cropped key frames sent to Gemini per clip
+POSE_KEY_FRAMES = config('POSE_KEY_FRAMES', default=6, cast=int)
+
 # File Upload
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
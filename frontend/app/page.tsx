@@ -131,7 +131,9 @@ export default function Home() {
       
       // If we have coaching data, prioritize that over video analysis
       if (coachingData) {
-        formData.append('coaching_data', JSON.stringify(coachingData))
+        // With the server's session aggregates the per-rep log is redundant, so don't upload it
+        const { reps, ...sessionData } = coachingData
+        formData.append('coaching_data', JSON.stringify(coachingData.serverSummary ? sessionData : coachingData))
         // Still send video for backup/validation, but smaller
         formData.append('video', videoBlob)
       } else {
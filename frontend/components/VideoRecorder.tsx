@@ -67,6 +67,8 @@ interface CoachingSession {
   allCues: CoachingCue[]
   improvementAreas: string[]
   strengths: string[]
+  // Running aggregates the backend kept for the live session (returned when it stops)
+  serverSummary?: Record<string, any>
 }
 
 // Exercise state machine types
@@ -179,6 +181,14 @@ export default function VideoRecorder({ onVideoRecorded, onBack, activityName }:
   const poseDataRef = useRef<PoseData[]>([])
   const analyzePoseRef = useRef<(landmarks: any[]) => void>(() => {})
   const liveCoachingIntervalRef = useRef<NodeJS.Timeout | null>(null)
+  const frameSequenceRef = useRef(0) // Lets the backend drop late or out-of-order frames
+  const landmarkIndicesRef = useRef<number[] | null>(null) // Landmarks the backend asked for (null: all 33)
+
+  // Only the landmarks negotiated at session start, in the order the backend listed them
+  const projectLandmarks = (landmarks: any[]): any[] => {
+    const indices = landmarkIndicesRef.current
+    return indices ? indices.map(index => landmarks[index]) : landmarks
+  }
 
   // Get initial phase for activity
   function getInitialPhase(activity: string): string {
@@ -206,12 +216,16 @@ export default function VideoRecorder({ onVideoRecorded, onBack, activityName }:
               'Authorization': `Bearer ${token}`
             },
             body: JSON.stringify({
-              activity_type: activityName
+              activity_type: activityName,
+              landmark_projection: true
             })
           })
 
           if (!response.ok) {
             console.error('Backend session start failed:', await response.text())
+          } else {
+            const session = await response.json()
+            landmarkIndicesRef.current = session.landmark_indices ?? null
           }
         } catch (error) {
           console.error('Error starting backend session:', error)
@@ -229,7 +243,8 @@ export default function VideoRecorder({ onVideoRecorded, onBack, activityName }:
       // Initialize coaching session
       setCoachingSession(prev => ({
         ...prev,
-        startTime: Date.now()
+        startTime: Date.now(),
+        serverSummary: undefined
       }))
 
       // Start continuous analysis loop
@@ -288,12 +303,22 @@ export default function VideoRecorder({ onVideoRecorded, onBack, activityName }:
 
         if (!response.ok) {
           console.error('Backend session stop failed:', await response.text())
+        } else {
+          const data = await response.json()
+          if (data.session_summary?.aggregates) {
+            setCoachingSession(prev => ({
+              ...prev,
+              serverSummary: data.session_summary.aggregates
+            }))
+          }
         }
       } catch (error) {
         console.error('Error stopping backend session:', error)
       }
     }
 
+    landmarkIndicesRef.current = null
+
     setLiveCoaching(prev => ({
       ...prev,
       mode: 'setup',
@@ -435,10 +460,11 @@ export default function VideoRecorder({ onVideoRecorded, onBack, activityName }:
         body: JSON.stringify({
           activity_type: activityName,
           pose_data: {
-            landmarks: latestPose.landmarks,
+            landmarks: projectLandmarks(latestPose.landmarks),
             timestamp: latestPose.timestamp
           },
-          timestamp: currentTime
+          timestamp: currentTime,
+          sequence: ++frameSequenceRef.current
         })
       })
 
@@ -492,6 +518,20 @@ export default function VideoRecorder({ onVideoRecorded, onBack, activityName }:
             }))
           }, 2000)
           
+        } else if (data.should_provide_feedback && data.feedback) {
+          // Batch feedback finished in the background after an earlier rep
+          const batchCue: CoachingCue = {
+            message: data.feedback,
+            type: 'tip',
+            timestamp: currentTime
+          }
+
+          setCurrentCue(batchCue)
+          setCoachingSession(prev => ({
+            ...prev,
+            allCues: [...prev.allCues, batchCue]
+          }))
+          await speak(data.feedback, 'form_tip')
         } else if (!data.movement_completed) {
           console.log('No rep detected by backend, checking for continuous feedback')
           // No rep detected, check for continuous feedback
@@ -633,10 +673,11 @@ export default function VideoRecorder({ onVideoRecorded, onBack, activityName }:
           body: JSON.stringify({
             activity_type: activityName,
             pose_data: {
-              landmarks: landmarks,
+              landmarks: projectLandmarks(landmarks),
               timestamp: currentTime
             },
-            timestamp: currentTime
+            timestamp: currentTime,
+            sequence: ++frameSequenceRef.current
           })
         })
 